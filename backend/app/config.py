@@ -46,6 +46,67 @@ class Settings(BaseSettings):
     MARKET_DATA_CACHE_TTL: int = 0  # DISABLED - Always fetch live data from API
     USE_REAL_TIME_DATA: bool = True  # ALWAYS TRUE - System uses only real market data
     
+    # Provider quotas (0 = unlimited)
+    ALPHA_VANTAGE_DAILY_LIMIT: int = 25  # Free tier
+    ALPHA_VANTAGE_PER_MINUTE_LIMIT: int = 5
+    ALPHA_VANTAGE_HIGH_PRIORITY_RESERVE: int = 15  # Calls only trade execution may spend
+    ALPHA_VANTAGE_HIGH_PRIORITY_PER_MINUTE_RESERVE: int = 2  # Calls per minute only trade execution may spend
+    FINNHUB_DAILY_LIMIT: int = 0
+    FINNHUB_PER_MINUTE_LIMIT: int = 60
+    FINNHUB_HIGH_PRIORITY_PER_MINUTE_RESERVE: int = 20  # Calls per minute only trade execution may spend
+    
+    # Background quote polling (trigger monitor and resting paper orders share one poller)
+    QUOTE_POLL_MAX_SYMBOLS: int = 5  # symbols fetched per poll cycle, stalest first, at low priority
+    
+    # Crypto quotes
+    CRYPTO_EXCHANGE: str = "coinbase"  # Options: "coinbase", "fake"
+    CRYPTO_QUOTE_TTL_SECONDS: float = 1.0
+    CRYPTO_STREAM_INTERVAL_SECONDS: float = 1.0
+    
+    # Correlation gate (gate 10)
+    CORRELATION_WINDOW_DAYS: int = 60  # Daily closes kept per symbol
+    CORRELATION_MIN_OBSERVATIONS: int = 20  # Returns needed before a symbol enters the matrix
+    CORRELATION_THRESHOLD: float = 0.5  # Pairs below this count as uncorrelated
+    CORRELATION_REFRESH_SECONDS: int = 3600
+    
+    # Basket execution
+    MAX_BASKET_LEGS: int = 50
+    
+    # Activity log pipeline
+    ACTIVITY_LOG_MODE: str = "transactional"  # Options: "transactional" (log commits with the trade), "write_behind" (opt-in; queued rows are lost on a crash)
+    ACTIVITY_LOG_QUEUE_SIZE: int = 10000
+    ACTIVITY_LOG_BATCH_SIZE: int = 200
+    ACTIVITY_LOG_FLUSH_MS: int = 50
+    ACTIVITY_LOG_ENQUEUE_TIMEOUT: float = 0.05  # Seconds to wait on a full queue before writing inline
+    
+    # Cash journal
+    CASH_SNAPSHOT_EVERY: int = 100  # Journal entries between balance snapshots
+    
+    # Idempotency-Key store for order execution
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    
+    # Stop-loss / take-profit monitor
+    TRIGGER_MONITOR_ENABLED: bool = True
+    TRIGGER_POLL_SECONDS: float = 15.0  # max tick age before an armed symbol is polled; 0 disables polling
+    TRIGGER_CLOSE_WORKERS: int = 4
+    
+    # Mark-to-market equity
+    MTM_PERSIST_SECONDS: float = 5.0  # how often marked equity is saved; 0 saves only at shutdown
+    
+    # Paper-trading fill simulation
+    PAPER_FILL_SIMULATION: bool = True  # False fills paper orders instantly at the requested price
+    PAPER_FILL_WORKERS: int = 2
+    PAPER_LATENCY_MS: float = 120.0  # median latency per slice (lognormal)
+    PAPER_LATENCY_JITTER: float = 0.5  # lognormal sigma of the latency
+    PAPER_SPREAD_BPS: float = 5.0  # assumed spread when the quote has no bid/ask
+    PAPER_IMPACT_COEFFICIENT: float = 0.1  # square-root impact, in daily volatilities at full depth
+    PAPER_DEPTH_SHARES: int = 1000  # most shares one slice can fill
+    PAPER_MAX_SLICES: int = 5  # the remainder after this many slices is cancelled
+    PAPER_DEFAULT_VOLATILITY: float = 0.02  # daily volatility when the quote has no range
+    PAPER_BOOK_DEPTH_PER_TICK: int = 0  # shares each side of a symbol's resting-order book fills per tick; 0 = unlimited
+    PAPER_BOOK_POLL_SECONDS: float = 15.0  # max tick age before a symbol with resting orders is polled; 0 disables
+    
     # JWT
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
@@ -2,11 +2,12 @@
 Database connection and session management
 """
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from app.config import settings
+from typing import List
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,7 +46,40 @@ def get_db():
     finally:
         db.close()
 
+def upgrade_schema(bind=None) -> List[str]:
+    """
+    Add model columns missing from existing tables
+
+    create_all only creates missing tables; it never alters one. Columns
+    added to a model since the database was created are added here with
+    ALTER TABLE ... ADD COLUMN, and existing rows get the column's scalar
+    default (version_id = 1, order_type = 'BRACKET', ...). Safe to run on
+    every startup. Returns the columns added as "table.column".
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=bind.dialect)}"
+                ))
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(table.update().values({column.name: column.default.arg}))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Database schema upgraded, added columns: {', '.join(added)}")
+    return added
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and add columns missing from existing ones"""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     logger.info("Database tables created/verified")
@@ -10,6 +10,15 @@ from app.config import settings
 from app.database import init_db, SessionLocal
 from app.routes import trading, market, portfolio, analytics, auth, watchlist, analysis, payments
 from app.models import User
+from app.services.crypto_service import crypto_quote_service
+from app.services.exposure_service import exposure_service
+from app.services.correlation_service import correlation_service
+from app.services.activity_log_writer import activity_log_writer
+from app.services.mark_to_market import mark_to_market
+from app.services.position_ledger import position_ledger
+from app.services.paper_fill_simulator import paper_fill_simulator
+from app.services.trigger_monitor import trigger_monitor
+from app.services.quota_ledger import quota_ledger
 import bcrypt
 import logging
 
@@ -19,7 +28,7 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
-    description="AI-powered trading platform with 9-gate validation system",
+    description="AI-powered trading platform with 10-gate validation system",
     version="1.0.0"
 )
 
@@ -65,6 +74,39 @@ async def startup_event():
     logger.info("Starting Tectonic Trading Platform...")
     init_db()
     logger.info("Database initialized")
+    db = SessionLocal()
+    try:
+        position_ledger.backfill(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to backfill the position ledger: {str(e)}")
+    finally:
+        db.close()
+    try:
+        exposure_service.rebuild()
+    except Exception as e:
+        logger.error(f"Failed to rebuild portfolio exposure: {str(e)}")
+    try:
+        correlation_service.load()
+    except Exception as e:
+        logger.error(f"Failed to load price history for correlations: {str(e)}")
+    try:
+        mark_to_market.rebuild()
+        await mark_to_market.start()
+    except Exception as e:
+        logger.error(f"Failed to start mark-to-market equity: {str(e)}")
+    if settings.TRIGGER_MONITOR_ENABLED:
+        try:
+            trigger_monitor.rebuild()
+            await trigger_monitor.start()
+        except Exception as e:
+            logger.error(f"Failed to start stop-loss/take-profit monitor: {str(e)}")
+    if settings.PAPER_FILL_SIMULATION:
+        try:
+            await paper_fill_simulator.start()
+        except Exception as e:
+            logger.error(f"Failed to start paper fill simulator: {str(e)}")
 
 
 
@@ -72,6 +114,12 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Tectonic Trading Platform...")
+    await paper_fill_simulator.stop()
+    await trigger_monitor.stop()
+    await mark_to_market.stop()
+    activity_log_writer.shutdown()
+    quota_ledger.flush()
+    await crypto_quote_service.aclose()
 
 @app.get("/")
 async def root():
@@ -1,5 +1,8 @@
 from app.models.user import User
 from app.models.portfolio import Portfolio
 from app.models.trade import Position, Trade, ActivityLog
+from app.models.provider_usage import ProviderUsage
+from app.models.daily_close import DailyClose
+from app.models.cash_journal import CashEntry, CashSnapshot
 
-__all__ = ["User", "Portfolio", "Position", "Trade", "ActivityLog"]
+__all__ = ["User", "Portfolio", "Position", "Trade", "ActivityLog", "ProviderUsage", "DailyClose", "CashEntry", "CashSnapshot"]
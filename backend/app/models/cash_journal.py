@@ -0,0 +1,48 @@
+"""
+Cash journal models (append-only entries plus periodic balance snapshots)
+"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+class CashEntry(Base):
+    __tablename__ = "cash_journal"
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1, 2, 3... per portfolio
+    trade_id = Column(Integer, ForeignKey("trades.id"), nullable=True)
+    kind = Column(String, nullable=False)  # OPENING, FILL
+    amount = Column(Float, nullable=False)  # signed: credits > 0, debits < 0
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationship
+    trade = relationship("Trade")
+
+    # seq is unique per portfolio: two writers appending concurrently cannot both succeed
+    __table_args__ = (
+        UniqueConstraint('portfolio_id', 'seq', name='uq_cash_journal_seq'),
+        Index('ix_cash_journal_portfolio_time', 'portfolio_id', 'created_at'),
+    )
+
+    class Config:
+        from_attributes = True
+
+class CashSnapshot(Base):
+    __tablename__ = "cash_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # last journal entry included in balance
+    balance = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('portfolio_id', 'seq', name='uq_cash_snapshot_seq'),
+        Index('ix_cash_snapshots_portfolio_time', 'portfolio_id', 'created_at'),
+    )
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,22 @@
+"""
+Daily closing price model (feeds the correlation matrix)
+"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
+from datetime import datetime
+from app.database import Base
+
+class DailyClose(Base):
+    __tablename__ = "daily_closes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False, index=True)
+    close_date = Column(String, nullable=False)  # UTC day, YYYY-MM-DD
+    close = Column(Float, nullable=False)  # last accepted price of the day
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One row per symbol per day
+    __table_args__ = (UniqueConstraint('symbol', 'close_date', name='uq_symbol_day'),)
+    
+    class Config:
+        from_attributes = True
@@ -2,7 +2,7 @@
 Portfolio model
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -18,6 +18,8 @@ class Portfolio(Base):
     current_equity = Column(Float, default=0.0)
     cash_balance = Column(Float, default=0.0)
     is_active = Column(Boolean, default=True)
+    gate_rules = Column(JSON, nullable=True)  # validation gate threshold overrides
+    version_id = Column(Integer, nullable=False, default=1)  # optimistic concurrency (bumped on every update)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -26,5 +28,8 @@ class Portfolio(Base):
     positions = relationship("Position", back_populates="portfolio", cascade="all, delete-orphan")
     trades = relationship("Trade", back_populates="portfolio", cascade="all, delete-orphan")
     
+    # UPDATEs carry WHERE version_id = <loaded version>; a concurrent writer's commit raises StaleDataError
+    __mapper_args__ = {"version_id_col": version_id}
+    
     class Config:
         from_attributes = True
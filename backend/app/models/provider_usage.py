@@ -0,0 +1,22 @@
+"""
+Market data provider usage ledger model
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+from datetime import datetime
+from app.database import Base
+
+class ProviderUsage(Base):
+    __tablename__ = "provider_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False, index=True)  # "alpha_vantage", "finnhub"
+    usage_date = Column(String, nullable=False)  # UTC day, YYYY-MM-DD
+    calls = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One row per provider per day
+    __table_args__ = (UniqueConstraint('provider', 'usage_date', name='uq_provider_day'),)
+    
+    class Config:
+        from_attributes = True
@@ -22,6 +22,8 @@ class Position(Base):
     ai_confidence = Column(Float, default=0.0)
     entry_reasoning = Column(Text, nullable=True)
     validation_gates_passed = Column(JSON, default={})
+    realized_pnl = Column(Float, default=0.0)  # Accumulated by the position ledger
+    updated_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship
     portfolio = relationship("Portfolio", back_populates="positions")
@@ -46,11 +48,16 @@ class Trade(Base):
     opened_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
     close_reason = Column(String, nullable=True)
-    status = Column(String, default="OPEN")  # OPEN, CLOSED
+    status = Column(String, default="OPEN")  # RESTING, PENDING (paper, awaiting a fill), OPEN, CLOSED, CANCELLED
     ai_confidence = Column(Float, default=0.0)
     entry_reasoning = Column(Text, nullable=True)
     validation_gates_passed = Column(JSON, default={})
     paper_trading = Column(String, default="real")  # "real" or "paper"
+    order_type = Column(String, default="BRACKET")  # BRACKET (stop/target OCO) or TRAILING_STOP
+    trail_amount = Column(Float, nullable=True)  # TRAILING_STOP: distance the stop trails the best price by
+    trail_watermark = Column(Float, nullable=True)  # TRAILING_STOP: best price seen (saved at shutdown and on close)
+    entry_type = Column(String, default="MARKET")  # MARKET, or paper LIMIT / STOP orders that rest until crossed
+    limit_price = Column(Float, nullable=True)  # LIMIT / STOP: the price the order rests at
     
     # Relationship
     portfolio = relationship("Portfolio", back_populates="trades")
@@ -64,7 +71,7 @@ class ActivityLog(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     trade_id = Column(Integer, ForeignKey("trades.id"), nullable=True)
-    event_type = Column(String, nullable=False)  # EXECUTED, REJECTED, CLOSED
+    event_type = Column(String, nullable=False)  # EXECUTED, FILLED, REJECTED, CLOSED, CANCELLED
     reason = Column(String, nullable=True)
     details = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
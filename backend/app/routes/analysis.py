@@ -4,14 +4,15 @@ Technical Analysis routes - endpoints for technical indicators
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
-from app.services.market_data_service import MarketDataService
+from app.services.market_data_service import market_data_service
 from app.routes.auth import get_current_user
 from app.models.user import User
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/analysis", tags=["analysis"])
-market_service = MarketDataService()
+# Shared with the quote poller, which skips symbols a route priced lately
+market_service = market_data_service
 
 @router.get("/technical/{symbol}")
 async def get_technical_analysis(
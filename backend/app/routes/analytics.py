@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Portfolio, Trade, User
 from app.routes.auth import get_current_user
+from app.services.mark_to_market import mark_to_market
 from datetime import datetime, timedelta
 import logging
 
@@ -24,7 +25,7 @@ async def get_analytics_overview(
         portfolios = db.query(Portfolio).filter(Portfolio.user_id == current_user.id).all()
         
         total_capital = sum(p.starting_capital for p in portfolios)
-        total_equity = sum(p.current_equity for p in portfolios)
+        total_equity = sum(mark_to_market.equity_for(p.id, p.current_equity) for p in portfolios)
         total_pnl = total_equity - total_capital
         total_return_pct = (total_pnl / total_capital * 100) if total_capital > 0 else 0
         
@@ -3,17 +3,32 @@ Market data routes
 """
 
 from fastapi import APIRouter, HTTPException, status
-from app.services.market_data_service import MarketDataService
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.services.market_data_service import market_data_service
+from app.services.crypto_service import crypto_quote_service
+from app.services.quota_ledger import quota_ledger
+from app.services.correlation_service import correlation_service
+from app.utils.market_calendar import market_calendar
+from app.utils.quote_tokens import sign_quote
+from datetime import datetime
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/market", tags=["market"])
 
-market_service = MarketDataService()
+# Shared with the quote poller, which skips symbols a route priced lately
+market_service = market_data_service
 
 @router.get("/quote/{symbol}")
-async def get_quote(symbol: str):
-    """Get current quote for a symbol"""
+async def get_quote(symbol: str, snapshot: bool = True):
+    """
+    Get current quote for a symbol
+    
+    Includes a signed quote_token (unless ?snapshot=false) that the execute
+    endpoints accept in place of fetching the quote again.
+    """
     try:
         quote = await market_service.get_quote(symbol.upper())
         
@@ -23,6 +38,8 @@ async def get_quote(symbol: str):
                 detail=f"Quote not found for {symbol}"
             )
         
+        if snapshot:
+            quote = {**quote, "quote_token": sign_quote(quote)}
         return quote
         
     except HTTPException:
@@ -80,9 +97,17 @@ async def get_market_overview():
     """Get market indices overview"""
     try:
         overview = await market_service.get_market_overview()
+        market_open = market_calendar.is_open()
+        if not overview:
+            market_status = "Data unavailable"
+        else:
+            market_status = "Market open" if market_open else "Market closed"
         return {
             "indices": overview,
-            "status": "Market open" if overview else "Data unavailable"
+            "status": market_status,
+            "market_open": market_open,
+            "next_open": market_calendar.next_open(),
+            "next_close": market_calendar.next_close()
         }
     except Exception as e:
         logger.error(f"Error fetching market overview: {str(e)}")
@@ -91,9 +116,40 @@ async def get_market_overview():
             detail=str(e)
         )
 
+@router.get("/providers/status")
+async def get_provider_status():
+    """Get remaining API budget per market data provider"""
+    try:
+        return {
+            "providers": quota_ledger.status(),
+            "timestamp": datetime.utcnow()
+        }
+    except Exception as e:
+        logger.error(f"Error fetching provider status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/correlations/{symbol}")
+async def get_correlations(symbol: str):
+    """Get symbols highly correlated with symbol (as used by gate 10)"""
+    try:
+        return {
+            "symbol": symbol.upper(),
+            "correlated": correlation_service.correlated_with(symbol.upper()),
+            "matrix": correlation_service.status()
+        }
+    except Exception as e:
+        logger.error(f"Error fetching correlations: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.get("/crypto/{symbol}")
 async def get_crypto_price(symbol: str):
-    """Get cryptocurrency price"""
+    """Get cryptocurrency price (e.g. BTC, ETH-USD, SOLUSDT)"""
     try:
         price = await market_service.get_crypto_price(symbol.upper())
         
@@ -105,6 +161,8 @@ async def get_crypto_price(symbol: str):
         
         return price
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching crypto price: {str(e)}")
         raise HTTPException(
@@ -112,6 +170,20 @@ async def get_crypto_price(symbol: str):
             detail=str(e)
         )
 
+@router.get("/crypto/{symbol}/stream")
+async def stream_crypto_price(symbol: str):
+    """Stream cryptocurrency ticks as server-sent events"""
+    
+    async def events():
+        async for tick in crypto_quote_service.stream(symbol):
+            yield f"data: {json.dumps(jsonable_encoder(tick))}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @router.get("/search/{query}")
 async def search_symbols(query: str):
     """Search for symbols by company name or symbol"""
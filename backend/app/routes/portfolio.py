@@ -7,7 +7,14 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Portfolio, User
 from app.routes.auth import get_current_user
+from app.services.cash_journal import cash_journal
+from app.services.exposure_service import exposure_service
+from app.services.mark_to_market import mark_to_market
+from app.services.position_ledger import position_ledger, signed_quantity
+from app.utils.gate_rules import compile_rule_set, default_rules, gate_rule_cache
 from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +25,9 @@ class CreatePortfolioRequest(BaseModel):
     starting_capital: float
     description: str = None
 
+class GateRulesRequest(BaseModel):
+    rules: Optional[Dict[str, float]] = None  # None or {} restores the defaults
+
 @router.post("/")
 async def create_portfolio(
     request: CreatePortfolioRequest,
@@ -85,17 +95,21 @@ async def get_portfolios(
         portfolios = db.query(Portfolio).filter(
             Portfolio.user_id == current_user.id
         ).all()
-        return [{
-            "id": p.id,
-            "user_id": p.user_id,
-            "name": p.name,
-            "starting_capital": p.starting_capital,
-            "current_equity": p.current_equity,
-            "cash_balance": p.cash_balance,
-            "return_pct": ((p.current_equity - p.starting_capital) / p.starting_capital * 100) if p.starting_capital else 0,
-            "is_active": p.is_active,
-            "created_at": p.created_at
-        } for p in portfolios]
+        results = []
+        for p in portfolios:
+            equity = mark_to_market.equity_for(p.id, p.current_equity)
+            results.append({
+                "id": p.id,
+                "user_id": p.user_id,
+                "name": p.name,
+                "starting_capital": p.starting_capital,
+                "current_equity": equity,
+                "cash_balance": p.cash_balance,
+                "return_pct": ((equity - p.starting_capital) / p.starting_capital * 100) if p.starting_capital else 0,
+                "is_active": p.is_active,
+                "created_at": p.created_at
+            })
+        return results
     except Exception as e:
         logger.error(f"Error fetching portfolios: {str(e)}")
         raise HTTPException(
@@ -103,6 +117,11 @@ async def get_portfolios(
             detail=str(e)
         )
 
+@router.get("/marks/stats")
+async def get_mark_stats(current_user: User = Depends(get_current_user)):
+    """Mark-to-market engine size and revaluation timing"""
+    return mark_to_market.stats()
+
 @router.get("/{portfolio_id}")
 async def get_portfolio(
     portfolio_id: int,
@@ -127,6 +146,7 @@ async def get_portfolio(
         closed_trades = sum(1 for t in portfolio.trades if t.status == "CLOSED")
         total_pnl = sum(t.pnl for t in portfolio.trades if t.pnl)
         winning_trades = sum(1 for t in portfolio.trades if t.pnl and t.pnl > 0)
+        equity = mark_to_market.equity_for(portfolio.id, portfolio.current_equity)
         
         return {
             "id": portfolio.id,
@@ -134,12 +154,12 @@ async def get_portfolio(
             "name": portfolio.name,
             "description": portfolio.description,
             "starting_capital": portfolio.starting_capital,
-            "current_equity": portfolio.current_equity,
+            "current_equity": equity,
             "cash_balance": portfolio.cash_balance,
-            "return_pct": ((portfolio.current_equity - portfolio.starting_capital) / portfolio.starting_capital * 100) if portfolio.starting_capital else 0,
+            "return_pct": ((equity - portfolio.starting_capital) / portfolio.starting_capital * 100) if portfolio.starting_capital else 0,
             "total_trades": total_trades,
             "closed_trades": closed_trades,
-            "open_positions": len(portfolio.positions),
+            "open_positions": len(position_ledger.open_positions(db, portfolio.id)),
             "total_pnl": total_pnl,
             "win_rate": (winning_trades / closed_trades * 100) if closed_trades > 0 else 0,
             "is_active": portfolio.is_active,
@@ -152,3 +172,241 @@ async def get_portfolio(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+@router.get("/{portfolio_id}/positions")
+async def get_positions(
+    portfolio_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Open positions and balances from the position ledger"""
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        positions = []
+        for p in position_ledger.open_positions(db, portfolio.id):
+            last_price = mark_to_market.price(p.symbol)
+            positions.append({
+                "symbol": p.symbol,
+                "direction": p.direction,
+                "quantity": p.quantity,
+                "avg_entry_price": p.entry_price,
+                "last_price": last_price,
+                "unrealized_pnl": signed_quantity(p) * (last_price - p.entry_price) if last_price is not None else None,
+                "stop_loss": p.stop_loss,
+                "take_profit": p.take_profit,
+                "realized_pnl": p.realized_pnl,
+                "opened_at": p.opened_at,
+                "updated_at": p.updated_at
+            })
+        
+        return {
+            "portfolio_id": portfolio.id,
+            "cash_balance": portfolio.cash_balance,
+            "current_equity": mark_to_market.equity_for(portfolio.id, portfolio.current_equity),
+            "positions": positions
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching positions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/{portfolio_id}/cash")
+async def get_cash(
+    portfolio_id: int,
+    at: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Cash balance from the journal
+    
+    Without ?at the cached balance is reconciled against the journal; with
+    ?at=<ISO time> the historical balance at that moment is returned.
+    """
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        if at is not None:
+            return {"portfolio_id": portfolio.id, "at": at, "balance": cash_journal.balance(db, portfolio.id, at)}
+        return cash_journal.reconcile(db, portfolio)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching cash balance: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/{portfolio_id}/cash/journal")
+async def get_cash_journal(
+    portfolio_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cash journal entries, oldest first, optionally within [start, end]"""
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        return [{
+            "seq": e.seq,
+            "kind": e.kind,
+            "amount": e.amount,
+            "trade_id": e.trade_id,
+            "created_at": e.created_at
+        } for e in cash_journal.entries(db, portfolio.id, start, end, min(limit, 5000))]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching cash journal: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/{portfolio_id}/exposure")
+async def get_exposure(
+    portfolio_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Open notional and percentage exposure per symbol (as seen by gate 7)"""
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        return exposure_service.snapshot(portfolio.id, portfolio.current_equity or portfolio.starting_capital)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching exposure: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/{portfolio_id}/gate-rules")
+async def get_gate_rules(
+    portfolio_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the portfolio's validation gate overrides and the effective thresholds"""
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        rules = portfolio.gate_rules or {}
+        return {
+            "portfolio_id": portfolio.id,
+            "rules": rules,
+            "effective": {**default_rules(), **rules}
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching gate rules: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.put("/{portfolio_id}/gate-rules")
+async def update_gate_rules(
+    portfolio_id: int,
+    request: GateRulesRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace the portfolio's validation gate overrides"""
+    try:
+        portfolio = db.query(Portfolio).filter(
+            Portfolio.id == portfolio_id,
+            Portfolio.user_id == current_user.id
+        ).first()
+        
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found"
+            )
+        
+        # Compile up front so invalid rules are rejected before they are stored
+        try:
+            compile_rule_set(request.rules)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        portfolio.gate_rules = request.rules or None
+        db.commit()
+        gate_rule_cache.invalidate(portfolio.id)
+        
+        rules = portfolio.gate_rules or {}
+        return {
+            "portfolio_id": portfolio.id,
+            "rules": rules,
+            "effective": {**default_rules(), **rules}
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error updating gate rules: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
@@ -2,117 +2,63 @@
 Trading routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from app.database import get_db
-from app.schemas import TradeResponse, TradeExecutionRequest, TradeCloseRequest
-from app.services.trading_engine import TradingEngine
-from app.services.market_data_service import market_data_service
+from app.schemas import TradeResponse, TradeExecutionRequest, BasketExecutionRequest, TradeCloseRequest
+from app.services.trading_engine import RESTING, TradingEngine
+from app.services.execution_service import StageTimer, execute_basket, execute_staged
+from app.services.idempotency_store import run_idempotent
+from app.services.portfolio_locks import portfolio_locks
+from app.services.paper_fill_simulator import paper_fill_simulator
+from app.services.paper_order_book import resting_order
+from app.services.trigger_monitor import trigger_monitor
+from app.utils.gate_pipeline import gate_pipeline
 from app.models import Trade, Portfolio, User
-from app.routes.auth import get_current_user
+from app.routes.auth import get_current_user, decode_access_token, oauth2_scheme
+from app.utils.response_formats import tabular_response
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/trading", tags=["trading"])
 
+# Column order for msgpack/Arrow trade listings (same fields as TradeResponse)
+TRADE_COLUMNS = list(TradeResponse.model_fields)
+
 @router.post("/execute")
 async def execute_trade(
     request: TradeExecutionRequest,
+    response: Response,
+    diagnostics: bool = False,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    token: str = Depends(oauth2_scheme)
 ):
-    """Execute a new trade with real market data from Finnhub"""
+    """
+    Execute a new trade with real market data from Finnhub
+    
+    The quote fetch overlaps the portfolio and cash checks; per-stage
+    latency is returned in latency_ms and the Server-Timing header.
+    With an Idempotency-Key header, a retry returns the original response
+    (marked Idempotent-Replayed) instead of placing the order again.
+    """
+    timer = StageTimer()
     try:
-        logger.info(f"Trade execution request for {request.symbol} by user {current_user.id}")
-        
-        # Verify portfolio ownership
-        portfolio = db.query(Portfolio).filter(
-            Portfolio.id == request.portfolio_id,
-            Portfolio.user_id == current_user.id
-        ).first()
-        
-        if not portfolio:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Portfolio not found"
-            )
-        
-        # Check cash balance
-        trade_cost = request.entry_price * request.quantity
-        if trade_cost > portfolio.cash_balance:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient funds. Required: ${trade_cost:.2f}, Available: ${portfolio.cash_balance:.2f}"
-            )
-        
-        engine = TradingEngine(db)
-        
-        # Fetch real market data from Finnhub API (MUST succeed)
-        try:
-            live_quote = await market_data_service.get_quote(request.symbol)
-            logger.info(f"Fetched real quote for {request.symbol}: ${live_quote.get('current_price')} (source: {live_quote.get('source')})")
-        except Exception as quote_error:
-            logger.error(f"CRITICAL: Failed to fetch real market data for {request.symbol}: {str(quote_error)}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Unable to fetch real market data for {request.symbol}. Please ensure API keys are configured and markets are open. Error: {str(quote_error)}"
-            )
-        
-        # Use ONLY real market data from API (NO hardcoded fallbacks)
-        from datetime import datetime
-        market_data = {
-            "current_price": live_quote.get("current_price"),
-            "high": live_quote.get("high"),
-            "low": live_quote.get("low"),
-            "prev_close": live_quote.get("prev_close"),
-            "volume": live_quote.get("volume"),
-            "volatility": live_quote.get("volatility"),
-            "market_open": True,
-            "entry_price": request.entry_price,
-            "stop_loss": request.stop_loss,
-            "take_profit": request.take_profit,
-            "direction": request.direction,
-            "ai_confidence": request.ai_confidence,
-            "quote_timestamp": live_quote.get("timestamp") or datetime.utcnow(),
-            "quote_source": live_quote.get("source"),
-            "timeframe": "day"
-        }
-        
-        # Generate signal
-        signal = engine.generate_trade_signal(
-            request.symbol,
-            request.direction,
-            market_data,
-            request.ai_confidence,
-            request.entry_reasoning or ""
+        with timer.stage("auth"):
+            email = decode_access_token(token)
+        result, replayed = await run_idempotent(
+            idempotency_key, (email, "live"), {**request.dict(), "diagnostics": diagnostics},
+            lambda: execute_staged(request, email, db, diagnostics=diagnostics, timer=timer)
         )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        response.headers["Server-Timing"] = timer.server_timing()
+        return result
         
-        if not signal:
-            # Get validation details for better error message
-            valid, gates_results = engine.validate_trade_signal(market_data)
-            failed_gates = [g for g in gates_results.values() if not g["passed"]]
-            failed_reasons = "; ".join([f"Gate {g['gate']}: {g['reason']}" for g in failed_gates])
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Trade validation failed - {failed_reasons}"
-            )
-        
-        # Execute trade
-        trade = engine.execute_trade(request.portfolio_id, signal, request.quantity)
-        
-        if not trade:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to execute trade"
-            )
-        
-        # Build response with validation gates status
-        response = TradeResponse.from_orm(trade)
-        response_dict = response.dict()
-        response_dict['validation_gates'] = signal.get('validation_gates', {})
-        
-        return response_dict
-        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error executing trade: {str(e)}")
         raise HTTPException(
@@ -123,84 +69,183 @@ async def execute_trade(
 @router.post("/paper/execute")
 async def execute_paper_trade(
     request: TradeExecutionRequest,
+    response: Response,
+    diagnostics: bool = False,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    token: str = Depends(oauth2_scheme)
 ):
     """Execute a paper trading trade (risk-free practice mode with real market data)"""
+    timer = StageTimer()
+    try:
+        with timer.stage("auth"):
+            email = decode_access_token(token)
+        result, replayed = await run_idempotent(
+            idempotency_key, (email, "paper"), {**request.dict(), "diagnostics": diagnostics},
+            lambda: execute_staged(request, email, db, paper_trading=True, diagnostics=diagnostics, timer=timer)
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        response.headers["Server-Timing"] = timer.server_timing()
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing paper trade: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post("/basket/execute")
+async def execute_basket_trades(
+    request: BasketExecutionRequest,
+    response: Response,
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """
+    Execute a basket of related orders (rebalances, pairs) in one request
+    
+    Quotes are fetched together, all legs are validated in one batched gate
+    pass and every trade is committed in a single transaction. atomic=true
+    (default) rejects the whole basket if any leg fails; atomic=false
+    executes the legs that pass. Per-leg results are returned in legs.
+    """
+    timer = StageTimer()
+    try:
+        with timer.stage("auth"):
+            email = decode_access_token(token)
+        result = await execute_basket(request, email, db, timer=timer)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing basket: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post("/paper/basket/execute")
+async def execute_paper_basket(
+    request: BasketExecutionRequest,
+    response: Response,
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """Execute a basket of paper trades (same semantics as /basket/execute)"""
+    timer = StageTimer()
     try:
-        # Verify portfolio ownership
-        portfolio = db.query(Portfolio).filter(
-            Portfolio.id == request.portfolio_id,
+        with timer.stage("auth"):
+            email = decode_access_token(token)
+        result = await execute_basket(request, email, db, paper_trading=True, timer=timer)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing paper basket: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/gates/stats")
+async def get_gate_stats(current_user: User = Depends(get_current_user)):
+    """Per-gate timing, rejection rates and the current evaluation order"""
+    return gate_pipeline.get_stats()
+
+@router.get("/locks/stats")
+async def get_lock_stats(current_user: User = Depends(get_current_user)):
+    """Per-portfolio order lock contention"""
+    return portfolio_locks.stats()
+
+@router.get("/triggers/stats")
+async def get_trigger_stats(current_user: User = Depends(get_current_user)):
+    """Armed stop-loss/take-profit levels and trades closed by the monitor"""
+    return trigger_monitor.stats()
+
+@router.get("/paper/fills/stats")
+async def get_paper_fill_stats(current_user: User = Depends(get_current_user)):
+    """Paper orders waiting for, and filled by, the fill simulator (with order book stats)"""
+    return paper_fill_simulator.stats()
+
+@router.get("/paper/orders")
+async def get_resting_orders(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Paper LIMIT / STOP orders still resting in the order book"""
+    try:
+        trades = db.query(Trade).join(Portfolio).filter(
+            Portfolio.user_id == current_user.id,
+            Trade.status == RESTING
+        ).order_by(Trade.id).all()
+        return [TradeResponse.from_orm(t) for t in trades]
+    except Exception as e:
+        logger.error(f"Error fetching resting orders: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+def _rebook(db: Session, trade_id: int):
+    """Put an order back in the paper book when its cancel did not commit"""
+    trade = db.get(Trade, trade_id)
+    if trade is not None and trade.status == RESTING:
+        paper_fill_simulator.book.add(resting_order(trade))
+
+@router.post("/paper/orders/{trade_id}/cancel")
+async def cancel_resting_order(
+    trade_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a resting paper LIMIT / STOP order"""
+    try:
+        trade = db.query(Trade).join(Portfolio).filter(
+            Trade.id == trade_id,
             Portfolio.user_id == current_user.id
         ).first()
-        
-        if not portfolio:
+        if not trade:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Portfolio not found"
+                detail="Order not found"
             )
         
-        engine = TradingEngine(db)
-        
-        # Fetch real market data from Finnhub API
-        live_quote = await market_data_service.get_quote(request.symbol)
-        
-        if not live_quote:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Unable to fetch market data for {request.symbol}"
-            )
-        
-        # Use ONLY real market data from API (NO hardcoded fallbacks)
-        from datetime import datetime
-        market_data = {
-            "current_price": live_quote.get("current_price"),
-            "high": live_quote.get("high"),
-            "low": live_quote.get("low"),
-            "prev_close": live_quote.get("prev_close"),
-            "volume": live_quote.get("volume"),
-            "volatility": live_quote.get("volatility"),
-            "market_open": True,
-            "entry_price": request.entry_price,
-            "stop_loss": request.stop_loss,
-            "take_profit": request.take_profit,
-            "direction": request.direction,
-            "ai_confidence": request.ai_confidence,
-            "quote_timestamp": live_quote.get("timestamp") or datetime.utcnow(),
-            "quote_source": live_quote.get("source"),
-            "timeframe": "day"
-        }
-        
-        signal = engine.generate_trade_signal(
-            request.symbol,
-            request.direction,
-            market_data,
-            request.ai_confidence,
-            request.entry_reasoning or ""
-        )
-        
-        if not signal:
-            # Get validation details for better error message
-            valid, gates_results = engine.validate_trade_signal(market_data)
-            failed_gates = [g for g in gates_results.values() if not g["passed"]]
-            failed_reasons = "; ".join([f"Gate {g['gate']}: {g['reason']}" for g in failed_gates])
+        try:
+            async with portfolio_locks.hold(trade.portfolio_id):
+                # Out of the book first, so it cannot match while the cancel commits
+                unbooked = paper_fill_simulator.book.cancel(trade_id)
+                cancelled = None
+                try:
+                    cancelled = TradingEngine(db).cancel_resting(trade_id)
+                finally:
+                    if unbooked and cancelled is None:
+                        _rebook(db, trade_id)
+        except StaleDataError:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Trade validation failed - {failed_reasons}"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Order was modified concurrently, please retry"
             )
         
-        trade = engine.execute_trade(request.portfolio_id, signal, request.quantity, paper_trading=True)
-        
-        if not trade:
+        if not cancelled:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to execute paper trade"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Order is no longer resting"
             )
         
-        return TradeResponse.from_orm(trade)
+        return TradeResponse.from_orm(cancelled)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error executing paper trade: {str(e)}")
+        logger.error(f"Error cancelling order: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -231,7 +276,14 @@ async def close_trade(
             )
         
         engine = TradingEngine(db)
-        trade = engine.close_trade(trade_id, request.exit_price, request.close_reason)
+        try:
+            async with portfolio_locks.hold(portfolio.id):
+                trade = engine.close_trade(trade_id, request.exit_price, request.close_reason, request.quantity)
+        except StaleDataError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Portfolio was modified concurrently, please retry"
+            )
         
         if not trade:
             raise HTTPException(
@@ -241,6 +293,8 @@ async def close_trade(
         
         return TradeResponse.from_orm(trade)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error closing trade: {str(e)}")
         raise HTTPException(
@@ -250,15 +304,28 @@ async def close_trade(
 
 @router.get("/trades")
 async def get_trades(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all trades for current user"""
+    """
+    Get all trades for current user
+
+    Supports JSON (default), MessagePack and Arrow IPC via the Accept header
+    or ?format=json|msgpack|arrow.
+    """
     try:
         trades = db.query(Trade).join(Portfolio).filter(
             Portfolio.user_id == current_user.id
         ).all()
-        return [TradeResponse.from_orm(t) for t in trades]
+        return tabular_response(
+            request,
+            trades,
+            TRADE_COLUMNS,
+            json_rows=lambda rows: [TradeResponse.from_orm(t) for t in rows]
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching trades: {str(e)}")
         raise HTTPException(
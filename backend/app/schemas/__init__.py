@@ -1,6 +1,8 @@
 from app.schemas.trade_schema import (
     TradeSignalRequest,
     TradeExecutionRequest,
+    BasketLeg,
+    BasketExecutionRequest,
     TradeCloseRequest,
     TradeResponse,
     ActivityLogResponse
@@ -9,6 +11,8 @@ from app.schemas.trade_schema import (
 __all__ = [
     "TradeSignalRequest",
     "TradeExecutionRequest",
+    "BasketLeg",
+    "BasketExecutionRequest",
     "TradeCloseRequest",
     "TradeResponse",
     "ActivityLogResponse"
@@ -4,7 +4,7 @@ Pydantic schemas for trade-related endpoints
 
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class TradeSignalRequest(BaseModel):
     symbol: str
@@ -23,6 +23,35 @@ class TradeExecutionRequest(BaseModel):
     quantity: int
     ai_confidence: float = 0.0
     entry_reasoning: Optional[str] = None
+    quote_token: Optional[str] = None  # snapshot from /api/market/quote; skips the refetch while fresh
+    order_type: str = "BRACKET"  # BRACKET or TRAILING_STOP
+    trail_amount: Optional[float] = None  # TRAILING_STOP; defaults to the initial stop distance
+    entry_type: str = "MARKET"  # MARKET, or LIMIT / STOP at entry_price (paper only; rests until crossed)
+    
+    class Config:
+        from_attributes = True
+
+class BasketLeg(BaseModel):
+    symbol: str
+    direction: str
+    entry_price: float
+    stop_loss: float
+    take_profit: float
+    quantity: int
+    ai_confidence: float = 0.0
+    entry_reasoning: Optional[str] = None
+    quote_token: Optional[str] = None
+    order_type: str = "BRACKET"
+    trail_amount: Optional[float] = None
+    entry_type: str = "MARKET"  # as on TradeExecutionRequest
+    
+    class Config:
+        from_attributes = True
+
+class BasketExecutionRequest(BaseModel):
+    portfolio_id: int
+    legs: List[BasketLeg]
+    atomic: bool = True  # all-or-nothing; False executes every leg that passes
     
     class Config:
         from_attributes = True
@@ -30,6 +59,7 @@ class TradeExecutionRequest(BaseModel):
 class TradeCloseRequest(BaseModel):
     exit_price: float
     close_reason: str
+    quantity: Optional[int] = None  # partial close; defaults to the whole trade
     
     class Config:
         from_attributes = True
@@ -46,6 +76,10 @@ class TradeResponse(BaseModel):
     pnl: Optional[float]
     pnl_percent: Optional[float]
     status: str
+    order_type: Optional[str] = None
+    trail_amount: Optional[float] = None
+    entry_type: Optional[str] = None
+    limit_price: Optional[float] = None
     opened_at: datetime
     closed_at: Optional[datetime]
     
@@ -0,0 +1,221 @@
+"""
+Write-behind activity log pipeline
+
+In write-behind mode, the request path commits the trade and then hands its
+activity log to a bounded queue. A background thread drains the queue and
+inserts the rows in batches: every ACTIVITY_LOG_FLUSH_MS milliseconds or
+every ACTIVITY_LOG_BATCH_SIZE rows, whichever comes first. Detail
+serialization (datetimes to ISO strings) also runs on the writer thread.
+
+Durability:
+- ACTIVITY_LOG_MODE="transactional" (the default) keeps the log in the
+  trade's own transaction. There is then no window where a trade exists
+  without its log.
+- Write-behind is opt-in. Rows still in the queue are lost if the process
+  crashes.
+- In write-behind mode, a full queue never drops a row. A worker-thread
+  caller waits up to ACTIVITY_LOG_ENQUEUE_TIMEOUT seconds, then writes the
+  row itself. On the event loop the caller never waits: the overflow row is
+  written on the default executor instead.
+- A failed batch is retried row by row, so one bad row cannot take its
+  neighbours down with it.
+- flush() blocks until everything queued so far is written. It is called on
+  application shutdown.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.trade import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+TRANSACTIONAL = "transactional"
+WRITE_BEHIND = "write_behind"
+
+_STOP = object()
+
+
+def serialize_details(obj: Any) -> Any:
+    """Recursively convert datetime objects to ISO format strings"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    elif isinstance(obj, dict):
+        return {k: serialize_details(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [serialize_details(item) for item in obj]
+    else:
+        return obj
+
+
+class ActivityLogWriter:
+    """Bounded queue plus a batching writer thread for ActivityLog rows"""
+
+    def __init__(
+        self,
+        mode: str = TRANSACTIONAL,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 50,
+        enqueue_timeout: float = 0.05
+    ):
+        if mode not in (TRANSACTIONAL, WRITE_BEHIND):
+            raise ValueError(f"Unknown activity log mode: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0
+        self.failed = 0
+
+    @property
+    def write_behind(self) -> bool:
+        return self.mode == WRITE_BEHIND
+
+    def submit(self, bind: Any, trade_id: int, event_type: str, reason: str, details: Dict[str, Any]):
+        """
+        Queue one log row; bind is the engine/connection the trade was written to
+
+        details is copied shallowly. Callers must not mutate nested values
+        after submitting.
+        """
+        item = (bind, {"trade_id": trade_id, "event_type": event_type, "reason": reason,
+                       "details": dict(details), "created_at": datetime.utcnow()})
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        self._ensure_started()
+        try:
+            if loop is None:
+                self._queue.put(item, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            # Backpressure: write it ourselves rather than drop an audit row,
+            # but never block the event loop on the insert
+            self.inline_writes += 1
+            if loop is None:
+                logger.warning("Activity log queue full, writing inline")
+                self._write([item])
+            else:
+                logger.warning("Activity log queue full, writing on a worker thread")
+                loop.run_in_executor(None, self._write, [item])
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every row queued so far is written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def shutdown(self, timeout: float = 5.0):
+        """Flush and stop the writer thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"Activity log writer did not stop; {self._queue.qsize()} rows pending")
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "inline_writes": self.inline_writes,
+            "failed": self.failed,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if item is not _STOP]
+            try:
+                if rows:
+                    self._write(rows)
+            except Exception as e:
+                logger.error(f"Activity log writer error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(rows) != len(batch):
+                return
+
+    def _write(self, items: List[Tuple[Any, Dict[str, Any]]]):
+        """Insert rows, one transaction per target database"""
+        by_bind: Dict[Any, List[Dict[str, Any]]] = {}
+        for bind, row in items:
+            by_bind.setdefault(bind, []).append(row)
+
+        for bind, rows in by_bind.items():
+            for row in rows:
+                row["details"] = serialize_details(row["details"])
+            if self._insert(bind, rows):
+                continue
+            # Isolate the bad row(s)
+            for row in rows:
+                if not self._insert(bind, [row]):
+                    self.failed += 1
+                    logger.error(f"Dropping activity log for trade {row['trade_id']} ({row['event_type']})")
+
+    def _insert(self, bind: Any, rows: List[Dict[str, Any]]) -> bool:
+        session = Session(bind=bind)
+        try:
+            session.bulk_insert_mappings(ActivityLog, rows)
+            session.commit()
+            self.written += len(rows)
+            self.batches += 1
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error writing {len(rows)} activity logs: {str(e)}")
+            return False
+        finally:
+            session.close()
+
+
+# Create singleton instance
+activity_log_writer = ActivityLogWriter(
+    mode=settings.ACTIVITY_LOG_MODE,
+    max_queue=settings.ACTIVITY_LOG_QUEUE_SIZE,
+    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.ACTIVITY_LOG_FLUSH_MS,
+    enqueue_timeout=settings.ACTIVITY_LOG_ENQUEUE_TIMEOUT
+)
@@ -0,0 +1,145 @@
+"""
+Append-only cash journal
+
+Every change to a portfolio's cash is one CashEntry row with a signed amount,
+a per-portfolio sequence number and, for fills, the trade it belongs to.
+Every CASH_SNAPSHOT_EVERY entries, a CashSnapshot records the balance after
+that entry.
+
+- Current balance: latest snapshot plus the entries after it. This tail is
+  never longer than the snapshot interval. Portfolio.cash_balance stays as
+  the O(1) cached value and is written in the same transaction.
+- Balance at time T: latest snapshot at or before T, plus the entries
+  between that snapshot and T. Both are indexed range queries.
+- Reconciliation compares the cached balance with the journal.
+
+Portfolios that held cash before the journal existed get an OPENING entry for
+their cached balance the first time they are journaled. Like the position
+ledger, the journal never commits.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.cash_journal import CashEntry, CashSnapshot
+from app.models.portfolio import Portfolio
+
+logger = logging.getLogger(__name__)
+
+OPENING = "OPENING"
+FILL = "FILL"
+
+
+class CashJournal:
+    """Writes and reads the cash journal"""
+
+    def __init__(self, snapshot_every: int = 100):
+        self.snapshot_every = snapshot_every
+
+    def record(
+        self,
+        db: Session,
+        portfolio: Portfolio,
+        amount: float,
+        kind: str = FILL,
+        trade: Any = None
+    ) -> CashEntry:
+        """Append an entry and move the cached balance by amount (does not commit)"""
+        last = self._last_seq(db, portfolio.id)
+        if last == 0 and portfolio.cash_balance:
+            self._append(db, portfolio.id, 1, OPENING, portfolio.cash_balance)
+            last = 1
+
+        entry = self._append(db, portfolio.id, last + 1, kind, amount, trade)
+        portfolio.cash_balance = (portfolio.cash_balance or 0.0) + amount
+
+        if entry.seq % self.snapshot_every == 0:
+            db.flush()
+            db.add(CashSnapshot(
+                portfolio_id=portfolio.id,
+                seq=entry.seq,
+                balance=self._journal_balance(db, portfolio.id),
+                created_at=entry.created_at
+            ))
+        return entry
+
+    def balance(self, db: Session, portfolio_id: int, at: Optional[datetime] = None) -> float:
+        """Balance from the journal, now or as of a point in time"""
+        return self._journal_balance(db, portfolio_id, at)
+
+    def entries(
+        self,
+        db: Session,
+        portfolio_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 500
+    ) -> List[CashEntry]:
+        query = db.query(CashEntry).filter(CashEntry.portfolio_id == portfolio_id)
+        if start is not None:
+            query = query.filter(CashEntry.created_at >= start)
+        if end is not None:
+            query = query.filter(CashEntry.created_at <= end)
+        return query.order_by(CashEntry.seq).limit(limit).all()
+
+    def reconcile(self, db: Session, portfolio: Portfolio) -> Dict[str, Any]:
+        """Cached balance against the journal"""
+        has_entries = self._last_seq(db, portfolio.id) > 0
+        journal = self._journal_balance(db, portfolio.id) if has_entries else portfolio.cash_balance
+        difference = (portfolio.cash_balance or 0.0) - journal
+        if abs(difference) > 1e-6:
+            logger.warning(f"Cash mismatch for portfolio {portfolio.id}: cached {portfolio.cash_balance}, journal {journal}")
+        return {
+            "portfolio_id": portfolio.id,
+            "cached_balance": portfolio.cash_balance,
+            "journal_balance": journal,
+            "difference": difference,
+            "in_balance": abs(difference) <= 1e-6,
+        }
+
+    def _append(self, db: Session, portfolio_id: int, seq: int, kind: str, amount: float, trade: Any = None) -> CashEntry:
+        entry = CashEntry(
+            portfolio_id=portfolio_id,
+            seq=seq,
+            kind=kind,
+            amount=amount,
+            trade=trade,
+            created_at=datetime.utcnow()
+        )
+        db.add(entry)
+        return entry
+
+    @staticmethod
+    def _last_seq(db: Session, portfolio_id: int) -> int:
+        # Entries appended earlier in this transaction are only in session.new (autoflush is off)
+        pending = [obj.seq for obj in db.new if isinstance(obj, CashEntry) and obj.portfolio_id == portfolio_id]
+        if pending:
+            return max(pending)
+        return db.query(func.max(CashEntry.seq)).filter(CashEntry.portfolio_id == portfolio_id).scalar() or 0
+
+    @staticmethod
+    def _snapshot(db: Session, portfolio_id: int, at: Optional[datetime]) -> Tuple[int, float]:
+        query = db.query(CashSnapshot.seq, CashSnapshot.balance).filter(CashSnapshot.portfolio_id == portfolio_id)
+        if at is not None:
+            query = query.filter(CashSnapshot.created_at <= at)
+        row = query.order_by(CashSnapshot.seq.desc()).first()
+        return (row.seq, row.balance) if row else (0, 0.0)
+
+    def _journal_balance(self, db: Session, portfolio_id: int, at: Optional[datetime] = None) -> float:
+        seq, balance = self._snapshot(db, portfolio_id, at)
+        tail = db.query(func.sum(CashEntry.amount)).filter(
+            CashEntry.portfolio_id == portfolio_id,
+            CashEntry.seq > seq
+        )
+        if at is not None:
+            tail = tail.filter(CashEntry.created_at <= at)
+        return balance + (tail.scalar() or 0.0)
+
+
+# Create singleton instance
+cash_journal = CashJournal(snapshot_every=settings.CASH_SNAPSHOT_EVERY)
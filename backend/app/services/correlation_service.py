@@ -0,0 +1,263 @@
+"""
+Correlation service - rolling correlation matrix over daily closes for gate 10
+
+Accepted quotes record the latest price of the UTC day per symbol. The
+closes are persisted to the daily_closes table and reloaded at startup.
+Every refresh interval the service rebuilds, from the log returns of the
+last CORRELATION_WINDOW_DAYS closes:
+- the covariance matrix;
+- a thresholded correlation matrix, where pairs below CORRELATION_THRESHOLD
+  are set to 0.
+
+Gate 10 uses correlated exposure. For a proposed trade, that is the trade's
+weight plus the correlation-weighted sum of the portfolio's current
+weights. Five highly correlated tech names then count as one concentrated
+bet rather than five independent ones. The check is a single matrix-vector
+product against the cached matrix.
+
+A due refresh never runs on the caller's path: current() starts it on a
+background thread and keeps serving the previous matrix until the new one
+is swapped in.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.daily_close import DailyClose
+
+logger = logging.getLogger(__name__)
+
+
+class CorrelationMatrix:
+    """Immutable snapshot swapped in on each refresh"""
+
+    def __init__(self, symbols: List[str], covariance: np.ndarray, correlation: np.ndarray, observations: np.ndarray):
+        self.symbols = symbols
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.covariance = covariance
+        self.correlation = correlation  # thresholded, unit diagonal
+        self.observations = observations
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+EMPTY_MATRIX = CorrelationMatrix([], np.zeros((0, 0)), np.zeros((0, 0)), np.zeros(0, dtype=int))
+
+
+class CorrelationService:
+    """Daily close history plus a cached correlation/covariance matrix"""
+
+    def __init__(
+        self,
+        window_days: int = 60,
+        min_observations: int = 20,
+        threshold: float = 0.5,
+        refresh_seconds: float = 3600,
+        session_factory: Optional[Callable] = SessionLocal,
+        clock: Callable[[], float] = time.time
+    ):
+        self.window_days = window_days
+        self.min_observations = min_observations
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self.session_factory = session_factory
+        self.clock = clock
+        self._closes: Dict[str, Dict[str, float]] = {}  # symbol -> {YYYY-MM-DD: close}
+        self._dirty: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.matrix = EMPTY_MATRIX
+        self._next_refresh = 0.0
+        self._refresher: Optional[threading.Thread] = None
+
+    def _day(self, timestamp: Optional[float] = None) -> str:
+        return datetime.utcfromtimestamp(self.clock() if timestamp is None else timestamp).strftime("%Y-%m-%d")
+
+    def record(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        """Latest accepted price becomes the symbol's close for that day"""
+        if not price or not math.isfinite(price) or price <= 0:
+            return
+        day = self._day(timestamp)
+        with self._lock:
+            closes = self._closes.setdefault(symbol, {})
+            closes[day] = price
+            if len(closes) > self.window_days + 1:
+                for old in sorted(closes)[:len(closes) - self.window_days - 1]:
+                    del closes[old]
+            self._dirty[(symbol, day)] = price
+
+    def load(self):
+        """Reload recent closes from the database (called at startup)"""
+        if self.session_factory is None:
+            return
+        db = self.session_factory()
+        try:
+            rows = db.query(DailyClose.symbol, DailyClose.close_date, DailyClose.close).order_by(
+                DailyClose.close_date.desc()
+            ).limit(self.window_days * 500)
+            with self._lock:
+                for symbol, day, close in rows:
+                    closes = self._closes.setdefault(symbol, {})
+                    if len(closes) <= self.window_days:
+                        closes.setdefault(day, close)
+        finally:
+            db.close()
+        self.refresh()
+
+    def _persist(self):
+        """Upsert closes recorded since the last refresh"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty or self.session_factory is None:
+            return
+        try:
+            db = self.session_factory()
+            try:
+                for (symbol, day), close in dirty.items():
+                    row = db.query(DailyClose).filter(
+                        DailyClose.symbol == symbol,
+                        DailyClose.close_date == day
+                    ).first()
+                    if row:
+                        row.close = close
+                    else:
+                        db.add(DailyClose(symbol=symbol, close_date=day, close=close))
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"Error persisting daily closes: {str(e)}")
+
+    def refresh(self) -> CorrelationMatrix:
+        """Persist new closes and rebuild the matrices"""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> CorrelationMatrix:
+        self._next_refresh = self.clock() + self.refresh_seconds
+        self._persist()
+        with self._lock:
+            history = {s: dict(c) for s, c in self._closes.items() if len(c) > self.min_observations}
+        self.matrix = self._build(history)
+        logger.info(f"Correlation matrix rebuilt for {len(self.matrix)} symbols")
+        return self.matrix
+
+    def _build(self, history: Dict[str, Dict[str, float]]) -> CorrelationMatrix:
+        if not history:
+            return EMPTY_MATRIX
+        symbols = sorted(history)
+        days = sorted({day for closes in history.values() for day in closes})[-(self.window_days + 1):]
+        day_index = {day: i for i, day in enumerate(days)}
+
+        prices = np.full((len(days), len(symbols)), np.nan)
+        for j, symbol in enumerate(symbols):
+            for day, close in history[symbol].items():
+                i = day_index.get(day)
+                if i is not None:
+                    prices[i, j] = close
+
+        # Returns only between consecutive days where both closes exist
+        returns = np.ma.masked_invalid(np.diff(np.log(prices), axis=0))
+        observations = (~np.ma.getmaskarray(returns)).sum(axis=0)
+        keep = observations >= self.min_observations
+        if not keep.any():
+            return EMPTY_MATRIX
+        returns = returns[:, keep]
+        symbols = [s for s, k in zip(symbols, keep) if k]
+
+        covariance = np.ma.cov(returns, rowvar=False, allow_masked=True).filled(0.0)
+        covariance = np.atleast_2d(covariance)
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(std, std)
+        correlation = np.nan_to_num(correlation)
+        correlation = np.where(correlation >= self.threshold, correlation, 0.0)
+        np.fill_diagonal(correlation, 1.0)
+        return CorrelationMatrix(symbols, covariance, correlation, observations[keep])
+
+    def current(self) -> CorrelationMatrix:
+        """Cached matrix; once the refresh interval has passed, a rebuild starts in the background"""
+        # Only one rebuild at a time; every caller keeps using the previous snapshot meanwhile
+        matrix = self.matrix
+        if self.clock() >= self._next_refresh and self._refresh_lock.acquire(blocking=False):
+            self._refresher = threading.Thread(target=self._background_refresh, name="correlation-refresh", daemon=True)
+            self._refresher.start()
+        return matrix
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.error(f"Correlation refresh failed: {str(e)}")
+        finally:
+            self._refresh_lock.release()
+
+    def wait_for_refresh(self, timeout: Optional[float] = None):
+        """Block until a background rebuild started by current() has finished"""
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+
+    def correlated_exposure(self, weights: Dict[str, float], symbol: str, trade_weight: float) -> float:
+        """
+        Trade weight plus correlation-weighted current weights (fractions of equity)
+        
+        Positions not in the matrix (too little history) count as uncorrelated.
+        """
+        matrix = self.current()
+        i = matrix.index.get(symbol)
+        if i is None:
+            return weights.get(symbol, 0.0) + trade_weight
+
+        w = np.zeros(len(matrix))
+        for other, weight in weights.items():
+            j = matrix.index.get(other)
+            if j is not None:
+                w[j] = weight
+        w[i] += trade_weight
+        return float((matrix.correlation @ w)[i])
+
+    def gate_inputs(self, weights: Dict[str, float], symbol: str, trade_weight: float) -> Dict[str, float]:
+        """correlated_exposure for gate 10"""
+        return {"correlated_exposure": self.correlated_exposure(weights, symbol, trade_weight)}
+
+    def correlated_with(self, symbol: str) -> Dict[str, float]:
+        """Symbols at or above the correlation threshold with symbol"""
+        matrix = self.current()
+        i = matrix.index.get(symbol)
+        if i is None:
+            return {}
+        return {
+            other: round(float(matrix.correlation[i, j]), 4)
+            for j, other in enumerate(matrix.symbols)
+            if j != i and matrix.correlation[i, j] > 0
+        }
+
+    def status(self) -> Dict[str, Any]:
+        matrix = self.matrix
+        return {
+            "symbols_tracked": len(self._closes),
+            "symbols_in_matrix": len(matrix),
+            "built_at": datetime.utcfromtimestamp(matrix.built_at).isoformat() if len(matrix) else None,
+            "window_days": self.window_days,
+            "threshold": self.threshold
+        }
+
+
+# Create singleton instance
+correlation_service = CorrelationService(
+    window_days=settings.CORRELATION_WINDOW_DAYS,
+    min_observations=settings.CORRELATION_MIN_OBSERVATIONS,
+    threshold=settings.CORRELATION_THRESHOLD,
+    refresh_seconds=settings.CORRELATION_REFRESH_SECONDS
+)
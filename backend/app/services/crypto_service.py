@@ -0,0 +1,271 @@
+"""
+Crypto quote service - pooled exchange client, short TTL cache, request
+coalescing and tick streaming for /api/market/crypto
+
+Crypto trades 24/7, so quotes carry the continuous session model instead of
+the equity exchange calendar. Exchange access goes through a pluggable
+adapter; FakeExchangeAdapter serves deterministic ticks for tests and local
+development without any upstream calls.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import httpx
+
+from app.config import settings
+from app.utils.market_calendar import crypto_calendar
+
+logger = logging.getLogger(__name__)
+
+QUOTE_CURRENCIES = ("USDT", "USDC", "USD", "EUR", "GBP", "BTC", "ETH")
+
+
+def normalize_pair(symbol: str, default_quote: str = "USD") -> str:
+    """BTC, btcusd, BTC/USD, BTC-USD -> BTC-USD"""
+    symbol = symbol.strip().upper().replace("/", "-").replace("_", "-")
+    if "-" in symbol:
+        return symbol
+    for quote in QUOTE_CURRENCIES:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return f"{symbol[:-len(quote)]}-{quote}"
+    return f"{symbol}-{default_quote}"
+
+
+class CryptoExchangeAdapter:
+    """Base class for exchange adapters; implement fetch_ticker"""
+
+    name = "base"
+
+    async def fetch_ticker(self, client: httpx.AsyncClient, pair: str) -> Optional[Dict[str, Any]]:
+        """Return a standardized quote for pair (e.g. BTC-USD) or None if unknown"""
+        raise NotImplementedError
+
+
+class CoinbaseAdapter(CryptoExchangeAdapter):
+    """Coinbase Exchange public market data (no API key required)"""
+
+    name = "coinbase"
+    base_url = "https://api.exchange.coinbase.com"
+
+    async def fetch_ticker(self, client: httpx.AsyncClient, pair: str) -> Optional[Dict[str, Any]]:
+        try:
+            ticker_resp, stats_resp = await asyncio.gather(
+                client.get(f"{self.base_url}/products/{pair}/ticker"),
+                client.get(f"{self.base_url}/products/{pair}/stats"),
+            )
+            if ticker_resp.status_code == 404:
+                logger.warning(f"Unknown Coinbase product: {pair}")
+                return None
+            ticker_resp.raise_for_status()
+            stats_resp.raise_for_status()
+            ticker = ticker_resp.json()
+            stats = stats_resp.json()
+
+            price = float(ticker["price"])
+            return {
+                "symbol": pair,
+                "current_price": price,
+                "bid": float(ticker.get("bid") or price),
+                "ask": float(ticker.get("ask") or price),
+                "high": float(stats.get("high") or price),
+                "low": float(stats.get("low") or price),
+                "open": float(stats.get("open") or price),
+                "prev_close": float(stats.get("open") or price),  # 24h reference price
+                "volume": float(ticker.get("volume") or stats.get("volume") or 0),
+                "timestamp": datetime.utcnow(),
+                "currency": pair.split("-")[1],
+                "source": self.name
+            }
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                logger.warning(f"Coinbase rate limit reached")
+            else:
+                logger.warning(f"Coinbase API error: {e.response.status_code}")
+        except Exception as e:
+            logger.warning(f"Coinbase error for {pair}: {str(e)}")
+        return None
+
+
+class FakeExchangeAdapter(CryptoExchangeAdapter):
+    """Local random-walk exchange for tests and offline development"""
+
+    name = "fake"
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None, seed: int = 7, latency: float = 0.0):
+        self.prices = dict(prices or {"BTC-USD": 65000.0, "ETH-USD": 3200.0, "SOL-USD": 150.0})
+        self.opens = dict(self.prices)
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.calls = 0
+
+    async def fetch_ticker(self, client: httpx.AsyncClient, pair: str) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if pair not in self.prices:
+            return None
+        price = self.prices[pair] * (1 + self.rng.gauss(0, 0.0005))
+        self.prices[pair] = price
+        return {
+            "symbol": pair,
+            "current_price": price,
+            "bid": price * 0.9999,
+            "ask": price * 1.0001,
+            "high": max(price, self.opens[pair]),
+            "low": min(price, self.opens[pair]),
+            "open": self.opens[pair],
+            "prev_close": self.opens[pair],
+            "volume": 1000.0,
+            "timestamp": datetime.utcnow(),
+            "currency": pair.split("-")[1],
+            "source": self.name
+        }
+
+
+ADAPTERS = {
+    "coinbase": CoinbaseAdapter,
+    "fake": FakeExchangeAdapter,
+}
+
+
+class CryptoQuoteService:
+    """Cached, coalesced crypto quotes with fan-out streaming"""
+
+    def __init__(
+        self,
+        adapter: CryptoExchangeAdapter,
+        cache_ttl: float = 1.0,
+        stream_interval: float = 1.0
+    ):
+        self.adapter = adapter
+        self.cache_ttl = cache_ttl
+        self.stream_interval = stream_interval
+        self.calendar = crypto_calendar
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: Dict[str, tuple] = {}  # pair -> (expires_at, quote)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "upstream_calls": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool for all upstream calls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._client
+
+    async def get_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Latest quote for a pair; concurrent misses share one upstream call"""
+        pair = normalize_pair(symbol)
+        self.stats["requests"] += 1
+
+        cached = self._cache.get(pair)
+        if cached and cached[0] > time.monotonic():
+            self.stats["cache_hits"] += 1
+            return cached[1]
+
+        inflight = self._inflight.get(pair)
+        if inflight:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The leader was cancelled (its client went away), not us: take over the fetch
+                return await self.get_quote(symbol)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[pair] = future
+        try:
+            self.stats["upstream_calls"] += 1
+            quote = await self.adapter.fetch_ticker(self.client, pair)
+            if quote:
+                quote["market_open"] = self.calendar.is_open()
+                self._cache[pair] = (time.monotonic() + self.cache_ttl, quote)
+            future.set_result(quote)
+            return quote
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; mark it retrieved so it is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Cancelled mid-fetch; release the waiters rather than leave them hanging
+                future.cancel()
+            self._inflight.pop(pair, None)
+
+    async def stream(self, symbol: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield ticks for a pair. One poller per pair feeds every subscriber;
+        slow subscribers only ever see the latest tick.
+        """
+        pair = normalize_pair(symbol)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(pair, set()).add(queue)
+        if pair not in self._pollers or self._pollers[pair].done():
+            self._pollers[pair] = asyncio.create_task(self._poll(pair))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers = self._subscribers.get(pair, set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(pair, None)
+                poller = self._pollers.pop(pair, None)
+                if poller:
+                    poller.cancel()
+
+    async def _poll(self, pair: str):
+        last_price = None
+        while self._subscribers.get(pair):
+            try:
+                quote = await self.get_quote(pair)
+                if quote and quote["current_price"] != last_price:
+                    last_price = quote["current_price"]
+                    for queue in list(self._subscribers.get(pair, ())):
+                        if queue.full():
+                            queue.get_nowait()
+                        queue.put_nowait(quote)
+            except Exception as e:
+                logger.warning(f"Crypto stream poll failed for {pair}: {str(e)}")
+            await asyncio.sleep(self.stream_interval)
+
+    def clear_cache(self, symbol: Optional[str] = None):
+        if symbol:
+            self._cache.pop(normalize_pair(symbol), None)
+        else:
+            self._cache.clear()
+
+    async def aclose(self):
+        """Stop pollers and close the connection pool (called on shutdown)"""
+        for poller in self._pollers.values():
+            poller.cancel()
+        self._pollers.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_crypto_service() -> CryptoQuoteService:
+    adapter_cls = ADAPTERS.get(settings.CRYPTO_EXCHANGE, CoinbaseAdapter)
+    return CryptoQuoteService(
+        adapter_cls(),
+        cache_ttl=settings.CRYPTO_QUOTE_TTL_SECONDS,
+        stream_interval=settings.CRYPTO_STREAM_INTERVAL_SECONDS
+    )
+
+
+# Create singleton instance
+crypto_quote_service = create_crypto_service()
@@ -0,0 +1,582 @@
+"""
+Staged trade execution for /api/trading/execute and /api/trading/paper/execute
+
+Stages: auth -> (lock -> load || quote) -> gates -> log -> persist
+
+load through persist runs under the portfolio's lock (see portfolio_locks),
+so concurrent orders for one portfolio cannot both spend the same cash.
+
+The quote fetch starts once the JWT checks out (so anonymous callers cannot
+spend quote budget). It runs concurrently with the user/portfolio load and
+the cash check, which run in the threadpool. End-to-end latency is therefore
+close to the slower of the two rather than their sum. Every stage is timed.
+The timings are returned with the trade and as a Server-Timing header.
+
+Baskets (/api/trading/basket/execute) go through the same stages once for
+all legs: quotes for every distinct symbol are fetched together, the legs are
+validated in one BatchValidationGates pass, and every trade is committed in a
+single transaction.
+
+Paper orders are committed PENDING and handed to the paper fill simulator,
+which fills them off the request path (see paper_fill_simulator). Paper
+LIMIT / STOP orders are committed RESTING and go into the order book instead
+(see paper_order_book).
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models import Portfolio, User
+from app.schemas import BasketExecutionRequest, TradeExecutionRequest, TradeResponse
+from app.services.correlation_service import correlation_service
+from app.services.exposure_service import exposure_service
+from app.services.market_data_service import market_data_service
+from app.services.paper_fill_simulator import paper_fill_simulator
+from app.services.paper_order_book import ENTRY_TYPES, MARKET
+from app.services.portfolio_locks import portfolio_locks
+from app.services.quota_ledger import PRIORITY_HIGH
+from app.services.trading_engine import RESTING, TradingEngine
+from app.services.trigger_index import ORDER_TYPES, TRAILING_STOP
+from app.utils.gate_pipeline import DIAGNOSTIC, FAST
+from app.utils.gate_results import render_gate_results
+from app.utils.gate_rules import InvalidGateRules, gate_rule_cache
+from app.utils.market_calendar import market_calendar
+from app.utils.quote_tokens import InvalidQuoteToken, verify_quote_token
+from app.utils.validators import BatchValidationGates, ValidationGates
+
+logger = logging.getLogger(__name__)
+
+# Attempts when a concurrent writer (another worker) changed the portfolio mid-order
+OPTIMISTIC_RETRIES = 3
+
+
+class StageTimer:
+    """Wall-clock duration per named stage"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - start
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage latencies plus end-to-end total, in milliseconds"""
+        result = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        result["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return result
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+def build_market_data(request: Any, live_quote: Dict[str, Any]) -> Dict[str, Any]:
+    """Gate input from the live quote and the order or basket leg (ONLY real market data, no hardcoded fallbacks)"""
+    return {
+        "current_price": live_quote.get("current_price"),
+        "high": live_quote.get("high"),
+        "low": live_quote.get("low"),
+        "prev_close": live_quote.get("prev_close"),
+        "volume": live_quote.get("volume"),
+        "volatility": live_quote.get("volatility"),
+        "market_open": market_calendar.is_open(),
+        "entry_price": request.entry_price,
+        "stop_loss": request.stop_loss,
+        "take_profit": request.take_profit,
+        "direction": request.direction,
+        "ai_confidence": request.ai_confidence,
+        "quote_timestamp": live_quote.get("timestamp") or datetime.utcnow(),
+        "quote_source": live_quote.get("source"),
+        "quote_suspect": live_quote.get("suspect", False),
+        "quote_suspect_reason": live_quote.get("suspect_reason"),
+        "timeframe": "day"
+    }
+
+
+def load_execution_context(
+    db: Session,
+    email: str,
+    request: Any,
+    check_cash: bool
+) -> Tuple[User, Portfolio]:
+    """User, portfolio ownership and cash checks (runs in the threadpool)"""
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    portfolio = db.query(Portfolio).filter(
+        Portfolio.id == request.portfolio_id,
+        Portfolio.user_id == user.id
+    ).first()
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found"
+        )
+
+    if check_cash:
+        trade_cost = request.entry_price * request.quantity
+        if trade_cost > portfolio.cash_balance:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient funds. Required: ${trade_cost:.2f}, Available: ${portfolio.cash_balance:.2f}"
+            )
+    return user, portfolio
+
+
+def portfolio_validators(portfolio: Portfolio) -> ValidationGates:
+    """The portfolio's compiled gate rules; 409 while its stored rules are invalid"""
+    try:
+        return gate_rule_cache.get(portfolio.id, portfolio.gate_rules)
+    except InvalidGateRules as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{str(e)}. Fix them via PUT /api/portfolio/{portfolio.id}/gate-rules before trading"
+        )
+
+
+async def fetch_quote(symbol: str) -> Dict[str, Any]:
+    """Fetch the live quote (MUST succeed)"""
+    try:
+        live_quote = await market_data_service.get_quote(symbol, priority=PRIORITY_HIGH)
+    except Exception as quote_error:
+        logger.error(f"CRITICAL: Failed to fetch real market data for {symbol}: {str(quote_error)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Unable to fetch real market data for {symbol}. Please ensure API keys are configured and markets are open. Error: {str(quote_error)}"
+        )
+    if not live_quote:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unable to fetch market data for {symbol}"
+        )
+    logger.info(f"Fetched real quote for {symbol}: ${live_quote.get('current_price')} (source: {live_quote.get('source')})")
+    return live_quote
+
+
+def check_order_type(order: Any, label: str = "") -> None:
+    """400 for an unknown order type or a non-positive trail_amount"""
+    order.order_type = (order.order_type or ORDER_TYPES[0]).upper()
+    if order.order_type not in ORDER_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{label}Unknown order_type {order.order_type}; expected one of {', '.join(ORDER_TYPES)}"
+        )
+    if order.trail_amount is not None and (order.order_type != TRAILING_STOP or order.trail_amount <= 0):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{label}trail_amount must be positive and is only valid for TRAILING_STOP orders"
+        )
+
+
+def check_entry_type(order: Any, paper_trading: bool, label: str = "") -> None:
+    """400 for an unknown entry type or a live LIMIT / STOP order; 503 while paper orders cannot rest"""
+    order.entry_type = (order.entry_type or MARKET).upper()
+    if order.entry_type not in ENTRY_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{label}Unknown entry_type {order.entry_type}; expected one of {', '.join(ENTRY_TYPES)}"
+        )
+    if order.entry_type == MARKET:
+        return
+    if not paper_trading:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{label}{order.entry_type} orders are only available for paper trading"
+        )
+    if not paper_fill_simulator.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{label}{order.entry_type} orders need the paper fill simulator, which is not running"
+        )
+
+
+def with_order_type(signal: Dict[str, Any], order: Any) -> Dict[str, Any]:
+    signal["order_type"] = order.order_type
+    signal["trail_amount"] = order.trail_amount
+    signal["entry_type"] = getattr(order, "entry_type", MARKET)
+    if signal["entry_type"] != MARKET:
+        signal["limit_price"] = order.entry_price
+    return signal
+
+
+def quote_from_token(token: str, symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    Signed snapshot quote, or None once it is older than the default gate 1
+    allows; the portfolio's own limit is checked by snapshot_expired once the
+    portfolio is loaded
+    """
+    try:
+        quote = verify_quote_token(token, symbol)
+    except InvalidQuoteToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if quote["age_seconds"] > ValidationGates.MAX_QUOTE_AGE_SECONDS:
+        logger.info(f"Quote token for {symbol} is {quote['age_seconds']:.1f}s old, refetching")
+        return None
+    return quote
+
+
+def snapshot_expired(quote: Dict[str, Any], validators: ValidationGates) -> bool:
+    """True when a token snapshot is older than this portfolio's gate 1 allows (refetch it)"""
+    stamp = quote.get("timestamp")
+    return stamp is not None and (datetime.utcnow() - stamp).total_seconds() > validators.MAX_QUOTE_AGE_SECONDS
+
+
+async def execute_staged(
+    request: TradeExecutionRequest,
+    email: str,
+    db: Session,
+    paper_trading: bool = False,
+    diagnostics: bool = False,
+    timer: Optional[StageTimer] = None
+) -> Dict[str, Any]:
+    """Run the execution stages; raises HTTPException on rejection"""
+    timer = timer or StageTimer()
+    check_order_type(request)
+    check_entry_type(request, paper_trading)
+
+    snapshot = None
+    if request.quote_token:
+        with timer.stage("token"):
+            snapshot = quote_from_token(request.quote_token, request.symbol)
+
+    async def timed_quote():
+        if snapshot is not None:
+            return snapshot
+        with timer.stage("quote"):
+            return await fetch_quote(request.symbol)
+
+    quote_task = asyncio.create_task(timed_quote())
+    # A failed quote is re-raised below; if the load fails first, nobody awaits it
+    quote_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        async with portfolio_locks.hold(request.portfolio_id, timer):
+            for attempt in range(1, OPTIMISTIC_RETRIES + 1):
+                try:
+                    trade, signal = await _execute_locked(request, email, db, paper_trading, diagnostics, timer, quote_task)
+                    break
+                except StaleDataError:
+                    # Another worker changed the portfolio since we loaded it: re-check against the fresh row
+                    await run_in_threadpool(db.rollback)
+                    if attempt == OPTIMISTIC_RETRIES:
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="Portfolio was modified concurrently, please retry"
+                        )
+                    logger.warning(f"Portfolio {request.portfolio_id} changed during execution, retrying (attempt {attempt})")
+    finally:
+        if not quote_task.done():
+            quote_task.cancel()
+
+    response = TradeResponse.from_orm(trade).dict()
+    response["validation_gates"] = render_gate_results(signal.get("validation_gates"))
+    response["quote_snapshot"] = snapshot is not None and "refetch" not in timer.stages
+    response["latency_ms"] = timer.as_dict()
+    logger.info(f"Execution latency for {request.symbol}: {response['latency_ms']}")
+    return response
+
+
+async def _execute_locked(
+    request: TradeExecutionRequest,
+    email: str,
+    db: Session,
+    paper_trading: bool,
+    diagnostics: bool,
+    timer: StageTimer,
+    quote_task: "asyncio.Task"
+) -> Tuple[Any, Dict[str, Any]]:
+    """load -> gates -> persist for one order, with the portfolio lock held"""
+    with timer.stage("load"):
+        user, portfolio = await run_in_threadpool(
+            load_execution_context, db, email, request, not paper_trading
+        )
+    live_quote = await quote_task
+    validators = portfolio_validators(portfolio)
+    if request.quote_token and snapshot_expired(live_quote, validators):
+        # Fresh enough for the default rules but not for this portfolio's
+        with timer.stage("refetch"):
+            live_quote = await fetch_quote(request.symbol)
+
+    logger.info(f"{'Paper trade' if paper_trading else 'Trade'} execution request for {request.symbol} by user {user.id}")
+    engine = TradingEngine(db)
+
+    with timer.stage("gates"):
+        market_data = build_market_data(request, live_quote)
+        equity = portfolio.current_equity or portfolio.starting_capital
+        market_data.update(exposure_service.gate_inputs(
+            portfolio.id,
+            request.symbol,
+            request.entry_price * request.quantity,
+            equity
+        ))
+        market_data.update(correlation_service.gate_inputs(
+            exposure_service.weights(portfolio.id, equity),
+            request.symbol,
+            market_data["trade_size"]
+        ))
+
+        # ?diagnostics=true runs every gate so the error lists all failures
+        signal, gate_run, rejection = engine.evaluate_trade_signal(
+            request.symbol,
+            request.direction,
+            market_data,
+            request.ai_confidence,
+            request.entry_reasoning or "",
+            mode=DIAGNOSTIC if diagnostics else FAST,
+            validators=validators
+        )
+
+    if not signal:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trade validation failed - {rejection}"
+        )
+
+    # Paper orders are filled later by the simulator when it is running
+    simulate_fill = paper_trading and paper_fill_simulator.running
+    trade = await run_in_threadpool(
+        engine.execute_trade, request.portfolio_id, with_order_type(signal, request), request.quantity, paper_trading, timer, simulate_fill
+    )
+    if not trade:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to execute paper trade" if paper_trading else "Failed to execute trade"
+        )
+    if trade.status == RESTING:
+        paper_fill_simulator.rest(trade, live_quote.get("current_price"))
+    elif simulate_fill:
+        paper_fill_simulator.submit(trade, live_quote)
+    return trade, signal
+
+
+async def fetch_basket_quotes(symbols: List[str]) -> Dict[str, Any]:
+    """Live quote per distinct symbol, fetched concurrently; failures map to the exception"""
+    unique = list(dict.fromkeys(symbols))
+    quotes = await asyncio.gather(
+        *(market_data_service.get_quote(symbol, priority=PRIORITY_HIGH) for symbol in unique),
+        return_exceptions=True
+    )
+    return dict(zip(unique, quotes))
+
+
+def _leg_result(index: int, leg: Any, status_: str, reason: Optional[str] = None) -> Dict[str, Any]:
+    return {"index": index, "symbol": leg.symbol, "status": status_, "reason": reason}
+
+
+async def execute_basket(
+    request: BasketExecutionRequest,
+    email: str,
+    db: Session,
+    paper_trading: bool = False,
+    timer: Optional[StageTimer] = None
+) -> Dict[str, Any]:
+    """
+    Validate and execute every leg of a basket
+    
+    atomic=True: any rejected leg rejects the basket (400, with per-leg
+    results) and nothing is written. atomic=False: passing legs are executed
+    and the rest are reported as REJECTED. Legs are sized in order, so each
+    leg's exposure and cash checks include the legs before it.
+    """
+    timer = timer or StageTimer()
+    legs = request.legs
+    if not legs or len(legs) > settings.MAX_BASKET_LEGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A basket needs between 1 and {settings.MAX_BASKET_LEGS} legs"
+        )
+    for i, leg in enumerate(legs):
+        leg.symbol = leg.symbol.upper()
+        check_order_type(leg, f"Leg {i}: ")
+        check_entry_type(leg, paper_trading, f"Leg {i}: ")
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(legs)
+    quotes: Dict[int, Dict[str, Any]] = {}
+    if any(leg.quote_token for leg in legs):
+        with timer.stage("token"):
+            for i, leg in enumerate(legs):
+                if not leg.quote_token:
+                    continue
+                try:
+                    snapshot = quote_from_token(leg.quote_token, leg.symbol)
+                except HTTPException as e:
+                    results[i] = _leg_result(i, leg, "REJECTED", e.detail)
+                    continue
+                if snapshot is not None:
+                    quotes[i] = snapshot
+    
+    async def timed_quotes():
+        with timer.stage("quote"):
+            return await fetch_basket_quotes([
+                leg.symbol for i, leg in enumerate(legs) if i not in quotes and results[i] is None
+            ])
+    
+    quote_task = asyncio.create_task(timed_quotes())
+    quote_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        async with portfolio_locks.hold(request.portfolio_id, timer):
+            try:
+                return await _execute_basket_locked(request, email, db, paper_trading, timer, quote_task, results, quotes)
+            except StaleDataError:
+                await run_in_threadpool(db.rollback)
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Portfolio was modified concurrently, please retry"
+                )
+    finally:
+        if not quote_task.done():
+            quote_task.cancel()
+
+
+async def _execute_basket_locked(
+    request: BasketExecutionRequest,
+    email: str,
+    db: Session,
+    paper_trading: bool,
+    timer: StageTimer,
+    quote_task: "asyncio.Task",
+    results: List[Optional[Dict[str, Any]]],
+    quotes: Dict[int, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Validate and persist the basket legs, with the portfolio lock held"""
+    legs = request.legs
+    with timer.stage("load"):
+        user, portfolio = await run_in_threadpool(
+            load_execution_context, db, email, request, False
+        )
+    fetched = await quote_task
+    validators = portfolio_validators(portfolio)
+    expired = [i for i, quote in quotes.items() if snapshot_expired(quote, validators)]
+    if expired:
+        # Token snapshots too old for this portfolio's gate 1 are refetched, not rejected
+        for i in expired:
+            del quotes[i]
+        with timer.stage("refetch"):
+            fetched = {**fetched, **await fetch_basket_quotes([legs[i].symbol for i in expired])}
+    
+    logger.info(f"{'Paper basket' if paper_trading else 'Basket'} of {len(legs)} legs for portfolio {portfolio.id} by user {user.id}")
+    for i, leg in enumerate(legs):
+        if i in quotes or results[i] is not None:
+            continue
+        quote = fetched.get(leg.symbol)
+        if isinstance(quote, Exception) or not quote:
+            logger.error(f"Basket leg {i}: no market data for {leg.symbol}: {quote}")
+            results[i] = _leg_result(i, leg, "REJECTED", f"Unable to fetch market data for {leg.symbol}")
+        else:
+            quotes[i] = quote
+    
+    engine = TradingEngine(db)
+    orders: List[Tuple[int, Dict[str, Any]]] = []
+    with timer.stage("gates"):
+        equity = portfolio.current_equity or portfolio.starting_capital
+        weights = exposure_service.weights(portfolio.id, equity)
+        pending_notional: Dict[str, float] = {}
+        rows: List[int] = []
+        market_data: List[Dict[str, Any]] = []
+        for i, leg in enumerate(legs):
+            if i not in quotes:
+                continue
+            data = build_market_data(leg, quotes[i])
+            notional = leg.entry_price * leg.quantity
+            data.update(exposure_service.gate_inputs(portfolio.id, leg.symbol, notional, equity))
+            if equity > 0:
+                data["current_exposure"] += pending_notional.get(leg.symbol, 0.0) / equity
+            data.update(correlation_service.gate_inputs(weights, leg.symbol, data["trade_size"]))
+            # Later legs see this one as already held
+            pending_notional[leg.symbol] = pending_notional.get(leg.symbol, 0.0) + notional
+            weights[leg.symbol] = weights.get(leg.symbol, 0.0) + data["trade_size"]
+            rows.append(i)
+            market_data.append(data)
+        
+        columns = {key: [data.get(key) for data in market_data] for key in (market_data[0] if market_data else {})}
+        batch = BatchValidationGates(validators).evaluate(columns)
+        failed = batch.failed_reasons()
+        
+        cash = portfolio.cash_balance
+        for row, i in enumerate(rows):
+            leg = legs[i]
+            if row in failed:
+                gate = failed[row][0]
+                results[i] = _leg_result(i, leg, "REJECTED", f"Gate {gate.gate}: {gate.reason}")
+                continue
+            signal, rejection = engine.build_signal(
+                leg.symbol, leg.direction, market_data[row], batch.reasons(row),
+                leg.ai_confidence, leg.entry_reasoning or ""
+            )
+            if not signal:
+                results[i] = _leg_result(i, leg, "REJECTED", rejection)
+                continue
+            cost = leg.entry_price * leg.quantity
+            if not paper_trading and cost > cash:
+                results[i] = _leg_result(i, leg, "REJECTED", f"Insufficient funds. Required: ${cost:.2f}, Available: ${cash:.2f}")
+                continue
+            cash -= cost
+            orders.append((i, with_order_type(signal, leg)))
+    
+    rejected = sum(1 for result in results if result is not None)
+    if rejected and request.atomic:
+        for i, signal in orders:
+            results[i] = _leg_result(i, legs[i], "SKIPPED")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": f"Basket rejected - {rejected} of {len(legs)} legs failed validation", "legs": results}
+        )
+    
+    if orders:
+        simulate_fill = paper_trading and paper_fill_simulator.running
+        trades = await run_in_threadpool(
+            engine.execute_basket,
+            request.portfolio_id,
+            [(signal, legs[i].quantity) for i, signal in orders],
+            paper_trading,
+            timer,
+            simulate_fill
+        )
+        if trades is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Failed to execute basket"
+            )
+        if simulate_fill:
+            for (i, _), trade in zip(orders, trades):
+                if trade.status == RESTING:
+                    paper_fill_simulator.rest(trade, quotes[i].get("current_price"))
+                else:
+                    paper_fill_simulator.submit(trade, quotes.get(i))
+        for (i, signal), trade in zip(orders, trades):
+            results[i] = _leg_result(i, legs[i], "EXECUTED")
+            results[i]["trade"] = TradeResponse.from_orm(trade).dict()
+            results[i]["validation_gates"] = render_gate_results(signal["validation_gates"])
+    
+    response = {
+        "portfolio_id": request.portfolio_id,
+        "atomic": request.atomic,
+        "executed": len(orders),
+        "rejected": rejected,
+        "legs": results,
+        "latency_ms": timer.as_dict()
+    }
+    logger.info(f"Basket latency for portfolio {request.portfolio_id}: {response['latency_ms']}")
+    return response
@@ -0,0 +1,143 @@
+"""
+Portfolio exposure service - in-memory per-portfolio, per-symbol notional
+
+Feeds gate 7 (portfolio exposure) without touching the database. Notional is
+the entry cost (entry_price * quantity) of open trades. It is updated
+incrementally whenever a trade is executed or closed, and rebuilt from the
+trades table at startup.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.portfolio import Portfolio
+from app.models.trade import Trade
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioExposure:
+    """Open notional for one portfolio"""
+
+    __slots__ = ("equity", "by_symbol", "gross")
+
+    def __init__(self, equity: float = 0.0):
+        self.equity = equity
+        self.by_symbol: Dict[str, float] = {}
+        self.gross = 0.0
+
+    def add(self, symbol: str, notional: float):
+        value = self.by_symbol.get(symbol, 0.0) + notional
+        if value <= 1e-9:
+            self.by_symbol.pop(symbol, None)
+        else:
+            self.by_symbol[symbol] = value
+        self.gross = max(self.gross + notional, 0.0)
+
+
+class ExposureService:
+    """Thread-safe exposure aggregates for every portfolio"""
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+        self._portfolios: Dict[int, PortfolioExposure] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        """Reload aggregates from open trades (called at startup)"""
+        db = self.session_factory()
+        try:
+            portfolios = {
+                pid: PortfolioExposure(equity or starting or 0.0)
+                for pid, equity, starting in db.query(
+                    Portfolio.id, Portfolio.current_equity, Portfolio.starting_capital
+                )
+            }
+            rows = db.query(
+                Trade.portfolio_id,
+                Trade.symbol,
+                func.sum(Trade.entry_price * Trade.quantity)
+            ).filter(Trade.status == "OPEN").group_by(Trade.portfolio_id, Trade.symbol)
+            for portfolio_id, symbol, notional in rows:
+                portfolios.setdefault(portfolio_id, PortfolioExposure()).add(symbol, notional or 0.0)
+        finally:
+            db.close()
+
+        with self._lock:
+            self._portfolios = portfolios
+        logger.info(f"Exposure rebuilt for {len(portfolios)} portfolios")
+
+    def _get(self, portfolio_id: int) -> PortfolioExposure:
+        exposure = self._portfolios.get(portfolio_id)
+        if exposure is None:
+            exposure = self._portfolios[portfolio_id] = PortfolioExposure()
+        return exposure
+
+    def on_open(self, portfolio_id: int, symbol: str, notional: float):
+        with self._lock:
+            self._get(portfolio_id).add(symbol, notional)
+
+    def on_close(self, portfolio_id: int, symbol: str, notional: float):
+        with self._lock:
+            self._get(portfolio_id).add(symbol, -notional)
+
+    def set_equity(self, portfolio_id: int, equity: float):
+        with self._lock:
+            self._get(portfolio_id).equity = equity
+
+    def gate_inputs(
+        self,
+        portfolio_id: int,
+        symbol: str,
+        trade_notional: float,
+        equity: Optional[float] = None
+    ) -> Dict[str, float]:
+        """current_exposure and trade_size (fractions of equity) for gate 7"""
+        exposure = self._portfolios.get(portfolio_id)
+        equity = equity or (exposure.equity if exposure else 0.0)
+        if equity <= 0:
+            # Without equity there is nothing to size against; treat any trade as fully concentrated
+            return {"current_exposure": 1.0, "trade_size": 1.0}
+        symbol_notional = exposure.by_symbol.get(symbol, 0.0) if exposure else 0.0
+        return {
+            "current_exposure": symbol_notional / equity,
+            "trade_size": trade_notional / equity,
+        }
+
+    def weights(self, portfolio_id: int, equity: Optional[float] = None) -> Dict[str, float]:
+        """Per-symbol notional as fractions of equity (for the correlation gate)"""
+        with self._lock:
+            exposure = self._portfolios.get(portfolio_id)
+            if exposure is None:
+                return {}
+            by_symbol = dict(exposure.by_symbol)
+            equity = equity or exposure.equity
+        if not equity:
+            return {}
+        return {symbol: notional / equity for symbol, notional in by_symbol.items()}
+
+    def snapshot(self, portfolio_id: int, equity: Optional[float] = None) -> Dict[str, Any]:
+        """Per-symbol notional and percentage exposure"""
+        with self._lock:
+            exposure = self._portfolios.get(portfolio_id) or PortfolioExposure()
+            by_symbol = dict(exposure.by_symbol)
+            gross = exposure.gross
+            equity = equity or exposure.equity
+        return {
+            "portfolio_id": portfolio_id,
+            "equity": equity,
+            "gross_notional": gross,
+            "gross_pct": gross / equity if equity else None,
+            "symbols": {
+                symbol: {"notional": notional, "pct": notional / equity if equity else None}
+                for symbol, notional in sorted(by_symbol.items(), key=lambda kv: -kv[1])
+            }
+        }
+
+
+# Create singleton instance
+exposure_service = ExposureService()
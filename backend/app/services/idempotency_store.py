@@ -0,0 +1,157 @@
+"""
+Idempotency-Key support for order execution
+
+A client that sends an Idempotency-Key header can retry an order safely. The
+first request with a key runs normally, and its outcome is kept for
+IDEMPOTENCY_TTL_SECONDS. A retry with the same key gets the stored response.
+The quote fetch, gates and persistence do not run again. A retry that
+arrives while the original is still running waits for the original's result.
+
+- Keys are scoped per user and per endpoint.
+- Reusing a key with a different request body is rejected with 422.
+- Successes are replayed, and so are deterministic rejections that a retry
+  cannot change: 404 (portfolio not found or not owned) and 422.
+- Everything else is not stored, so a retry gets a fresh attempt. That
+  covers gate and quote 400s (market closed, stale or suspect quote, no
+  market data), 409 conflicts and server errors.
+- The store is an in-process LRU bounded at IDEMPOTENCY_MAX_KEYS entries.
+  Expired entries are dropped as they are found.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rejections replayed for the key's lifetime; any other error lets a retry run again
+REPLAYED_STATUS_CODES = frozenset({status.HTTP_404_NOT_FOUND, status.HTTP_422_UNPROCESSABLE_ENTITY})
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires")
+
+    def __init__(self, fingerprint: str, future: "asyncio.Future", expires: float):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires = expires
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request body"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded TTL map of idempotency key -> in-flight or completed result"""
+
+    def __init__(self, max_keys: int = 10000, ttl_seconds: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.replays = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(
+        self,
+        scope: Hashable,
+        request_fingerprint: str,
+        execute: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run execute() once per scope; returns (result, replayed)
+
+        Raises the stored HTTPException when the original was rejected.
+        """
+        now = self.clock()
+        entry = self._entries.get(scope)
+        if entry is not None and entry.expires <= now:
+            del self._entries[scope]
+            entry = None
+
+        if entry is not None:
+            if entry.fingerprint != request_fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            self._entries.move_to_end(scope)
+            self.replays += 1
+            # shield: a disconnecting retry must not cancel the original
+            outcome = await asyncio.shield(entry.future)
+            return self._unwrap(outcome), True
+
+        future = asyncio.get_running_loop().create_future()
+        # A failed original with no retry waiting must not log "exception never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._entries[scope] = _Entry(request_fingerprint, future, now + self.ttl_seconds)
+        self._evict()
+
+        try:
+            result = await execute()
+        except HTTPException as e:
+            if e.status_code in REPLAYED_STATUS_CODES:
+                future.set_result((False, e))
+            else:
+                self._forget(scope, future, e)
+            raise
+        except BaseException as e:
+            self._forget(scope, future, e)
+            raise
+        future.set_result((True, result))
+        return result, False
+
+    def _forget(self, scope: Hashable, future: "asyncio.Future", error: BaseException):
+        """Transient failure: drop the key so a retry runs again; waiting retries see the error"""
+        if self._entries.get(scope) is not None and self._entries[scope].future is future:
+            del self._entries[scope]
+        if not future.done():
+            future.set_exception(error if isinstance(error, Exception) else asyncio.CancelledError())
+
+    @staticmethod
+    def _unwrap(outcome: Tuple[bool, Any]) -> Any:
+        ok, value = outcome
+        if not ok:
+            raise HTTPException(status_code=value.status_code, detail=value.detail, headers=value.headers)
+        return value
+
+    def _evict(self):
+        now = self.clock()
+        while self._entries:
+            scope, oldest = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_keys and oldest.expires > now:
+                break
+            del self._entries[scope]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._entries), "max_keys": self.max_keys, "replays": self.replays}
+
+
+async def run_idempotent(
+    key: Optional[str],
+    scope: Tuple[Any, ...],
+    payload: Any,
+    execute: Callable[[], Awaitable[Any]]
+) -> Tuple[Any, bool]:
+    """Run through the store when the client sent a key; otherwise just execute"""
+    if not key:
+        return await execute(), False
+    return await idempotency_store.run(scope + (key,), fingerprint(payload), execute)
+
+
+# Create singleton instance
+idempotency_store = IdempotencyStore(
+    max_keys=settings.IDEMPOTENCY_MAX_KEYS,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS
+)
@@ -0,0 +1,277 @@
+"""
+Mark-to-market equity engine
+
+Keeps every portfolio's equity marked at the last accepted price of each
+symbol it holds. Equity is cash plus the signed market value of its open
+positions. Cash already carries the fill notionals: a long's cost has left
+cash and a short's proceeds have entered it. So at the fill price, a new
+position leaves equity unchanged.
+
+Open positions are held as parallel arrays with one row per (portfolio,
+symbol), the same netting as the position ledger:
+
+- pos_portfolio: portfolio index
+- pos_symbol: symbol index
+- pos_qty: signed quantity (negative for shorts, 0 once flat)
+- pos_entry: average entry, used as the mark until the symbol has a price
+
+Whenever the last-price vector changes, every portfolio is revalued at once:
+the rows are priced by gathering last[pos_symbol], and their values are
+scatter-added into per-portfolio totals with np.bincount. One pass is O(rows)
+in numpy, so thousands of portfolios are revalued in about a millisecond.
+
+Fills reach the engine from TradingEngine once their transaction has
+committed. Quotes reach it from MarketDataService, like the trigger index.
+Equity is written to Portfolio.current_equity every MTM_PERSIST_SECONDS, for
+the portfolios whose equity changed, and once more at shutdown. The write is
+a plain UPDATE that leaves version_id alone, so order transactions are never
+made stale by it.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, update
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.portfolio import Portfolio
+from app.models.trade import Position
+
+logger = logging.getLogger(__name__)
+
+# Equity changes smaller than this are not written back
+PERSIST_EPSILON = 0.005
+
+
+def _grow(array: np.ndarray, size: int, fill: Any) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array), 64), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class MarkToMarket:
+    """Position arrays and last prices, revalued in one vectorized pass"""
+
+    def __init__(self, session_factory: Callable = SessionLocal, persist_seconds: float = 5.0):
+        self.session_factory = session_factory
+        self.persist_seconds = persist_seconds
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._reset()
+
+    def _reset(self):
+        self._symbols: Dict[str, int] = {}
+        self._portfolios: Dict[int, int] = {}
+        self._portfolio_ids: List[int] = []
+        self._rows: Dict[Tuple[int, int], int] = {}
+        self.last = np.empty(0, dtype=np.float64)
+        self.cash = np.empty(0, dtype=np.float64)
+        self.equity = np.empty(0, dtype=np.float64)
+        self.persisted = np.empty(0, dtype=np.float64)
+        self.pos_portfolio = np.empty(0, dtype=np.intp)
+        self.pos_symbol = np.empty(0, dtype=np.intp)
+        self.pos_qty = np.empty(0, dtype=np.float64)
+        self.pos_entry = np.empty(0, dtype=np.float64)
+        self.revaluations = 0
+        self.revalue_seconds = 0.0
+        self.persisted_rows = 0
+
+    # --- state -------------------------------------------------------------
+
+    def _symbol(self, symbol: str) -> int:
+        index = self._symbols.get(symbol)
+        if index is None:
+            index = self._symbols[symbol] = len(self._symbols)
+            self.last = _grow(self.last, index + 1, np.nan)
+        return index
+
+    def _portfolio(self, portfolio_id: int) -> int:
+        index = self._portfolios.get(portfolio_id)
+        if index is None:
+            index = self._portfolios[portfolio_id] = len(self._portfolio_ids)
+            self._portfolio_ids.append(portfolio_id)
+            self.cash = _grow(self.cash, index + 1, 0.0)
+            self.equity = _grow(self.equity, index + 1, 0.0)
+            self.persisted = _grow(self.persisted, index + 1, np.nan)
+        return index
+
+    def _set(self, portfolio_id: int, symbol: str, quantity: float, entry_price: float):
+        key = (self._portfolio(portfolio_id), self._symbol(symbol))
+        row = self._rows.get(key)
+        if row is None:
+            if not quantity:
+                return
+            row = self._rows[key] = len(self._rows)
+            size = row + 1
+            self.pos_portfolio = _grow(self.pos_portfolio, size, 0)
+            self.pos_symbol = _grow(self.pos_symbol, size, 0)
+            self.pos_qty = _grow(self.pos_qty, size, 0.0)
+            self.pos_entry = _grow(self.pos_entry, size, 0.0)
+            self.pos_portfolio[row], self.pos_symbol[row] = key
+        self.pos_qty[row] = quantity
+        self.pos_entry[row] = entry_price
+
+    def _revalue(self):
+        started = time.perf_counter()
+        rows, portfolios = len(self._rows), len(self._portfolio_ids)
+        symbols = self.pos_symbol[:rows]
+        marks = self.last[symbols]
+        unpriced = np.isnan(marks)
+        if unpriced.any():
+            marks[unpriced] = self.pos_entry[:rows][unpriced]
+        value = np.bincount(self.pos_portfolio[:rows], weights=self.pos_qty[:rows] * marks, minlength=portfolios)
+        np.add(self.cash[:portfolios], value, out=self.equity[:portfolios])
+        self.revaluations += 1
+        self.revalue_seconds += time.perf_counter() - started
+
+    def load(self, portfolios, positions):
+        """
+        Replace all state (called at startup)
+
+        portfolios: (portfolio_id, cash_balance, current_equity) rows
+        positions: (portfolio_id, symbol, signed quantity, entry_price) rows
+        """
+        with self._lock:
+            self._reset()
+            for portfolio_id, cash, equity in portfolios:
+                index = self._portfolio(portfolio_id)
+                self.cash[index] = cash or 0.0
+                self.persisted[index] = np.nan if equity is None else equity
+            for portfolio_id, symbol, quantity, entry_price in positions:
+                self._set(portfolio_id, symbol, quantity, entry_price)
+            self._revalue()
+
+    def apply(self, portfolio_id: int, symbol: str, quantity: float, entry_price: float, cash: float):
+        """Committed fill: the position's new signed quantity and entry, and the portfolio's new cash"""
+        with self._lock:
+            index = self._portfolio(portfolio_id)
+            self.cash[index] = cash or 0.0
+            self._set(portfolio_id, symbol, quantity, entry_price)
+            # The fill's transaction wrote its own current_equity; make sure it is overwritten
+            self.persisted[index] = np.nan
+            self._revalue()
+
+    def on_price(self, symbol: str, price: float) -> bool:
+        return self.update_prices({symbol: price})
+
+    def update_prices(self, prices: Dict[str, float]) -> bool:
+        """Set last prices and revalue once if any held symbol's price changed"""
+        with self._lock:
+            changed = False
+            for symbol, price in prices.items():
+                index = self._symbols.get(symbol)
+                if index is not None and self.last[index] != price:
+                    self.last[index] = price
+                    changed = True
+            if changed:
+                self._revalue()
+            return changed
+
+    # --- reads -------------------------------------------------------------
+
+    def equity_for(self, portfolio_id: int, default: Optional[float] = None) -> Optional[float]:
+        """Marked equity, or default for a portfolio the engine has not seen"""
+        index = self._portfolios.get(portfolio_id)
+        return default if index is None else float(self.equity[index])
+
+    def price(self, symbol: str) -> Optional[float]:
+        index = self._symbols.get(symbol)
+        if index is None or np.isnan(self.last[index]):
+            return None
+        return float(self.last[index])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = len(self._rows)
+            return {
+                "running": self._task is not None,
+                "portfolios": len(self._portfolio_ids),
+                "symbols": len(self._symbols),
+                "priced_symbols": int(np.count_nonzero(~np.isnan(self.last[:len(self._symbols)]))),
+                "open_positions": int(np.count_nonzero(self.pos_qty[:rows])),
+                "revaluations": self.revaluations,
+                "avg_revalue_ms": round(self.revalue_seconds * 1000 / self.revaluations, 3) if self.revaluations else 0.0,
+                "persisted_rows": self.persisted_rows,
+            }
+
+    # --- persistence -------------------------------------------------------
+
+    def rebuild(self):
+        """Load cash balances and open positions from the database"""
+        db = self.session_factory()
+        try:
+            portfolios = db.query(Portfolio.id, Portfolio.cash_balance, Portfolio.current_equity).all()
+            positions = db.query(
+                Position.portfolio_id, Position.symbol, Position.direction, Position.quantity, Position.entry_price
+            ).filter(Position.quantity > 0).all()
+        finally:
+            db.close()
+        self.load(portfolios, (
+            (portfolio_id, symbol, quantity if direction == "BUY" else -quantity, entry_price)
+            for portfolio_id, symbol, direction, quantity, entry_price in positions
+        ))
+        logger.info(f"Mark-to-market loaded {len(self._portfolio_ids)} portfolios, {len(self._rows)} positions")
+
+    def persist(self) -> int:
+        """Write changed equity to Portfolio.current_equity; returns the number of rows written"""
+        with self._lock:
+            portfolios = len(self._portfolio_ids)
+            equity = self.equity[:portfolios]
+            changed = np.flatnonzero(~(np.abs(equity - self.persisted[:portfolios]) < PERSIST_EPSILON))
+            values = equity[changed].copy()
+            ids = [self._portfolio_ids[i] for i in changed]
+        if not ids:
+            return 0
+
+        table = Portfolio.__table__
+        statement = update(table).where(table.c.id == bindparam("portfolio_id")).values(
+            current_equity=bindparam("equity"),
+            # A re-mark is not an edit to the portfolio
+            updated_at=table.c.updated_at
+        )
+        db = self.session_factory()
+        try:
+            db.execute(statement, [
+                {"portfolio_id": portfolio_id, "equity": float(value)} for portfolio_id, value in zip(ids, values)
+            ])
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self.persisted[changed] = values
+            self.persisted_rows += len(ids)
+        return len(ids)
+
+    async def start(self):
+        if self.persist_seconds > 0:
+            self._task = asyncio.create_task(self._persist_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await run_in_threadpool(self.persist)
+        except Exception as e:
+            logger.error(f"Failed to save marked equity: {str(e)}")
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(self.persist_seconds)
+            try:
+                await run_in_threadpool(self.persist)
+            except Exception as e:
+                logger.error(f"Failed to save marked equity: {str(e)}")
+
+
+# Create singleton instance
+mark_to_market = MarkToMarket(persist_seconds=settings.MTM_PERSIST_SECONDS)
@@ -3,10 +3,18 @@ Market data service - handles real-time quotes using Finnhub and Alpha Vantage A
 """
 
 import logging
+import time
 import httpx
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from app.config import settings
+from app.services.quota_ledger import quota_ledger, PRIORITY_NORMAL
+from app.services.crypto_service import crypto_quote_service
+from app.services.quote_filter import quote_filter
+from app.services.correlation_service import correlation_service
+from app.services.mark_to_market import mark_to_market
+from app.services.paper_order_book import paper_order_book
+from app.services.trigger_index import trigger_index
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +28,9 @@ class MarketDataService:
         self.alpha_vantage_url = "https://www.alphavantage.co/query"
         self.cache = {}
         self.cache_ttl = settings.MARKET_DATA_CACHE_TTL
+        self.last_tick: Dict[str, float] = {}  # symbol -> monotonic time of its last accepted quote
     
-    async def get_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+    async def get_quote(self, symbol: str, priority: str = PRIORITY_NORMAL) -> Optional[Dict[str, Any]]:
         """
         Get current quote for symbol from Finnhub (REAL DATA ONLY)
         
@@ -29,26 +38,36 @@ class MarketDataService:
         Raises exception if API data cannot be retrieved.
         
         CACHING DISABLED - Always fetches live data from API on every request.
+        
+        priority: "high" for trade execution; normal-priority requests may not
+        spend the budget reserved for high-priority requests, and low-priority
+        background polls never fall back to Alpha Vantage.
         """
         
         try:
             # Try Finnhub first (real-time, primary source)
             if self.finnhub_key and self.finnhub_key != "your_finnhub_key_here":
-                quote = await self._get_finnhub_quote(symbol)
-                if quote:
-                    logger.info(f"Successfully fetched real quote for {symbol} from Finnhub: ${quote['current_price']}")
-                    return quote
+                if quota_ledger.try_spend("finnhub", priority):
+                    quote = await self._get_finnhub_quote(symbol)
+                    if quote:
+                        logger.info(f"Successfully fetched real quote for {symbol} from Finnhub: ${quote['current_price']}")
+                        return self._apply_sanity_filter(quote)
+                    else:
+                        logger.error(f"Finnhub returned no data for {symbol}")
                 else:
-                    logger.error(f"Finnhub returned no data for {symbol}")
+                    logger.warning(f"Finnhub per-minute budget exhausted, skipping for {symbol}")
             
             # Fallback to Alpha Vantage (15min delayed, real data)
             if self.alpha_vantage_key and self.alpha_vantage_key != "your_alpha_vantage_key_here":
-                quote = await self._get_alpha_vantage_quote(symbol)
-                if quote:
-                    logger.info(f"Successfully fetched real quote for {symbol} from Alpha Vantage: ${quote['current_price']}")
-                    return quote
+                if quota_ledger.try_spend("alpha_vantage", priority):
+                    quote = await self._get_alpha_vantage_quote(symbol)
+                    if quote:
+                        logger.info(f"Successfully fetched real quote for {symbol} from Alpha Vantage: ${quote['current_price']}")
+                        return self._apply_sanity_filter(quote)
+                    else:
+                        logger.error(f"Alpha Vantage returned no data for {symbol}")
                 else:
-                    logger.error(f"Alpha Vantage returned no data for {symbol}")
+                    logger.warning(f"Alpha Vantage fallback skipped for {symbol}: budget exhausted or reserved for high-priority requests")
             
             # If we reach here, no real API data available
             logger.error(f"CRITICAL: Unable to fetch real market data for {symbol} - all APIs failed or not configured")
@@ -58,6 +77,20 @@ class MarketDataService:
             logger.error(f"CRITICAL ERROR fetching quote for {symbol}: {str(e)}")
             raise Exception(f"Market data unavailable for {symbol}: {str(e)}")
     
+    def _apply_sanity_filter(self, quote: Dict[str, Any]) -> Dict[str, Any]:
+        """Flag quotes that are implausible against recent history or the other provider"""
+        verdict = quote_filter.check(quote["symbol"], quote["current_price"], quote["source"])
+        quote["suspect"] = not verdict["ok"]
+        if not verdict["ok"]:
+            quote["suspect_reason"] = verdict["reason"]
+        else:
+            self.last_tick[quote["symbol"]] = time.monotonic()
+            correlation_service.record(quote["symbol"], quote["current_price"])
+            trigger_index.on_price(quote["symbol"], quote["current_price"])
+            mark_to_market.on_price(quote["symbol"], quote["current_price"])
+            paper_order_book.on_price(quote["symbol"], quote["current_price"])
+        return quote
+    
     async def _get_finnhub_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
         """Fetch quote from Finnhub API (real-time)"""
         
@@ -119,6 +152,12 @@ class MarketDataService:
                 response.raise_for_status()
                 data = response.json()
                 
+                # Rate-limit responses come back as 200 with a "Note"/"Information" message
+                if "Note" in data or "Information" in data:
+                    logger.warning(f"Alpha Vantage rate limit: {data.get('Note') or data.get('Information')}")
+                    quota_ledger.mark_exhausted("alpha_vantage")
+                    return None
+                
                 if "Global Quote" in data and data["Global Quote"]:
                     quote_data = data["Global Quote"]
                     
@@ -225,8 +264,8 @@ class MarketDataService:
             return []
     
     async def get_crypto_price(self, symbol: str) -> Optional[Dict[str, Any]]:
-        """Get cryptocurrency price (placeholder)"""
-        return None
+        """Get cryptocurrency price from the crypto quote service (cached, coalesced)"""
+        return await crypto_quote_service.get_quote(symbol)
     
     def clear_cache(self, symbol: Optional[str] = None):
         """Clear the quote cache"""
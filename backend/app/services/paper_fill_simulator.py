@@ -0,0 +1,348 @@
+"""
+Paper-trading fill simulator
+
+Paper orders that pass the gates are committed as PENDING trades, and the
+request returns straight away. The simulator fills each one later, off the
+request path. This replaces the old instant fill at the quoted price.
+
+FillModel works the order as a sequence of slices. Each slice:
+
+- waits a lognormal latency (PAPER_LATENCY_MS median). The market moves
+  meanwhile, as a random walk with the symbol's daily volatility scaled to
+  the elapsed time;
+- takes at most a random share of PAPER_DEPTH_SHARES, so large orders fill
+  partially;
+- pays half the spread plus square-root market impact,
+  PAPER_IMPACT_COEFFICIENT * volatility * sqrt(slice / depth), against the
+  order's direction.
+
+Volatility is the quote's day range over its price, or
+PAPER_DEFAULT_VOLATILITY without one. The spread comes from the quote's
+bid/ask when it has them, otherwise PAPER_SPREAD_BPS. Whatever is still
+unfilled after PAPER_MAX_SLICES slices is cancelled.
+
+The slices are drawn at submission. The order then waits on the event loop,
+not in a thread, until its last slice is due. It is committed by one of
+PAPER_FILL_WORKERS workers on a dedicated thread pool, so simulated orders
+never occupy the threadpool serving requests. The commit runs under the
+portfolio lock, and TradingEngine.fill_pending opens the trade at the
+volume-weighted price for the filled quantity. PENDING trades left behind by
+a restart are resubmitted at startup, priced from their requested entry.
+
+Resting LIMIT / STOP orders (paper_order_book) are filled here too. The
+simulator loads RESTING trades into the book at startup and registers the
+book's symbols with the shared QuotePoller, which refreshes any with no
+accepted quote in the last PAPER_BOOK_POLL_SECONDS. A matched limit fills whole at its
+match price after one latency draw. A triggered stop becomes a market order
+and goes through the fill model from the triggering price.
+
+While the simulator is not running, paper orders fill instantly as before
+and LIMIT / STOP orders are refused.
+"""
+
+import asyncio
+import logging
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.trade import Trade
+from app.services.paper_order_book import STOP, Match, OrderBook, paper_order_book, resting_order
+from app.services.portfolio_locks import portfolio_locks
+from app.services.quote_poller import quote_poller
+from app.services.trading_engine import PENDING, RESTING, TradingEngine
+
+logger = logging.getLogger(__name__)
+
+FILL_RETRIES = 3
+SESSION_SECONDS = 6.5 * 3600
+
+
+class Slice:
+    """One simulated execution: delay (seconds after submission), quantity and price"""
+
+    __slots__ = ("delay", "quantity", "price")
+
+    def __init__(self, delay: float, quantity: int, price: float):
+        self.delay = delay
+        self.quantity = quantity
+        self.price = price
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"delay_ms": round(self.delay * 1000, 1), "quantity": self.quantity, "price": self.price}
+
+
+class FillModel:
+    """Latency, slippage and partial-fill model"""
+
+    def __init__(
+        self,
+        latency_ms: float = 120.0,
+        latency_jitter: float = 0.5,
+        spread_bps: float = 5.0,
+        impact_coefficient: float = 0.1,
+        depth_shares: int = 1000,
+        max_slices: int = 5,
+        default_volatility: float = 0.02,
+        rng: Optional[random.Random] = None
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.spread_bps = spread_bps
+        self.impact_coefficient = impact_coefficient
+        self.depth_shares = depth_shares
+        self.max_slices = max_slices
+        self.default_volatility = default_volatility
+        self.rng = rng or random.Random()
+
+    def volatility(self, quote: Dict[str, Any], price: float) -> float:
+        """Daily volatility as a fraction of price"""
+        high, low = quote.get("high"), quote.get("low")
+        if high and low and high > low and price > 0:
+            return (high - low) / price
+        return self.default_volatility
+
+    def half_spread(self, quote: Dict[str, Any], price: float) -> float:
+        bid, ask = quote.get("bid"), quote.get("ask")
+        if bid and ask and ask > bid and price > 0:
+            return (ask - bid) / 2 / price
+        return self.spread_bps / 2 / 10000
+
+    def latency(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.latency_ms / 1000 * math.exp(self.latency_jitter * self.rng.gauss(0, 1))
+
+    def simulate(self, direction: str, quantity: int, price: float, quote: Optional[Dict[str, Any]] = None) -> List[Slice]:
+        """Slices for an order of quantity at reference price; their total may be less than quantity"""
+        quote = quote or {}
+        sign = 1 if direction == "BUY" else -1
+        volatility = self.volatility(quote, price)
+        half_spread = self.half_spread(quote, price)
+
+        slices, remaining, elapsed = [], quantity, 0.0
+        for _ in range(self.max_slices):
+            wait = self.latency()
+            elapsed += wait
+            price *= math.exp(volatility * math.sqrt(wait / SESSION_SECONDS) * self.rng.gauss(0, 1))
+            available = max(1, int(self.depth_shares * self.rng.uniform(0.5, 1.0)))
+            filled = min(remaining, available)
+            slippage = half_spread + self.impact_coefficient * volatility * math.sqrt(filled / self.depth_shares)
+            slices.append(Slice(elapsed, filled, round(price * (1 + sign * slippage), 4)))
+            remaining -= filled
+            if not remaining:
+                break
+        return slices
+
+
+class PaperOrder:
+    """A PENDING (or matched RESTING) trade with its simulated slices"""
+
+    __slots__ = ("trade_id", "portfolio_id", "requested", "reference_price", "slices")
+
+    def __init__(self, trade_id: int, portfolio_id: int, requested: int, reference_price: float, slices: List[Slice]):
+        self.trade_id = trade_id
+        self.portfolio_id = portfolio_id
+        self.requested = requested
+        self.reference_price = reference_price
+        self.slices = slices
+
+
+class PaperFillSimulator:
+    """Schedules simulated fills and commits them on a dedicated worker pool"""
+
+    def __init__(
+        self,
+        model: FillModel,
+        session_factory: Callable = SessionLocal,
+        workers: int = 2,
+        book: Optional[OrderBook] = None,
+        poll_seconds: float = 0.0
+    ):
+        self.model = model
+        self.session_factory = session_factory
+        self.workers = workers
+        self.book = book if book is not None else OrderBook()
+        self.poll_seconds = poll_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._scheduled = 0
+        self.filled = 0
+        self.partial = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="paper-fill")
+        self._tasks = [asyncio.create_task(self._fill_loop()) for _ in range(self.workers)]
+        resumed = await self._loop.run_in_executor(self._executor, self._load_orders)
+        for trade in resumed:
+            self.submit(trade)
+        self.book.sink = self._on_matches
+        if self.poll_seconds > 0:
+            quote_poller.watch("paper_book", self.book.symbols, self.poll_seconds)
+        logger.info(
+            f"Paper fill simulator started ({self.workers} workers, {len(resumed)} pending trades resumed, "
+            f"{len(self.book)} resting orders)"
+        )
+
+    async def stop(self):
+        # Orders still waiting stay PENDING / RESTING and are picked up again on the next start
+        self.book.sink = None
+        await quote_poller.unwatch("paper_book")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def drain(self):
+        """Wait until every submitted order has been filled"""
+        while self._scheduled:
+            await asyncio.sleep(0.005)
+        if self._queue is not None:
+            await self._queue.join()
+
+    def submit(self, trade: Trade, quote: Optional[Dict[str, Any]] = None) -> PaperOrder:
+        """Simulate a PENDING trade's execution and schedule its fill (call on the event loop)"""
+        reference = (quote or {}).get("current_price") or trade.entry_price
+        return self._schedule(PaperOrder(
+            trade.id, trade.portfolio_id, trade.quantity, reference,
+            self.model.simulate(trade.direction, trade.quantity, reference, quote)
+        ))
+
+    def rest(self, trade: Trade, last_price: Optional[float] = None) -> Optional[Match]:
+        """Put a RESTING trade in the order book (matched at once if last_price crosses it)"""
+        return self.book.add(resting_order(trade), last_price)
+
+    def _schedule(self, order: PaperOrder) -> PaperOrder:
+        self._scheduled += 1
+        self._loop.call_later(order.slices[-1].delay, self._release, order)
+        return order
+
+    def _on_matches(self, matches: List[Match]):
+        # Ticks arrive from threadpool workers as well as the loop itself
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._schedule_matches(matches)
+        else:
+            self._loop.call_soon_threadsafe(self._schedule_matches, matches)
+
+    def _schedule_matches(self, matches: List[Match]):
+        for match in matches:
+            order = match.order
+            if order.entry_type == STOP:
+                # Triggered: from here on it is a market order
+                slices = self.model.simulate(order.direction, order.quantity, match.price, {"current_price": match.price})
+            else:
+                slices = [Slice(self.model.latency(), order.quantity, match.price)]
+            self._schedule(PaperOrder(order.id, order.portfolio_id, order.quantity, match.price, slices))
+
+    def _release(self, order: PaperOrder):
+        self._scheduled -= 1
+        self._queue.put_nowait(order)
+
+    def _load_orders(self) -> List[Trade]:
+        """Load RESTING trades into the book; returns the PENDING trades to resubmit"""
+        db = self.session_factory()
+        try:
+            trades = db.query(Trade).filter(
+                Trade.status.in_((PENDING, RESTING)), Trade.paper_trading == "paper"
+            ).order_by(Trade.id).all()
+            db.expunge_all()
+        finally:
+            db.close()
+        self.book.load(resting_order(trade) for trade in trades if trade.status == RESTING)
+        return [trade for trade in trades if trade.status == PENDING]
+
+    async def _fill_loop(self):
+        while True:
+            order = await self._queue.get()
+            try:
+                await self.fill(order)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to fill paper trade {order.trade_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def fill(self, order: PaperOrder) -> Optional[Trade]:
+        """Commit an order's slices to its PENDING trade"""
+        async with portfolio_locks.hold(order.portfolio_id):
+            for attempt in range(1, FILL_RETRIES + 1):
+                try:
+                    trade = await self._loop.run_in_executor(self._executor, self._fill_sync, order)
+                    break
+                except StaleDataError:
+                    if attempt == FILL_RETRIES:
+                        raise
+        if trade is None:
+            logger.warning(f"Paper trade {order.trade_id} was not filled")
+            return None
+        self.filled += 1
+        if trade.quantity < order.requested:
+            self.partial += 1
+        return trade
+
+    def _fill_sync(self, order: PaperOrder) -> Optional[Trade]:
+        db = self.session_factory()
+        try:
+            return TradingEngine(db).fill_pending(
+                order.trade_id,
+                [(piece.quantity, piece.price) for piece in order.slices],
+                {
+                    "requested_quantity": order.requested,
+                    "reference_price": order.reference_price,
+                    "slices": [piece.as_dict() for piece in order.slices],
+                }
+            )
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "scheduled": self._scheduled,
+            "book": self.book.stats(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "filled": self.filled,
+            "partial": self.partial,
+            "failed": self.failed,
+        }
+
+
+# Create singleton instance
+paper_fill_simulator = PaperFillSimulator(
+    FillModel(
+        latency_ms=settings.PAPER_LATENCY_MS,
+        latency_jitter=settings.PAPER_LATENCY_JITTER,
+        spread_bps=settings.PAPER_SPREAD_BPS,
+        impact_coefficient=settings.PAPER_IMPACT_COEFFICIENT,
+        depth_shares=settings.PAPER_DEPTH_SHARES,
+        max_slices=settings.PAPER_MAX_SLICES,
+        default_volatility=settings.PAPER_DEFAULT_VOLATILITY
+    ),
+    workers=settings.PAPER_FILL_WORKERS,
+    book=paper_order_book,
+    poll_seconds=settings.PAPER_BOOK_POLL_SECONDS
+)
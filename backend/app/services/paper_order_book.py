@@ -0,0 +1,263 @@
+"""
+Resting limit and stop orders for paper portfolios
+
+A paper order placed with entry_type LIMIT or STOP is committed as a RESTING
+trade and rests here until the price reaches it:
+
+- BUY LIMIT fills when price <= limit, SELL LIMIT when price >= limit, at
+  the limit or better;
+- BUY STOP triggers when price >= stop, SELL STOP when price <= stop, and
+  then fills like a market order at the price that triggered it.
+
+Each symbol keeps one heap per (side, entry type). Limits and stops that
+fire on a fall are max-heaps, and those that fire on a rise are min-heaps,
+so the top of every heap is the order with the best price. Ties go to the
+lower trade id, which is arrival order and survives a restart. That gives
+price-time priority. A tick pops orders from the top of each heap only while
+they are crossed, so it costs O(k log n) for k matches among n resting
+orders.
+
+depth_per_tick (PAPER_BOOK_DEPTH_PER_TICK, 0 for unlimited) caps the shares
+each side can fill on one tick. Orders are filled whole and strictly in
+priority order. An order that no longer fits stops its side until the next
+tick, and the smaller orders behind it wait as well. The first order on a
+side always fills.
+
+Cancels are lazy: the heap entry stays until it surfaces and is skipped.
+Stale entries are compacted once they outnumber live ones. The book only
+finds matches. PaperFillSimulator commits them, and reloads RESTING trades
+into the book at startup. Prices come from MarketDataService, like the
+trigger index; a replay can call on_price directly.
+"""
+
+import heapq
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Entry types (Trade.entry_type)
+MARKET = "MARKET"
+LIMIT = "LIMIT"
+STOP = "STOP"
+ENTRY_TYPES = (MARKET, LIMIT, STOP)
+RESTING_TYPES = (LIMIT, STOP)
+
+SIDES = ("BUY", "SELL")
+
+# Below this many heap entries a symbol is never compacted
+COMPACT_MIN_ENTRIES = 1024
+
+
+def fires_below(direction: str, entry_type: str) -> bool:
+    """True when the order fills on price <= its level (BUY limits, SELL stops)"""
+    return (direction == "BUY") == (entry_type == LIMIT)
+
+
+class RestingOrder:
+    """A RESTING trade as the book sees it"""
+
+    __slots__ = ("id", "portfolio_id", "symbol", "direction", "entry_type", "price", "quantity")
+
+    def __init__(self, id: int, portfolio_id: int, symbol: str, direction: str, entry_type: str, price: float, quantity: int):
+        self.id = id
+        self.portfolio_id = portfolio_id
+        self.symbol = symbol
+        self.direction = direction
+        self.entry_type = entry_type
+        self.price = price
+        self.quantity = quantity
+
+    def crossed(self, price: float) -> bool:
+        return price <= self.price if fires_below(self.direction, self.entry_type) else price >= self.price
+
+    def fill_price(self, price: float) -> float:
+        if self.entry_type == STOP:
+            return price
+        return min(self.price, price) if self.direction == "BUY" else max(self.price, price)
+
+
+class Match:
+    """A resting order crossed by a tick, to be filled at price"""
+
+    __slots__ = ("order", "price")
+
+    def __init__(self, order: RestingOrder, price: float):
+        self.order = order
+        self.price = price
+
+    def __repr__(self) -> str:
+        return f"Match({self.order.id} {self.order.direction} {self.order.entry_type} {self.order.quantity} @ {self.price})"
+
+
+class SymbolBook:
+    """One heap per (side, entry type); entries are (key, order_id)"""
+
+    __slots__ = ("heaps", "live")
+
+    def __init__(self):
+        self.heaps: Dict[Tuple[str, str], List[Tuple[float, int]]] = {
+            (side, entry_type): [] for side in SIDES for entry_type in RESTING_TYPES
+        }
+        self.live = 0
+
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self.heaps.values())
+
+
+def _entry(order: RestingOrder) -> Tuple[float, int]:
+    return (-order.price if fires_below(order.direction, order.entry_type) else order.price, order.id)
+
+
+class OrderBook:
+    """Per-symbol price-time priority books of resting paper orders"""
+
+    def __init__(self, depth_per_tick: int = 0):
+        self.depth_per_tick = depth_per_tick
+        self._symbols: Dict[str, SymbolBook] = {}
+        self._orders: Dict[int, RestingOrder] = {}
+        self._lock = threading.RLock()
+        self.matched = 0
+        # Called with each non-empty batch of matches (set by PaperFillSimulator)
+        self.sink: Optional[Callable[[List[Match]], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    def add(self, order: RestingOrder, last_price: Optional[float] = None) -> Optional[Match]:
+        """Rest an order, or match it at once if last_price already crosses it"""
+        if last_price and order.crossed(last_price):
+            match = Match(order, order.fill_price(last_price))
+            self.matched += 1
+            if self.sink is not None:
+                self.sink([match])
+            return match
+        with self._lock:
+            self._push(order)
+        return None
+
+    def cancel(self, order_id: int) -> bool:
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                return False
+            book = self._symbols[order.symbol]
+            book.live -= 1
+            self._maybe_compact(book)
+            return True
+
+    def load(self, orders: Iterable[RestingOrder]):
+        """Replace the book's contents; heaps are built with heapify, O(n)"""
+        with self._lock:
+            self._symbols, self._orders = {}, {}
+            for order in orders:
+                self._orders[order.id] = order
+                book = self._book(order.symbol)
+                book.heaps[(order.direction, order.entry_type)].append(_entry(order))
+                book.live += 1
+            for book in self._symbols.values():
+                for heap in book.heaps.values():
+                    heapq.heapify(heap)
+        logger.info(f"Order book loaded {len(self._orders)} resting orders across {len(self._symbols)} symbols")
+
+    def on_price(self, symbol: str, price: float) -> List[Match]:
+        """Remove and return the resting orders this tick fills, in priority order"""
+        book = self._symbols.get(symbol)
+        if book is None or not price:
+            return []
+
+        matches: List[Match] = []
+        with self._lock:
+            for side in SIDES:
+                used, blocked = 0, False
+                for entry_type in RESTING_TYPES:
+                    if blocked:
+                        break
+                    used, blocked = self._drain(book, side, entry_type, price, used, matches)
+            self.matched += len(matches)
+
+        if matches and self.sink is not None:
+            self.sink(matches)
+        return matches
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, book in self._symbols.items() if book.live]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            books = self._symbols.values()
+            return {
+                "resting_orders": len(self._orders),
+                "limit_orders": sum(1 for order in self._orders.values() if order.entry_type == LIMIT),
+                "stop_orders": sum(1 for order in self._orders.values() if order.entry_type == STOP),
+                "symbols": sum(1 for book in books if book.live),
+                "heap_entries": sum(len(book) for book in books),
+                "depth_per_tick": self.depth_per_tick,
+                "matched": self.matched,
+            }
+
+    def _book(self, symbol: str) -> SymbolBook:
+        book = self._symbols.get(symbol)
+        if book is None:
+            book = self._symbols[symbol] = SymbolBook()
+        return book
+
+    def _push(self, order: RestingOrder):
+        self._orders[order.id] = order
+        book = self._book(order.symbol)
+        heapq.heappush(book.heaps[(order.direction, order.entry_type)], _entry(order))
+        book.live += 1
+
+    def _drain(
+        self,
+        book: SymbolBook,
+        side: str,
+        entry_type: str,
+        price: float,
+        used: int,
+        matches: List[Match]
+    ) -> Tuple[int, bool]:
+        """Pop crossed orders from one heap; returns shares used on the side and whether depth ran out"""
+        heap = book.heaps[(side, entry_type)]
+        below = fires_below(side, entry_type)
+        while heap:
+            key, order_id = heap[0]
+            order = self._orders.get(order_id)
+            if order is None:
+                heapq.heappop(heap)
+                continue
+            if (price > -key) if below else (price < key):
+                return used, False
+            if self.depth_per_tick and used and used + order.quantity > self.depth_per_tick:
+                return used, True
+            heapq.heappop(heap)
+            del self._orders[order_id]
+            book.live -= 1
+            used += order.quantity
+            matches.append(Match(order, order.fill_price(price)))
+        return used, False
+
+    def _maybe_compact(self, book: SymbolBook):
+        size = len(book)
+        if size < COMPACT_MIN_ENTRIES or size <= 2 * book.live:
+            return
+        for heap in book.heaps.values():
+            heap[:] = [entry for entry in heap if entry[1] in self._orders]
+            heapq.heapify(heap)
+
+
+def resting_order(trade: Any) -> RestingOrder:
+    return RestingOrder(
+        trade.id, trade.portfolio_id, trade.symbol, trade.direction, trade.entry_type, trade.limit_price, trade.quantity
+    )
+
+
+# Create singleton instance
+paper_order_book = OrderBook(depth_per_tick=settings.PAPER_BOOK_DEPTH_PER_TICK)
@@ -0,0 +1,70 @@
+"""
+Per-portfolio order serialization
+
+Two orders for the same portfolio must not interleave. If they did, both
+could pass the cash check before either debits cash. Each portfolio gets its
+own asyncio.Lock, held from the portfolio load and cash check through
+persistence. Orders for different portfolios never wait on each other. A lock
+is dropped from the registry once nobody holds or waits for it, so the
+registry only ever contains portfolios with orders in flight.
+
+This covers one worker process. Across workers, Portfolio carries an
+optimistic version column. A commit based on a stale portfolio row raises
+StaleDataError, and the execution path retries against the fresh row.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioLocks:
+    """Registry of per-portfolio asyncio locks (event-loop thread only)"""
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._holders: Dict[int, int] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def hold(self, portfolio_id: int, timer: Any = None):
+        """Serialize the enclosed block with other holders for the same portfolio"""
+        lock = self._locks.get(portfolio_id)
+        if lock is None:
+            lock = self._locks[portfolio_id] = asyncio.Lock()
+        self._holders[portfolio_id] = self._holders.get(portfolio_id, 0) + 1
+        try:
+            if lock.locked():
+                self.contended += 1
+            start = time.perf_counter()
+            with timer.stage("lock") if timer else nullcontext():
+                await lock.acquire()
+            self.wait_seconds += time.perf_counter() - start
+            self.acquisitions += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._holders[portfolio_id] -= 1
+            if not self._holders[portfolio_id]:
+                del self._holders[portfolio_id]
+                del self._locks[portfolio_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_portfolios": len(self._locks),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "avg_wait_ms": round(self.wait_seconds / self.acquisitions * 1000, 3) if self.acquisitions else 0.0,
+        }
+
+
+# Create singleton instance
+portfolio_locks = PortfolioLocks()
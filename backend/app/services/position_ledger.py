@@ -0,0 +1,191 @@
+"""
+Position and cash ledger
+
+Every fill, whether a trade being opened or closed, is applied incrementally
+to the portfolio's Position row for that symbol and to its cash balance and
+equity. Current positions and balances are then a plain read rather than a
+replay over the trades table.
+
+Positions are netted per (portfolio, symbol):
+- Fills on the same side average into the entry price.
+- Opposite fills reduce the position and realize P/L against the average
+  entry.
+- An opposite fill larger than the position flips it, and the remainder
+  opens at the fill price.
+- A flat position keeps its row, with quantity 0, so per-symbol realized
+  P/L survives.
+
+Cash moves by the fill notional: BUY debits and SELL credits, including
+short-sale proceeds. Each move is a cash journal entry linked to the trade.
+Equity moves here only by realized P/L (marked at cost). The mark-to-market
+engine re-marks it at last prices once the fill has committed.
+
+The ledger never commits. Callers apply fills inside the same transaction as
+the trade they belong to.
+
+The ledger is the live book. Paper trades stay out of it (see in_ledger):
+they pass no cash check, so netting them into live positions or debiting
+their notional from the portfolio's one cash balance would corrupt both.
+Paper P/L stays on the trades themselves.
+
+Trades opened before the ledger existed have no Position row and never
+debited cash. backfill() replays their opening fills once, at startup, so
+closing them nets against a real position.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.cash_journal import CashEntry
+from app.models.portfolio import Portfolio
+from app.models.trade import Position, Trade
+from app.services.cash_journal import cash_journal
+
+logger = logging.getLogger(__name__)
+
+
+class Fill:
+    """Outcome of one applied fill"""
+
+    __slots__ = ("portfolio", "position", "cash_delta", "realized_pnl")
+
+    def __init__(self, portfolio: Portfolio, position: Position, cash_delta: float, realized_pnl: float):
+        self.portfolio = portfolio
+        self.position = position
+        self.cash_delta = cash_delta
+        self.realized_pnl = realized_pnl
+
+
+def in_ledger(trade: Any) -> bool:
+    """Live trades are applied to positions and cash; paper trades are not"""
+    return trade.paper_trading != "paper"
+
+
+def signed_quantity(position: Optional[Position]) -> int:
+    if position is None or not position.quantity:
+        return 0
+    return position.quantity if position.direction == "BUY" else -position.quantity
+
+
+class PositionLedger:
+    """Applies fills to Position rows and portfolio balances"""
+
+    def apply_fill(
+        self,
+        db: Session,
+        portfolio_id: int,
+        symbol: str,
+        side: str,
+        quantity: int,
+        price: float,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None,
+        trade: Any = None
+    ) -> Fill:
+        """Apply one fill (side BUY or SELL) to the position and balances; does not commit"""
+        if quantity <= 0:
+            raise ValueError(f"Fill quantity must be positive, got {quantity}")
+        if side not in ("BUY", "SELL"):
+            raise ValueError(f"Unknown fill side: {side}")
+
+        portfolio = db.get(Portfolio, portfolio_id)
+        if portfolio is None:
+            raise ValueError(f"Portfolio {portfolio_id} not found")
+
+        position = self._position(db, portfolio_id, symbol)
+
+        current = signed_quantity(position)
+        delta = quantity if side == "BUY" else -quantity
+        new = current + delta
+        realized = 0.0
+
+        if current == 0 or (current > 0) == (delta > 0):
+            # Opening or adding: weighted average entry
+            entry = ((abs(current) * position.entry_price if current else 0.0) + quantity * price) / abs(new)
+        else:
+            # Reducing, closing or flipping
+            closed = min(abs(current), quantity)
+            realized = closed * (price - position.entry_price) * (1 if current > 0 else -1)
+            entry = position.entry_price if abs(delta) <= abs(current) else price
+
+        if position is None:
+            position = Position(
+                portfolio_id=portfolio_id,
+                symbol=symbol,
+                stop_loss=stop_loss or 0.0,
+                take_profit=take_profit or 0.0,
+                realized_pnl=0.0
+            )
+            db.add(position)
+        if current == 0 and new != 0:
+            position.opened_at = datetime.utcnow()
+
+        position.quantity = abs(new)
+        if new:
+            position.direction = "BUY" if new > 0 else "SELL"
+        position.entry_price = entry
+        if stop_loss is not None and new and (delta > 0) == (new > 0):
+            # Latest opening fill sets the risk levels
+            position.stop_loss = stop_loss
+            position.take_profit = take_profit
+        position.realized_pnl = (position.realized_pnl or 0.0) + realized
+        position.updated_at = datetime.utcnow()
+
+        cash_delta = -delta * price
+        cash_journal.record(db, portfolio, cash_delta, trade=trade)
+        portfolio.current_equity = (portfolio.current_equity or portfolio.starting_capital or 0.0) + realized
+
+        logger.debug(f"Fill {side} {quantity} {symbol} @ {price}: position {current} -> {new}, realized {realized:.2f}")
+        return Fill(portfolio, position, cash_delta, realized)
+
+    @staticmethod
+    def _position(db: Session, portfolio_id: int, symbol: str) -> Optional[Position]:
+        # Sessions run with autoflush off: a position created earlier in this
+        # transaction (e.g. a previous basket leg) is only in session.new
+        for obj in db.new:
+            if isinstance(obj, Position) and obj.portfolio_id == portfolio_id and obj.symbol == symbol:
+                return obj
+        return db.query(Position).filter(
+            Position.portfolio_id == portfolio_id,
+            Position.symbol == symbol
+        ).first()
+
+    def backfill(self, db: Session) -> int:
+        """
+        Apply the opening fill of every live OPEN trade missing from the ledger
+
+        A trade is in the ledger once a cash journal entry points at it. The
+        rest are replayed in trade order, like new trades: the position is
+        netted and cash is debited. Does not commit; returns the number of
+        trades applied.
+        """
+        journaled = db.query(CashEntry.trade_id).filter(CashEntry.trade_id.isnot(None))
+        trades = db.query(Trade).filter(
+            Trade.status == "OPEN",
+            or_(Trade.paper_trading.is_(None), Trade.paper_trading != "paper"),
+            Trade.id.notin_(journaled)
+        ).order_by(Trade.id).all()
+        for trade in trades:
+            fill = self.apply_fill(
+                db, trade.portfolio_id, trade.symbol, trade.direction, trade.quantity,
+                trade.entry_price, trade.stop_loss, trade.take_profit, trade=trade
+            )
+            if fill.position.quantity == trade.quantity and trade.opened_at:
+                fill.position.opened_at = trade.opened_at
+        if trades:
+            logger.info(f"Position ledger backfilled {len(trades)} open trades")
+        return len(trades)
+
+    def open_positions(self, db: Session, portfolio_id: int) -> List[Position]:
+        return db.query(Position).filter(
+            Position.portfolio_id == portfolio_id,
+            Position.quantity > 0
+        ).order_by(Position.symbol).all()
+
+
+# Create singleton instance
+position_ledger = PositionLedger()
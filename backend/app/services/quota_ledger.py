@@ -0,0 +1,258 @@
+"""
+Per-provider API quota ledger
+
+Tracks daily and per-minute call budgets for each market data provider.
+Daily counts are persisted in the provider_usage table so a restart does not
+hand out the same free-tier quota twice; per-minute windows are in memory only.
+
+Spending is decided in memory. The database work runs on one background
+thread, never on the caller's (often the event loop): each spend is written
+as an atomic `calls = calls + 1`, so several workers sharing the table never
+overwrite each other's counts, and the total read back after the write folds
+the other workers' spends into this process's counter. flush() waits for the
+writes queued so far.
+
+Callers spend budget with a priority:
+- high: trade execution, which may spend every call;
+- normal: dashboards and overview. These stop once the remaining daily
+  budget reaches the high-priority reserve, and once the current minute's
+  remaining calls reach the per-minute reserve;
+- low: background quote polling. It stops at the same per-minute reserve and
+  never spends a daily-limited budget, so a poll cannot fall back to a
+  provider whose day is counted in tens of calls.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.provider_usage import ProviderUsage
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+
+
+class ProviderBudget:
+    """Quota limits for one provider (0 = unlimited)"""
+
+    def __init__(
+        self,
+        name: str,
+        daily_limit: int = 0,
+        per_minute_limit: int = 0,
+        high_priority_reserve: int = 0,
+        per_minute_reserve: int = 0
+    ):
+        self.name = name
+        self.daily_limit = daily_limit
+        self.per_minute_limit = per_minute_limit
+        self.high_priority_reserve = min(high_priority_reserve, daily_limit) if daily_limit else 0
+        self.per_minute_reserve = min(per_minute_reserve, per_minute_limit) if per_minute_limit else 0
+
+
+class QuotaLedger:
+    """Thread-safe usage ledger with persistent daily counters"""
+
+    def __init__(
+        self,
+        budgets: Dict[str, ProviderBudget],
+        session_factory: Callable = SessionLocal,
+        clock: Callable[[], float] = time.time
+    ):
+        self.budgets = budgets
+        self.session_factory = session_factory
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._daily: Dict[str, int] = {}
+        self._day: Dict[str, str] = {}
+        self._unwritten: Dict[str, int] = {name: 0 for name in budgets}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quota-ledger")
+        self._minute: Dict[str, deque] = {name: deque() for name in budgets}
+        self._denied: Dict[str, int] = {name: 0 for name in budgets}
+
+    def _today(self) -> str:
+        return datetime.utcfromtimestamp(self.clock()).strftime("%Y-%m-%d")
+
+    def _sync_day(self, provider: str) -> str:
+        """Roll the daily counter over at UTC midnight; persisted usage is loaded in the background"""
+        today = self._today()
+        if self._day.get(provider) != today:
+            self._day[provider] = today
+            self._daily[provider] = 0
+            self._unwritten[provider] = 0
+            if self.budgets[provider].daily_limit:
+                self._writer.submit(self._load, provider, today)
+        return today
+
+    def _load(self, provider: str, day: str):
+        """Add the day's persisted usage (other processes, earlier runs) to the counter"""
+        try:
+            db = self.session_factory()
+            try:
+                row = db.query(ProviderUsage).filter(
+                    ProviderUsage.provider == provider,
+                    ProviderUsage.usage_date == day
+                ).first()
+                calls = row.calls if row else 0
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"Error loading {provider} quota usage: {str(e)}")
+            return
+        # The writer runs in order, so none of this day's spends are persisted yet
+        with self._lock:
+            if self._day.get(provider) == day:
+                self._daily[provider] += calls
+
+    def _persist(self, provider: str, day: str, increment: int = 0, at_least: int = 0):
+        """Add `increment` calls to the day's row (or raise it to `at_least`) and resync the counter"""
+        try:
+            db = self.session_factory()
+            try:
+                calls = self._increment(db, provider, day, increment, at_least)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"Error persisting {provider} quota usage: {str(e)}")
+            return
+        with self._lock:
+            if self._day.get(provider) != day:
+                return
+            self._unwritten[provider] = max(self._unwritten[provider] - increment, 0)
+            # Spends from other workers show up in the persisted total
+            self._daily[provider] = max(self._daily[provider], calls + self._unwritten[provider])
+
+    def _increment(self, db: Any, provider: str, day: str, increment: int, at_least: int) -> int:
+        match = (ProviderUsage.provider == provider, ProviderUsage.usage_date == day)
+        if increment:
+            stmt = update(ProviderUsage).where(*match).values(calls=ProviderUsage.calls + increment)
+        else:
+            stmt = update(ProviderUsage).where(*match, ProviderUsage.calls < at_least).values(calls=at_least)
+        for _ in range(2):
+            if db.execute(stmt).rowcount or db.query(ProviderUsage.id).filter(*match).first():
+                db.commit()
+                break
+            try:
+                db.add(ProviderUsage(provider=provider, usage_date=day, calls=max(increment, at_least)))
+                db.commit()
+                break
+            except IntegrityError:
+                # Another worker inserted the day's row first; update it instead
+                db.rollback()
+        return db.query(ProviderUsage.calls).filter(*match).scalar() or 0
+
+    def _minute_used(self, provider: str, now: float) -> int:
+        window = self._minute[provider]
+        while window and now - window[0] >= 60:
+            window.popleft()
+        return len(window)
+
+    def try_spend(self, provider: str, priority: str = PRIORITY_NORMAL) -> bool:
+        """Reserve one call; returns False when the budget does not allow it"""
+        budget = self.budgets.get(provider)
+        if budget is None:
+            return True
+
+        with self._lock:
+            now = self.clock()
+            day = self._sync_day(provider)
+
+            if budget.per_minute_limit:
+                remaining = budget.per_minute_limit - self._minute_used(provider, now)
+                floor = 0 if priority == PRIORITY_HIGH else budget.per_minute_reserve
+                if remaining <= floor:
+                    self._denied[provider] += 1
+                    return False
+
+            if budget.daily_limit:
+                remaining = budget.daily_limit - self._daily[provider]
+                floor = 0 if priority == PRIORITY_HIGH else budget.high_priority_reserve
+                if priority == PRIORITY_LOW or remaining <= floor:
+                    self._denied[provider] += 1
+                    return False
+
+            self._minute[provider].append(now)
+            self._daily[provider] += 1
+            if budget.daily_limit:
+                self._unwritten[provider] += 1
+                self._writer.submit(self._persist, provider, day, 1)
+        return True
+
+    def mark_exhausted(self, provider: str):
+        """Provider reported its quota is used up (e.g. HTTP 429 / rate-limit note)"""
+        budget = self.budgets.get(provider)
+        if budget is None or not budget.daily_limit:
+            return
+        with self._lock:
+            day = self._sync_day(provider)
+            self._daily[provider] = budget.daily_limit
+            self._writer.submit(self._persist, provider, day, 0, budget.daily_limit)
+        logger.warning(f"{provider} daily quota marked exhausted")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every write queued so far is done; False on timeout"""
+        try:
+            self._writer.submit(lambda: None).result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def remaining(self, provider: str) -> Dict[str, Any]:
+        """Remaining budget for one provider"""
+        budget = self.budgets[provider]
+        with self._lock:
+            now = self.clock()
+            self._sync_day(provider)
+            used_today = self._daily[provider]
+            used_minute = self._minute_used(provider, now)
+            denied = self._denied[provider]
+
+        daily_remaining: Optional[int] = None
+        if budget.daily_limit:
+            daily_remaining = max(budget.daily_limit - used_today, 0)
+
+        return {
+            "provider": provider,
+            "daily_limit": budget.daily_limit or None,
+            "used_today": used_today,
+            "daily_remaining": daily_remaining,
+            "normal_priority_remaining": max(daily_remaining - budget.high_priority_reserve, 0) if daily_remaining is not None else None,
+            "per_minute_limit": budget.per_minute_limit or None,
+            "per_minute_reserve": budget.per_minute_reserve,
+            "used_last_minute": used_minute,
+            "denied_calls": denied
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Budget status for all providers"""
+        return {name: self.remaining(name) for name in self.budgets}
+
+
+# Create singleton instance
+quota_ledger = QuotaLedger({
+    "finnhub": ProviderBudget(
+        "finnhub",
+        daily_limit=settings.FINNHUB_DAILY_LIMIT,
+        per_minute_limit=settings.FINNHUB_PER_MINUTE_LIMIT,
+        per_minute_reserve=settings.FINNHUB_HIGH_PRIORITY_PER_MINUTE_RESERVE
+    ),
+    "alpha_vantage": ProviderBudget(
+        "alpha_vantage",
+        daily_limit=settings.ALPHA_VANTAGE_DAILY_LIMIT,
+        per_minute_limit=settings.ALPHA_VANTAGE_PER_MINUTE_LIMIT,
+        high_priority_reserve=settings.ALPHA_VANTAGE_HIGH_PRIORITY_RESERVE,
+        per_minute_reserve=settings.ALPHA_VANTAGE_HIGH_PRIORITY_PER_MINUTE_RESERVE
+    ),
+})
@@ -0,0 +1,216 @@
+"""
+Quote sanity filter - rejects bad prints and provider glitches
+
+Keeps a per-symbol sliding window of accepted prices in a sorted Python list.
+Adding or dropping a price is O(n): a binary search plus a list insert or
+delete, which shifts at most `window` floats (64 by default). Reading the
+rolling median is then O(1), and the rolling MAD (median absolute deviation)
+is an O(log n) selection over the two sorted halves of the window. A tick is
+suspect when it is many robust standard deviations away from recent history
+or disagrees with the latest price from the other provider.
+
+The window is bounded by age as well as size (max_age seconds), so history
+does not carry across a session boundary or a halt: the first ticks after a
+gap score against an empty window and are accepted. The scale floor
+(min_relative_scale) keeps a quiet tape from flagging moves of a few
+percent. Suspect ticks never enter the window. A genuine level shift inside
+a session is accepted once several consecutive suspect ticks agree with
+each other.
+"""
+
+import logging
+import math
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# MAD -> standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+
+def _kth_smallest(a: Callable[[int], float], a_len: int, b: Callable[[int], float], b_len: int, k: int) -> float:
+    """k-th smallest (0-based) of two ascending sequences given as accessors, O(log n)"""
+    lo, hi = max(0, k + 1 - b_len), min(k + 1, a_len)
+    while lo < hi:
+        i = (lo + hi) // 2
+        if a(i) < b(k - i):
+            lo = i + 1
+        else:
+            hi = i
+    i, j = lo, k + 1 - lo
+    left = a(i - 1) if i > 0 else -math.inf
+    right = b(j - 1) if j > 0 else -math.inf
+    return max(left, right)
+
+
+class RollingMedianMAD:
+    """Fixed-size sliding window: O(n) add/drop, O(1) median and O(log n) MAD"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque = deque()
+        self.times: deque = deque()
+        self.sorted: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: float, at: float = 0.0):
+        # insort and del shift the list: O(n) in the window size
+        self.values.append(value)
+        self.times.append(at)
+        insort(self.sorted, value)
+        if len(self.values) > self.size:
+            self._drop_oldest()
+
+    def expire(self, before: float):
+        """Drop values added before the given time"""
+        while self.times and self.times[0] < before:
+            self._drop_oldest()
+
+    def reset(self, values: List[float], at: float = 0.0):
+        self.values = deque(values[-self.size:])
+        self.times = deque([at] * len(self.values))
+        self.sorted = sorted(self.values)
+
+    def _drop_oldest(self):
+        oldest = self.values.popleft()
+        self.times.popleft()
+        del self.sorted[bisect_left(self.sorted, oldest)]
+
+    def median(self) -> float:
+        s, n = self.sorted, len(self.sorted)
+        h = n // 2
+        return s[h] if n % 2 else (s[h - 1] + s[h]) / 2
+
+    def mad(self) -> float:
+        """Median of |x - median|; both halves of the sorted window are already ordered by deviation"""
+        s, n = self.sorted, len(self.sorted)
+        if n == 0:
+            return 0.0
+        m = self.median()
+        h = n // 2
+
+        def below(j: int) -> float:
+            return m - s[h - 1 - j]
+
+        def above(j: int) -> float:
+            return s[h + j] - m
+
+        if n % 2:
+            return _kth_smallest(below, h, above, n - h, n // 2)
+        return (_kth_smallest(below, h, above, n - h, n // 2 - 1) + _kth_smallest(below, h, above, n - h, n // 2)) / 2
+
+
+class QuoteSanityFilter:
+    """Per-symbol outlier filter over rolling robust statistics"""
+
+    def __init__(
+        self,
+        window: int = 64,
+        max_age: float = 300.0,
+        min_samples: int = 8,
+        max_score: float = 8.0,
+        min_relative_scale: float = 0.005,
+        max_cross_deviation: float = 0.02,
+        cross_max_age: float = 120.0,
+        confirm_ticks: int = 3,
+        confirm_tolerance: float = 0.005,
+        clock: Callable[[], float] = time.time
+    ):
+        self.window = window
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.max_score = max_score
+        self.min_relative_scale = min_relative_scale
+        self.max_cross_deviation = max_cross_deviation
+        self.cross_max_age = cross_max_age
+        self.confirm_ticks = confirm_ticks
+        self.confirm_tolerance = confirm_tolerance
+        self.clock = clock
+        self._stats: Dict[str, RollingMedianMAD] = {}
+        self._pending: Dict[str, List[float]] = {}
+        self._last_by_source: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        self.rejected = 0
+
+    def check(self, symbol: str, price: float, source: str) -> Dict[str, Any]:
+        """Score a tick; accepted ticks update the symbol's history"""
+        verdict: Dict[str, Any] = {"ok": True, "reason": None, "score": None, "median": None, "cross_deviation": None}
+
+        if price is None or not math.isfinite(price) or price <= 0:
+            verdict.update(ok=False, reason=f"Invalid price {price}")
+            self.rejected += 1
+            return verdict
+
+        now = self.clock()
+        stats = self._stats.setdefault(symbol, RollingMedianMAD(self.window))
+        stats.expire(now - self.max_age)
+
+        # Against recent history
+        history_reason = None
+        if len(stats) >= self.min_samples:
+            median = stats.median()
+            scale = max(MAD_SCALE * stats.mad(), self.min_relative_scale * median)
+            score = abs(price - median) / scale
+            verdict.update(score=round(score, 2), median=median)
+            if score > self.max_score:
+                history_reason = f"Price {price} is {score:.1f} robust sigmas from rolling median {median:.4f}"
+
+        # Against the other provider's latest price
+        cross_reason = None
+        for other_source, (other_price, seen_at) in self._last_by_source.get(symbol, {}).items():
+            if other_source == source or now - seen_at > self.cross_max_age:
+                continue
+            deviation = abs(price - other_price) / other_price
+            verdict["cross_deviation"] = round(deviation, 6)
+            if deviation > self.max_cross_deviation:
+                cross_reason = f"Price {price} deviates {deviation:.2%} from {other_source} ({other_price})"
+
+        if history_reason:
+            if self._confirm_level_shift(symbol, price, stats, now):
+                logger.warning(f"Accepted level shift for {symbol} at {price}")
+                verdict["level_shift"] = True
+                history_reason = None
+        else:
+            self._pending.pop(symbol, None)
+
+        reason = history_reason or cross_reason
+        if reason:
+            verdict.update(ok=False, reason=reason)
+            self.rejected += 1
+            logger.warning(f"Suspect quote for {symbol} from {source}: {reason}")
+            return verdict
+
+        if not verdict.get("level_shift"):
+            stats.add(price, now)
+        self._last_by_source.setdefault(symbol, {})[source] = (price, now)
+        return verdict
+
+    def _confirm_level_shift(self, symbol: str, price: float, stats: RollingMedianMAD, now: float) -> bool:
+        """Consecutive suspect ticks that agree with each other reset the window"""
+        pending = self._pending.setdefault(symbol, [])
+        if pending and abs(price - pending[-1]) / pending[-1] > self.confirm_tolerance:
+            pending.clear()
+        pending.append(price)
+        if len(pending) < self.confirm_ticks:
+            return False
+        stats.reset(pending, now)
+        self._pending.pop(symbol, None)
+        return True
+
+    def reset(self, symbol: Optional[str] = None):
+        if symbol:
+            self._stats.pop(symbol, None)
+            self._pending.pop(symbol, None)
+            self._last_by_source.pop(symbol, None)
+        else:
+            self._stats.clear()
+            self._pending.clear()
+            self._last_by_source.clear()
+
+
+# Create singleton instance
+quote_filter = QuoteSanityFilter()
@@ -0,0 +1,109 @@
+"""
+Background quote poller
+
+Fetches quotes for symbols that something is waiting on but no request has
+priced lately. The trigger monitor and the resting paper order book register
+their symbols here, so a symbol in both sets is fetched once per cycle instead
+of once per watcher.
+
+Each watcher names a refresh interval. A symbol is due once its last accepted
+quote (MarketDataService.last_tick) is older than the shortest interval among
+its watchers; symbols priced by dashboards or executions in the meantime are
+skipped. Every cycle fetches at most QUOTE_POLL_MAX_SYMBOLS due symbols,
+stalest first, at low priority, so polling stops at the per-minute reserve
+kept for trade execution and never falls back to Alpha Vantage.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.services.market_data_service import market_data_service
+from app.services.quota_ledger import PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+MIN_CYCLE_SECONDS = 1.0
+
+
+class QuotePoller:
+    """Refreshes the stalest watched symbols within a per-cycle cap"""
+
+    def __init__(self, max_symbols: int = 5, clock: Callable[[], float] = time.monotonic):
+        self.max_symbols = max_symbols
+        self.clock = clock
+        self._watchers: Dict[str, Tuple[Callable[[], Iterable[str]], float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.fetched = 0
+        self.failed = 0
+
+    def watch(self, name: str, symbols: Callable[[], Iterable[str]], interval: float):
+        """Keep the symbols returned by `symbols` no older than `interval` seconds"""
+        self._watchers[name] = (symbols, interval)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def unwatch(self, name: str):
+        self._watchers.pop(name, None)
+        if not self._watchers:
+            await self.stop()
+
+    async def stop(self):
+        self._watchers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def due(self) -> List[str]:
+        """Symbols whose last tick is older than their shortest watch interval, stalest first"""
+        intervals: Dict[str, float] = {}
+        for name, (symbols, interval) in list(self._watchers.items()):
+            try:
+                for symbol in symbols():
+                    intervals[symbol] = min(interval, intervals.get(symbol, interval))
+            except Exception as e:
+                logger.debug(f"Quote poll could not list symbols for {name}: {str(e)}")
+        now = self.clock()
+        ages = {
+            symbol: now - market_data_service.last_tick.get(symbol, float("-inf"))
+            for symbol in intervals
+        }
+        stale = [symbol for symbol, interval in intervals.items() if ages[symbol] >= interval]
+        stale.sort(key=lambda symbol: ages[symbol], reverse=True)
+        return stale[:self.max_symbols]
+
+    async def poll_once(self) -> int:
+        """Fetch one cycle's worth of due symbols"""
+        fetched = 0
+        for symbol in self.due():
+            try:
+                # Accepted quotes reach the trigger index and order book through MarketDataService itself
+                await market_data_service.get_quote(symbol, PRIORITY_LOW)
+                fetched += 1
+            except Exception as e:
+                self.failed += 1
+                logger.debug(f"Quote poll skipped {symbol}: {str(e)}")
+        self.fetched += fetched
+        return fetched
+
+    async def _poll_loop(self):
+        while True:
+            intervals = [interval for _, interval in self._watchers.values()]
+            await asyncio.sleep(max(min(intervals, default=MIN_CYCLE_SECONDS), MIN_CYCLE_SECONDS))
+            await self.poll_once()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "watchers": sorted(self._watchers),
+            "max_symbols": self.max_symbols,
+            "fetched": self.fetched,
+            "failed": self.failed,
+        }
+
+
+# Create singleton instance
+quote_poller = QuotePoller(max_symbols=settings.QUOTE_POLL_MAX_SYMBOLS)
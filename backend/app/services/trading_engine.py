@@ -3,21 +3,44 @@ Core trading engine service
 """
 
 import logging
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 from app.utils.validators import ValidationGates
+from app.utils.gate_pipeline import GateRun, gate_pipeline, FAST, DIAGNOSTIC
+from app.utils.gate_results import pack_gate_results
+from app.services.exposure_service import exposure_service
+from app.services.activity_log_writer import activity_log_writer, serialize_details
+from app.services.mark_to_market import mark_to_market
+from app.services.paper_order_book import MARKET
+from app.services.position_ledger import in_ledger, position_ledger, signed_quantity
+from app.services.trigger_index import BRACKET, TRAILING_STOP, trigger_index
 from app.models.trade import Trade, Position, ActivityLog
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 logger = logging.getLogger(__name__)
 
+# Paper trade committed by the request, waiting for its simulated fill (see paper_fill_simulator)
+PENDING = "PENDING"
+# Paper LIMIT / STOP order resting in the order book until the price crosses it (see paper_order_book)
+RESTING = "RESTING"
+
 class TradingEngine:
     """Core trading bot logic and signal generation"""
     
     def __init__(self, db: Session):
         self.db = db
         self.validators = ValidationGates()
+        self.pipeline = gate_pipeline
+        self.exposure = exposure_service
+        self.audit = activity_log_writer
+        self.ledger = position_ledger
+        self.triggers = trigger_index
+        self.marks = mark_to_market
+        self._pending_activity = []
+        self._pending_marks = []
         self.MIN_RR_RATIO = 1.5
     
     def calculate_atr_based_stop_loss(self, high: float, low: float, close: float, period: int = 14) -> float:
@@ -35,12 +58,12 @@ class TradingEngine:
         
         return target
     
-    def validate_trade_signal(self, market_data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
-        """Validate trade signal through all 9 gates"""
+    def validate_trade_signal(self, market_data: Dict[str, Any], mode: str = DIAGNOSTIC) -> Tuple[bool, Dict[str, Any]]:
+        """Validate trade signal through all gates"""
         
-        all_passed, gates_results = self.validators.validate_all_gates(market_data)
+        gate_run = self.pipeline.run(market_data, mode)
         
-        return all_passed, gates_results
+        return gate_run.passed, gate_run.results
     
     def generate_trade_signal(
         self,
@@ -52,13 +75,49 @@ class TradingEngine:
     ) -> Optional[Dict[str, Any]]:
         """Generate trade signal with validation"""
         
+        signal, _, _ = self.evaluate_trade_signal(symbol, direction, market_data, ai_confidence, reasoning)
+        return signal
+    
+    def evaluate_trade_signal(
+        self,
+        symbol: str,
+        direction: str,
+        market_data: Dict[str, Any],
+        ai_confidence: float = 0.0,
+        reasoning: str = "",
+        mode: str = FAST,
+        validators: Optional[ValidationGates] = None
+    ) -> Tuple[Optional[Dict[str, Any]], GateRun, Optional[str]]:
+        """
+        Generate trade signal and hand back the gate run
+        
+        Returns (signal, gate_run, rejection_reason). The gate run holds every
+        gate result that was computed, so callers can build error messages
+        without evaluating the gates again. validators is the portfolio's
+        compiled rule set (defaults apply when omitted).
+        """
+        
         # Validate through gates
-        valid, gates_results = self.validate_trade_signal(market_data)
+        gate_run = self.pipeline.run(market_data, mode, validators=validators)
         
-        if not valid:
-            failed_gates = [g for g in gates_results.values() if not g["passed"]]
-            logger.warning(f"Trade rejected: {failed_gates[0]['reason']}")
-            return None
+        if not gate_run.passed:
+            rejection = gate_run.failure_message()
+            logger.warning(f"Trade rejected: {rejection}")
+            return None, gate_run, rejection
+        
+        signal, rejection = self.build_signal(symbol, direction, market_data, gate_run.results, ai_confidence, reasoning)
+        return signal, gate_run, rejection
+    
+    def build_signal(
+        self,
+        symbol: str,
+        direction: str,
+        market_data: Dict[str, Any],
+        gate_results: Dict[str, Any],
+        ai_confidence: float = 0.0,
+        reasoning: str = ""
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Price a signal that has passed the gates; returns (signal, rejection_reason)"""
         
         # Calculate prices
         current_price = market_data.get("current_price", 0)
@@ -75,10 +134,11 @@ class TradingEngine:
         rr_ratio = reward / risk if risk > 0 else 0
         
         if rr_ratio < self.MIN_RR_RATIO:
-            logger.warning(f"R:R ratio {rr_ratio:.2f} below minimum {self.MIN_RR_RATIO}")
-            return None
+            rejection = f"R:R ratio {rr_ratio:.2f} below minimum {self.MIN_RR_RATIO}"
+            logger.warning(rejection)
+            return None, rejection
         
-        return {
+        signal = {
             "symbol": symbol,
             "direction": direction,
             "entry_price": current_price,
@@ -88,65 +148,313 @@ class TradingEngine:
             "ai_confidence": ai_confidence,
             "reasoning": reasoning,
             "timestamp": datetime.utcnow(),
-            "validation_gates": gates_results
+            "validation_gates": pack_gate_results(gate_results)
         }
+        return signal, None
+    
+    def _new_trade(
+        self,
+        portfolio_id: int,
+        signal: Dict[str, Any],
+        quantity: int,
+        paper_trading: bool,
+        pending: bool = False
+    ) -> Trade:
+        order_type = signal.get("order_type") or BRACKET
+        entry_type = signal.get("entry_type") or MARKET
+        status = RESTING if entry_type != MARKET else PENDING if pending else "OPEN"
+        # A resting order keeps the requested level; the signal's entry is the live price,
+        # so its bracket moves with it to the limit
+        limit_price = signal.get("limit_price") or signal["entry_price"] if entry_type != MARKET else None
+        offset = limit_price - signal["entry_price"] if limit_price else 0.0
+        trail_amount = None
+        if order_type == TRAILING_STOP:
+            # Without an explicit distance the stop trails by the initial risk
+            trail_amount = signal.get("trail_amount") or abs(signal["entry_price"] - signal["stop_loss"])
+        return Trade(
+            portfolio_id=portfolio_id,
+            symbol=signal["symbol"],
+            direction=signal["direction"],
+            entry_price=limit_price or signal["entry_price"],
+            stop_loss=signal["stop_loss"] + offset,
+            take_profit=signal["take_profit"] + offset,
+            quantity=quantity,
+            ai_confidence=signal["ai_confidence"],
+            entry_reasoning=signal["reasoning"],
+            status=status,
+            validation_gates_passed=signal["validation_gates"],
+            paper_trading="paper" if paper_trading else "real",
+            order_type=order_type,
+            trail_amount=trail_amount,
+            entry_type=entry_type,
+            limit_price=limit_price
+        )
     
     def execute_trade(
         self,
         portfolio_id: int,
         signal: Dict[str, Any],
         quantity: int,
-        paper_trading: bool = False
+        paper_trading: bool = False,
+        timer: Any = None,
+        pending: bool = False
+    ) -> Optional[Trade]:
+        """
+        Execute approved trade signal
+        
+        The trade is written with a single commit. Its activity log joins the
+        same transaction, or in write-behind mode is queued once the trade is
+        committed. timer: optional StageTimer for log/persist latency.
+        
+        pending: commit the trade as PENDING without filling it; the fill
+        comes later from fill_pending. LIMIT / STOP signals (entry_type) are
+        committed RESTING, also unfilled.
+        """
+        
+        stage = timer.stage if timer else (lambda name: nullcontext())
+        try:
+            trade = self._new_trade(portfolio_id, signal, quantity, paper_trading, pending)
+            trade_type = "Paper Trade" if paper_trading else "Trade"
+            filled = trade.status == "OPEN"
+            
+            with stage("log"):
+                if trade.status == RESTING:
+                    reason = f"{trade_type} {trade.entry_type} order resting at {trade.limit_price}"
+                elif trade.status == PENDING:
+                    reason = f"{trade_type} submitted for simulated fill"
+                else:
+                    reason = f"{trade_type} executed successfully"
+                self._activity(trade, "EXECUTED", reason, signal)
+            
+            with stage("persist"):
+                self.db.add(trade)
+                if filled:
+                    self._apply_open(trade)
+                self.db.commit()
+                self.db.refresh(trade)
+                if filled:
+                    self.exposure.on_open(portfolio_id, trade.symbol, trade.entry_price * trade.quantity)
+                    self.triggers.arm_trade(trade)
+            self._publish_marks()
+            self._publish_activity()
+            
+            logger.info(f"{trade_type} executed: {signal['symbol']} {signal['direction']} @ {signal['entry_price']}")
+            return trade
+            
+        except StaleDataError:
+            # Portfolio changed under us (another worker); the caller re-checks and retries
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            raise
+        except Exception as e:
+            logger.error(f"Error executing trade: {str(e)}")
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            return None
+    
+    def execute_basket(
+        self,
+        portfolio_id: int,
+        orders: List[Tuple[Dict[str, Any], int]],
+        paper_trading: bool = False,
+        timer: Any = None,
+        pending: bool = False
+    ) -> Optional[List[Trade]]:
+        """
+        Persist approved (signal, quantity) legs in one transaction
+        
+        Either every leg is written or none is. Activity logs and pending
+        follow the same rules as execute_trade.
+        """
+        
+        stage = timer.stage if timer else (lambda name: nullcontext())
+        trade_type = "Paper Trade" if paper_trading else "Trade"
+        try:
+            trades = [self._new_trade(portfolio_id, signal, quantity, paper_trading, pending) for signal, quantity in orders]
+            
+            action = "submitted for simulated fill" if pending else "executed"
+            for trade, (signal, _) in zip(trades, orders):
+                self._activity(trade, "EXECUTED", f"{trade_type} {action} (basket of {len(trades)})", signal)
+            
+            with stage("persist"):
+                self.db.add_all(trades)
+                if not pending:
+                    for trade in trades:
+                        self._apply_open(trade)
+                self.db.commit()
+                
+                # Reload every leg in one SELECT rather than one refresh per trade
+                ids = [trade.id for trade in trades]
+                loaded = {trade.id: trade for trade in self.db.query(Trade).filter(Trade.id.in_(ids))}
+                trades = [loaded[trade_id] for trade_id in ids]
+                if not pending:
+                    for trade in trades:
+                        self.exposure.on_open(portfolio_id, trade.symbol, trade.entry_price * trade.quantity)
+                        self.triggers.arm_trade(trade)
+            self._publish_marks()
+            self._publish_activity()
+            
+            logger.info(f"Basket executed: {len(trades)} {trade_type.lower()}s for portfolio {portfolio_id}")
+            return trades
+            
+        except StaleDataError:
+            # Portfolio changed under us (another worker); the caller re-checks and retries
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            raise
+        except Exception as e:
+            logger.error(f"Error executing basket: {str(e)}")
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            return None
+    
+    def fill_pending(
+        self,
+        trade_id: int,
+        fills: List[Tuple[int, float]],
+        details: Optional[Dict[str, Any]] = None
     ) -> Optional[Trade]:
-        """Execute approved trade signal"""
+        """
+        Open a PENDING or RESTING trade from its (quantity, price) fills
+        
+        The trade keeps the filled quantity at the volume-weighted price. Any
+        unfilled remainder is cancelled. A RESTING trade's stop and target
+        move with the fill. The FILLED log commits with the trade; like
+        every paper trade, the fill stays out of the position ledger.
+        """
         
         try:
-            trade = Trade(
-                portfolio_id=portfolio_id,
-                symbol=signal["symbol"],
-                direction=signal["direction"],
-                entry_price=signal["entry_price"],
-                stop_loss=signal["stop_loss"],
-                take_profit=signal["take_profit"],
-                quantity=quantity,
-                ai_confidence=signal["ai_confidence"],
-                entry_reasoning=signal["reasoning"],
-                status="OPEN",
-                validation_gates_passed=signal["validation_gates"],
-                paper_trading="paper" if paper_trading else "real"
+            trade = self.db.query(Trade).filter(Trade.id == trade_id).first()
+            quantity = sum(filled for filled, _ in fills)
+            if not trade or trade.status not in (PENDING, RESTING) or quantity <= 0:
+                logger.warning(f"Cannot fill trade {trade_id}")
+                return None
+            
+            requested = trade.quantity
+            fill_price = sum(filled * price for filled, price in fills) / quantity
+            if trade.status == RESTING:
+                # The bracket was set around the limit; keep its distances from the fill
+                trade.stop_loss += fill_price - trade.entry_price
+                trade.take_profit += fill_price - trade.entry_price
+            trade.entry_price = fill_price
+            trade.quantity = quantity
+            trade.opened_at = datetime.utcnow()
+            trade.status = "OPEN"
+            self._activity(
+                trade,
+                "FILLED",
+                f"Filled {quantity}/{requested} @ {trade.entry_price:.4f}",
+                {"fill_price": trade.entry_price, "filled_quantity": quantity, **(details or {})}
             )
+            self._apply_open(trade)
             
-            self.db.add(trade)
             self.db.commit()
             self.db.refresh(trade)
+            self.exposure.on_open(trade.portfolio_id, trade.symbol, trade.entry_price * trade.quantity)
+            self.triggers.arm_trade(trade)
+            self._publish_marks()
+            self._publish_activity()
             
-            # Log activity
-            trade_type = "Paper Trade" if paper_trading else "Trade"
-            self._log_activity(trade.id, "EXECUTED", f"{trade_type} executed successfully", signal)
+            logger.info(f"Paper trade {trade_id} filled: {quantity}/{requested} {trade.symbol} @ {trade.entry_price:.4f}")
+            return trade
             
-            logger.info(f"{trade_type} executed: {signal['symbol']} {signal['direction']} @ {signal['entry_price']}")
+        except StaleDataError:
+            # Portfolio changed under us (another worker); the caller retries
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            raise
+        except Exception as e:
+            logger.error(f"Error filling trade: {str(e)}")
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            return None
+    
+    def cancel_resting(self, trade_id: int) -> Optional[Trade]:
+        """Cancel a RESTING order; None if it is no longer resting"""
+        
+        try:
+            trade = self.db.query(Trade).filter(Trade.id == trade_id).first()
+            if not trade or trade.status != RESTING:
+                logger.warning(f"Cannot cancel trade {trade_id}")
+                return None
+            
+            trade.status = "CANCELLED"
+            trade.close_reason = "cancelled"
+            trade.closed_at = datetime.utcnow()
+            self._activity(trade, "CANCELLED", f"{trade.entry_type} order cancelled", {"limit_price": trade.limit_price})
+            self.db.commit()
+            self.db.refresh(trade)
+            self._publish_activity()
             return trade
             
+        except StaleDataError:
+            # Trade changed under us (filled by the simulator); the caller re-checks
+            self.db.rollback()
+            self._pending_activity.clear()
+            raise
         except Exception as e:
-            logger.error(f"Error executing trade: {str(e)}")
+            logger.error(f"Error cancelling trade: {str(e)}")
             self.db.rollback()
+            self._pending_activity.clear()
             return None
     
     def close_trade(
         self,
         trade_id: int,
         exit_price: float,
-        close_reason: str
+        close_reason: str,
+        quantity: Optional[int] = None,
+        trigger: Any = None
     ) -> Optional[Trade]:
-        """Close an open trade and calculate P/L"""
+        """
+        Close an open trade and calculate P/L
+        
+        quantity below the trade's size closes part of it: the open trade
+        keeps the remainder and a new CLOSED trade records the closed part
+        (which is what is returned).
+        
+        trigger: the exit leg that fired (from the trigger index). Its
+        cancelled sibling legs are recorded in the CLOSED log, so the fill
+        and the OCO cancellation commit together.
+        """
         
         try:
             trade = self.db.query(Trade).filter(Trade.id == trade_id).first()
             
-            if not trade or trade.status == "CLOSED":
+            if not trade or trade.status != "OPEN":
                 logger.warning(f"Cannot close trade {trade_id}")
                 return None
             
+            if quantity is not None and not 0 < quantity <= trade.quantity:
+                logger.warning(f"Cannot close {quantity} of trade {trade_id} (size {trade.quantity})")
+                return None
+            if quantity is not None and quantity < trade.quantity:
+                trade.quantity -= quantity
+                trade = Trade(
+                    portfolio_id=trade.portfolio_id,
+                    symbol=trade.symbol,
+                    direction=trade.direction,
+                    entry_price=trade.entry_price,
+                    stop_loss=trade.stop_loss,
+                    take_profit=trade.take_profit,
+                    quantity=quantity,
+                    opened_at=trade.opened_at,
+                    ai_confidence=trade.ai_confidence,
+                    entry_reasoning=trade.entry_reasoning,
+                    validation_gates_passed=trade.validation_gates_passed,
+                    paper_trading=trade.paper_trading,
+                    order_type=trade.order_type,
+                    trail_amount=trade.trail_amount,
+                    trail_watermark=trade.trail_watermark
+                )
+                self.db.add(trade)
+            
             # Calculate P/L
             if trade.direction == "BUY":
                 pnl = (exit_price - trade.entry_price) * trade.quantity
@@ -162,50 +470,113 @@ class TradingEngine:
             trade.close_reason = close_reason
             trade.closed_at = datetime.utcnow()
             trade.status = "CLOSED"
-            
-            self.db.commit()
-            self.db.refresh(trade)
-            
-            # Log activity
-            self._log_activity(
-                trade.id,
+            details = {"exit_price": exit_price, "pnl": pnl, "pnl_percent": pnl_percent}
+            if trigger is not None:
+                details.update({"trigger_level": trigger.level, "cancelled_legs": list(trigger.cancelled)})
+                if trigger.watermark is not None:
+                    trade.trail_watermark = trigger.watermark
+            self._activity(
+                trade,
                 "CLOSED",
                 f"Trade closed: P/L {pnl:.2f} ({pnl_percent:.2f}%)",
-                {"exit_price": exit_price, "pnl": pnl, "pnl_percent": pnl_percent}
+                details
             )
             
+            fill = None
+            if in_ledger(trade):
+                fill = self.ledger.apply_fill(
+                    self.db,
+                    trade.portfolio_id,
+                    trade.symbol,
+                    "SELL" if trade.direction == "BUY" else "BUY",
+                    trade.quantity,
+                    exit_price,
+                    trade=trade
+                )
+                self._mark(fill)
+            
+            # Trade update, position/cash and the log commit together
+            self.db.commit()
+            self.db.refresh(trade)
+            self.exposure.on_close(trade.portfolio_id, trade.symbol, trade.entry_price * trade.quantity)
+            if fill is not None:
+                self.exposure.set_equity(trade.portfolio_id, fill.portfolio.current_equity)
+            self.triggers.disarm(trade.id)
+            self._publish_marks()
+            self._publish_activity()
+            
             logger.info(f"Trade closed: {trade.symbol} P/L {pnl:.2f}")
             return trade
             
+        except StaleDataError:
+            # Portfolio changed under us (another worker); the caller re-checks and retries
+            self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
+            raise
         except Exception as e:
             logger.error(f"Error closing trade: {str(e)}")
             self.db.rollback()
+            self._pending_activity.clear()
+            self._pending_marks.clear()
             return None
     
-    def _log_activity(self, trade_id: int, event_type: str, reason: str, details: Dict[str, Any]):
-        """Log trade activity"""
-        try:
-            # Convert any datetime objects to strings for JSON serialization
-            serializable_details = self._serialize_details(details)
-            
-            log = ActivityLog(
-                trade_id=trade_id,
-                event_type=event_type,
-                reason=reason,
-                details=serializable_details
-            )
-            self.db.add(log)
-            self.db.commit()
-        except Exception as e:
-            logger.error(f"Error logging activity: {str(e)}")
-    
-    def _serialize_details(self, obj: Any) -> Any:
-        """Recursively convert datetime objects to ISO format strings"""
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, dict):
-            return {k: self._serialize_details(v) for k, v in obj.items()}
-        elif isinstance(obj, (list, tuple)):
-            return [self._serialize_details(item) for item in obj]
-        else:
-            return obj
+    def _apply_open(self, trade: Trade):
+        """Opening fill for a new live trade (same transaction as the trade)"""
+        if not in_ledger(trade):
+            return
+        self._mark(self.ledger.apply_fill(
+            self.db,
+            trade.portfolio_id,
+            trade.symbol,
+            trade.direction,
+            trade.quantity,
+            trade.entry_price,
+            trade.stop_loss,
+            trade.take_profit,
+            trade=trade
+        ))
+    
+    def _mark(self, fill: Any):
+        # Read before commit expires the rows; applied once the transaction commits
+        self._pending_marks.append((
+            fill.portfolio.id,
+            fill.position.symbol,
+            signed_quantity(fill.position),
+            fill.position.entry_price,
+            fill.portfolio.cash_balance
+        ))
+    
+    def _publish_marks(self):
+        """Hand committed fills to the mark-to-market engine"""
+        pending, self._pending_marks = self._pending_marks, []
+        for mark in pending:
+            self.marks.apply(*mark)
+    
+    def _activity(self, trade: Trade, event_type: str, reason: str, details: Dict[str, Any]):
+        """
+        Record an activity log for the trade
+        
+        Transactional mode: the log is added to the session against the trade
+        object, so it is inserted by the trade's own flush/commit. Write-behind
+        mode: it is held until the trade commits, then queued by
+        _publish_activity (serialization happens on the writer thread).
+        """
+        if self.audit.write_behind:
+            self._pending_activity.append((trade, event_type, reason, details))
+            return
+        
+        # Convert any datetime objects to strings for JSON serialization
+        self.db.add(ActivityLog(
+            trade=trade,
+            event_type=event_type,
+            reason=reason,
+            details=serialize_details(details)
+        ))
+    
+    def _publish_activity(self):
+        """Hand logs for committed trades to the write-behind writer"""
+        pending, self._pending_activity = self._pending_activity, []
+        bind = self.db.get_bind()
+        for trade, event_type, reason, details in pending:
+            self.audit.submit(bind, trade.id, event_type, reason, details)
@@ -0,0 +1,526 @@
+"""
+Price-trigger index for stop-loss, take-profit and trailing-stop levels
+
+Every open trade arms its exit legs on its symbol. The legs are
+one-cancels-other: the first one the price crosses disarms the whole
+trade, so its other legs can never fire as well.
+
+Fixed levels. A BUY's stop fires when the price falls to it and its target
+when the price rises to it. A SELL is the mirror image. Each symbol
+therefore keeps two heaps:
+
+- below: max-heap of levels that fire when price <= level (BUY stops, SELL
+  targets);
+- above: min-heap of levels that fire when price >= level (BUY targets, SELL
+  stops).
+
+A price update pops from the top of each heap only while the top level is
+crossed. Finding the k crossed levels among n armed ones costs O(k log n).
+
+Trailing stops (TrailingBook). A long's trailing stop sits trail_amount
+below the highest price since it was armed, its watermark. A short's sits
+trail_amount above the lowest price. Trades are grouped by watermark on a
+stack with strictly decreasing watermarks, the highest at the bottom. A new
+high lifts every group below it to the same watermark, and those groups are
+always at the top of the stack. So a tick pops and merges the top groups
+into one, which is amortized O(1). Each group keeps a heap of trail amounts.
+Its fire level is its watermark minus the smallest amount, and a per-side
+heap of fire levels finds the groups the price has fallen through. Shorts
+use the same structure on negated prices.
+
+Removal is lazy. A disarmed or moved leg stays where it is until it
+surfaces and is skipped. When stale entries outnumber live ones, the
+symbol's structures are compacted.
+
+The index only finds crossed levels; TriggerMonitor closes the trades.
+"""
+
+import heapq
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STOP_LOSS = "stop_loss"
+TAKE_PROFIT = "take_profit"
+TRAILING = "trailing_stop"
+
+# Order types (Trade.order_type)
+BRACKET = "BRACKET"  # fixed stop and target, one-cancels-other
+TRAILING_STOP = "TRAILING_STOP"  # bracket whose stop also trails the best price by trail_amount
+ORDER_TYPES = (BRACKET, TRAILING_STOP)
+
+# Below this many entries a symbol's structures are never compacted
+COMPACT_MIN_ENTRIES = 1024
+
+
+class Trigger:
+    """A crossed leg, ready to be closed at price; cancelled lists the legs it cancels"""
+
+    __slots__ = ("trade_id", "portfolio_id", "symbol", "reason", "level", "price", "watermark", "cancelled")
+
+    def __init__(
+        self,
+        trade_id: int,
+        portfolio_id: int,
+        symbol: str,
+        reason: str,
+        level: float,
+        price: float,
+        watermark: Optional[float] = None,
+        cancelled: Tuple[str, ...] = ()
+    ):
+        self.trade_id = trade_id
+        self.portfolio_id = portfolio_id
+        self.symbol = symbol
+        self.reason = reason
+        self.level = level
+        self.price = price
+        self.watermark = watermark
+        self.cancelled = cancelled
+
+    def __repr__(self) -> str:
+        return f"Trigger({self.trade_id}, {self.symbol}, {self.reason} {self.level} @ {self.price})"
+
+
+class _Armed:
+    """Live legs of one trade; seqs identify the current entry of each leg"""
+
+    __slots__ = ("portfolio_id", "symbol", "direction", "levels", "trail", "group", "seqs")
+
+    def __init__(self, portfolio_id: int, symbol: str, direction: str):
+        self.portfolio_id = portfolio_id
+        self.symbol = symbol
+        self.direction = direction
+        self.levels: Dict[str, float] = {}
+        self.trail: Optional[float] = None
+        self.group: Optional["_Group"] = None
+        self.seqs: Dict[str, int] = {}
+
+    def legs(self) -> List[str]:
+        return list(self.levels) + ([TRAILING] if self.trail else [])
+
+
+class _Group:
+    """Trailing stops sharing one watermark; parent points to the group it was merged into"""
+
+    __slots__ = ("watermark", "trails", "version", "parent")
+
+    def __init__(self, watermark: float):
+        self.watermark = watermark
+        self.trails: List[tuple] = []  # (trail_amount, seq, trade_id)
+        self.version = 0
+        self.parent: Optional["_Group"] = None
+
+    def root(self) -> "_Group":
+        group = self
+        while group.parent is not None:
+            if group.parent.parent is not None:
+                group.parent = group.parent.parent
+            group = group.parent
+        return group
+
+
+class TrailingBook:
+    """
+    Trailing stops for one side of one symbol, in favourable-price space
+    (price for longs, -price for shorts)
+    """
+
+    __slots__ = ("stack", "fire_levels", "size", "_version")
+
+    def __init__(self):
+        self.stack: List[_Group] = []  # strictly decreasing watermarks, bottom to top
+        self.fire_levels: List[tuple] = []  # (-(watermark - min trail), version, group)
+        self.size = 0
+        self._version = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, watermark: float, trail: float, seq: int, trade_id: int) -> _Group:
+        group = self._group_for(watermark)
+        heapq.heappush(group.trails, (trail, seq, trade_id))
+        self.size += 1
+        if group.trails[0][1] == seq:
+            self._publish(group)
+        return group
+
+    def load(self, entries: List[tuple]) -> Dict[int, _Group]:
+        """Replace the book with (watermark, trail, seq, trade_id) entries; returns each trade's group"""
+        self.stack, self.fire_levels, self.size = [], [], len(entries)
+        groups = {}
+        for watermark, trail, seq, trade_id in sorted(entries, key=lambda entry: -entry[0]):
+            if not self.stack or self.stack[-1].watermark != watermark:
+                self.stack.append(_Group(watermark))
+            self.stack[-1].trails.append((trail, seq, trade_id))
+            groups[trade_id] = self.stack[-1]
+        for group in self.stack:
+            heapq.heapify(group.trails)
+            self._publish(group)
+        return groups
+
+    def ratchet(self, price: float):
+        """Lift every watermark below price up to price"""
+        if not self.stack or self.stack[-1].watermark >= price:
+            return
+        merged = self.stack.pop()
+        while self.stack and self.stack[-1].watermark <= price:
+            group = self.stack.pop()
+            if len(group.trails) > len(merged.trails):
+                group, merged = merged, group
+            for entry in group.trails:
+                heapq.heappush(merged.trails, entry)
+            group.trails, group.version, group.parent = [], -1, merged  # retire its fire levels
+        merged.watermark = price
+        self.stack.append(merged)
+        self._publish(merged)
+
+    def crossed(self, price: float) -> List[tuple]:
+        """Pop every (trade_id, seq, level, watermark) whose trailing level price has reached"""
+        hits = []
+        while self.fire_levels and -self.fire_levels[0][0] >= price:
+            _, version, group = heapq.heappop(self.fire_levels)
+            if group.version != version:
+                continue
+            while group.trails and group.watermark - group.trails[0][0] >= price:
+                trail, seq, trade_id = heapq.heappop(group.trails)
+                self.size -= 1
+                hits.append((trade_id, seq, group.watermark - trail, group.watermark))
+            if group.trails:
+                self._publish(group)
+            else:
+                group.version = -1  # left on the stack empty until a ratchet or compaction removes it
+        return hits
+
+    def watermarks(self) -> Iterable[tuple]:
+        """(trade_id, seq, watermark) for every entry, stale or not"""
+        for group in self.stack:
+            for _, seq, trade_id in group.trails:
+                yield trade_id, seq, group.watermark
+
+    def compact(self, current: Callable[[int, int], bool]):
+        """Drop entries for which current(trade_id, seq) is false and rebuild the fire levels"""
+        stack, self.fire_levels, self.size = self.stack, [], 0
+        self.stack = []
+        for group in stack:
+            group.trails = [entry for entry in group.trails if current(entry[2], entry[1])]
+            group.version = -1
+            if group.trails:
+                heapq.heapify(group.trails)
+                self.stack.append(group)
+                self.size += len(group.trails)
+                self._publish(group)
+
+    def _group_for(self, watermark: float) -> _Group:
+        # New trades arm at about the last price, so this is almost always the top group
+        i = len(self.stack)
+        while i and self.stack[i - 1].watermark < watermark:
+            i -= 1
+        if i and self.stack[i - 1].watermark == watermark:
+            return self.stack[i - 1]
+        group = _Group(watermark)
+        self.stack.insert(i, group)
+        return group
+
+    def _publish(self, group: _Group):
+        if not group.trails:
+            group.version = -1
+            return
+        self._version += 1
+        group.version = self._version
+        heapq.heappush(self.fire_levels, (-(group.watermark - group.trails[0][0]), group.version, group))
+        if len(self.fire_levels) > 2 * len(self.stack) + 64:
+            self.fire_levels = [
+                (-(g.watermark - g.trails[0][0]), g.version, g) for g in self.stack if g.trails
+            ]
+            heapq.heapify(self.fire_levels)
+
+
+class SymbolTriggers:
+    """The fixed-level heaps and trailing books for one symbol"""
+
+    __slots__ = ("below", "above", "long_trail", "short_trail", "live")
+
+    def __init__(self):
+        self.below: List[tuple] = []  # (-level, seq, trade_id, reason)
+        self.above: List[tuple] = []  # (level, seq, trade_id, reason)
+        self.long_trail = TrailingBook()  # prices
+        self.short_trail = TrailingBook()  # negated prices
+        self.live = 0
+
+    def __len__(self) -> int:
+        return len(self.below) + len(self.above) + len(self.long_trail) + len(self.short_trail)
+
+    def trail_book(self, direction: str) -> TrailingBook:
+        return self.long_trail if direction == "BUY" else self.short_trail
+
+
+def fires_below(direction: str, reason: str) -> bool:
+    """True if the level fires when the price falls to it"""
+    return (direction == "BUY") == (reason == STOP_LOSS)
+
+
+def favourable(direction: str, price: float) -> float:
+    """Price in the space where higher is better for the trade"""
+    return price if direction == "BUY" else -price
+
+
+class TriggerIndex:
+    """Per-symbol exit-leg structures for every open trade"""
+
+    def __init__(self):
+        self._symbols: Dict[str, SymbolTriggers] = {}
+        self._armed: Dict[int, _Armed] = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+        self.fired = 0
+        # Called with each non-empty batch of triggers (set by TriggerMonitor)
+        self.sink: Optional[Callable[[List[Trigger]], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._armed)
+
+    def __contains__(self, trade_id: int) -> bool:
+        return trade_id in self._armed
+
+    def arm(
+        self,
+        trade_id: int,
+        portfolio_id: int,
+        symbol: str,
+        direction: str,
+        stop_loss: Optional[float],
+        take_profit: Optional[float],
+        trail: Optional[float] = None,
+        watermark: Optional[float] = None
+    ):
+        """
+        Watch a trade's exit legs (replaces any it already has)
+
+        trail: trailing distance for TRAILING_STOP trades; watermark: best
+        price seen so far (entry price for a new trade)
+        """
+        with self._lock:
+            self._disarm(trade_id)
+            armed = self._armed[trade_id] = _Armed(portfolio_id, symbol, direction)
+            for reason, level in ((STOP_LOSS, stop_loss), (TAKE_PROFIT, take_profit)):
+                if level:
+                    self._push(armed, trade_id, reason, level)
+            if trail and watermark:
+                book = self._book(symbol)
+                self._seq += 1
+                armed.trail, armed.seqs[TRAILING] = trail, self._seq
+                armed.group = book.trail_book(direction).add(favourable(direction, watermark), trail, self._seq, trade_id)
+                book.live += 1
+
+    def arm_trade(self, trade: Any, watermark: Optional[float] = None):
+        trailing = getattr(trade, "order_type", None) == TRAILING_STOP
+        self.arm(
+            trade.id, trade.portfolio_id, trade.symbol, trade.direction, trade.stop_loss, trade.take_profit,
+            trail=trade.trail_amount if trailing else None,
+            watermark=watermark or getattr(trade, "trail_watermark", None) or trade.entry_price
+        )
+
+    def move(self, trade_id: int, reason: str, level: float) -> bool:
+        """Re-arm one fixed leg of a watched trade at a new price"""
+        with self._lock:
+            armed = self._armed.get(trade_id)
+            if armed is None:
+                return False
+            if reason in armed.levels:
+                self._symbols[armed.symbol].live -= 1
+            self._push(armed, trade_id, reason, level)
+            self._maybe_compact(armed.symbol)
+            return True
+
+    def disarm(self, trade_id: int) -> bool:
+        with self._lock:
+            removed = self._disarm(trade_id)
+            if removed is not None:
+                self._maybe_compact(removed.symbol)
+            return removed is not None
+
+    def levels(self, trade_id: int) -> Dict[str, float]:
+        """Current price of each armed leg (the trailing leg at its ratcheted level)"""
+        with self._lock:
+            armed = self._armed.get(trade_id)
+            if armed is None:
+                return {}
+            levels = dict(armed.levels)
+            watermark = self._watermark(armed)
+            if watermark is not None:
+                levels[TRAILING] = watermark - armed.trail if armed.direction == "BUY" else watermark + armed.trail
+            return levels
+
+    def watermarks(self) -> Dict[int, float]:
+        """Best price since arming for every armed trailing stop (for persistence)"""
+        with self._lock:
+            marks = {}
+            for book in self._symbols.values():
+                for trail_book, sign in ((book.long_trail, 1), (book.short_trail, -1)):
+                    for trade_id, seq, watermark in trail_book.watermarks():
+                        armed = self._armed.get(trade_id)
+                        if armed is not None and armed.seqs.get(TRAILING) == seq:
+                            marks[trade_id] = sign * watermark
+            return marks
+
+    def load(self, trades: Iterable[tuple]):
+        """
+        Replace the index with (trade_id, portfolio_id, symbol, direction,
+        stop_loss, take_profit[, trail, watermark]) rows; heaps are built
+        with heapify, O(n)
+        """
+        with self._lock:
+            self._symbols, self._armed = {}, {}
+            trailing: Dict[Tuple[str, str], List[tuple]] = {}
+            for trade_id, portfolio_id, symbol, direction, stop_loss, take_profit, *trail_fields in trades:
+                armed = self._armed[trade_id] = _Armed(portfolio_id, symbol, direction)
+                book = self._book(symbol)
+                for reason, level in ((STOP_LOSS, stop_loss), (TAKE_PROFIT, take_profit)):
+                    if level:
+                        self._seq += 1
+                        armed.levels[reason], armed.seqs[reason] = level, self._seq
+                        if fires_below(direction, reason):
+                            book.below.append((-level, self._seq, trade_id, reason))
+                        else:
+                            book.above.append((level, self._seq, trade_id, reason))
+                        book.live += 1
+                trail, watermark = (trail_fields + [None, None])[:2]
+                if trail and watermark:
+                    self._seq += 1
+                    armed.trail, armed.seqs[TRAILING] = trail, self._seq
+                    trailing.setdefault((symbol, direction), []).append(
+                        (favourable(direction, watermark), trail, self._seq, trade_id)
+                    )
+                    book.live += 1
+            for book in self._symbols.values():
+                heapq.heapify(book.below)
+                heapq.heapify(book.above)
+            for (symbol, direction), entries in trailing.items():
+                for trade_id, group in self._symbols[symbol].trail_book(direction).load(entries).items():
+                    self._armed[trade_id].group = group
+        logger.info(f"Trigger index loaded {len(self._armed)} open trades across {len(self._symbols)} symbols")
+
+    def on_price(self, symbol: str, price: float) -> List[Trigger]:
+        """Ratchet trailing stops, then disarm and return every trade with a crossed leg"""
+        book = self._symbols.get(symbol)
+        if book is None or not price:
+            return []
+
+        hits: List[Trigger] = []
+        with self._lock:
+            while book.below and -book.below[0][0] >= price:
+                _, seq, trade_id, reason = heapq.heappop(book.below)
+                self._take(trade_id, seq, reason, price, hits)
+            while book.above and book.above[0][0] <= price:
+                _, seq, trade_id, reason = heapq.heappop(book.above)
+                self._take(trade_id, seq, reason, price, hits)
+            for trail_book, sign in ((book.long_trail, 1), (book.short_trail, -1)):
+                if not trail_book.size:
+                    continue
+                trail_book.ratchet(sign * price)
+                for trade_id, seq, level, watermark in trail_book.crossed(sign * price):
+                    self._take(trade_id, seq, TRAILING, price, hits, sign * level, sign * watermark)
+            if hits:
+                self.fired += len(hits)
+                self._maybe_compact(symbol)
+
+        if hits and self.sink is not None:
+            self.sink(hits)
+        return hits
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, book in self._symbols.items() if book.live]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            books = self._symbols.values()
+            return {
+                "armed_trades": len(self._armed),
+                "trailing_stops": sum(1 for armed in self._armed.values() if armed.trail),
+                "symbols": sum(1 for book in books if book.live),
+                "live_levels": sum(book.live for book in books),
+                "heap_entries": sum(len(book) for book in books),
+                "fired": self.fired,
+            }
+
+    def _book(self, symbol: str) -> SymbolTriggers:
+        book = self._symbols.get(symbol)
+        if book is None:
+            book = self._symbols[symbol] = SymbolTriggers()
+        return book
+
+    def _push(self, armed: _Armed, trade_id: int, reason: str, level: float):
+        book = self._book(armed.symbol)
+        self._seq += 1
+        armed.levels[reason], armed.seqs[reason] = level, self._seq
+        if fires_below(armed.direction, reason):
+            heapq.heappush(book.below, (-level, self._seq, trade_id, reason))
+        else:
+            heapq.heappush(book.above, (level, self._seq, trade_id, reason))
+        book.live += 1
+
+    def _take(
+        self,
+        trade_id: int,
+        seq: int,
+        reason: str,
+        price: float,
+        hits: List[Trigger],
+        level: Optional[float] = None,
+        watermark: Optional[float] = None
+    ):
+        armed = self._armed.get(trade_id)
+        if armed is None or armed.seqs.get(reason) != seq:
+            return  # stale: disarmed or moved since it was pushed
+        if watermark is None:
+            watermark = self._watermark(armed)
+        hits.append(Trigger(
+            trade_id, armed.portfolio_id, armed.symbol, reason,
+            armed.levels[reason] if level is None else level, price, watermark,
+            tuple(leg for leg in armed.legs() if leg != reason)
+        ))
+        self._disarm(trade_id)
+
+    @staticmethod
+    def _watermark(armed: _Armed) -> Optional[float]:
+        if armed.group is None:
+            return None
+        watermark = armed.group.root().watermark
+        return watermark if armed.direction == "BUY" else -watermark
+
+    def _disarm(self, trade_id: int) -> Optional[_Armed]:
+        armed = self._armed.pop(trade_id, None)
+        if armed is not None and armed.legs():
+            self._symbols[armed.symbol].live -= len(armed.legs())
+        return armed
+
+    def _maybe_compact(self, symbol: str):
+        """Drop stale entries once they outnumber live ones"""
+        book = self._symbols.get(symbol)
+        if book is None:
+            return
+        if len(book) < COMPACT_MIN_ENTRIES or len(book) <= 2 * book.live:
+            if not book.live and not len(book):
+                del self._symbols[symbol]
+            return
+
+        def current(trade_id: int, seq: int, reason: str) -> bool:
+            armed = self._armed.get(trade_id)
+            return armed is not None and armed.seqs.get(reason) == seq
+
+        book.below = [entry for entry in book.below if current(entry[2], entry[1], entry[3])]
+        book.above = [entry for entry in book.above if current(entry[2], entry[1], entry[3])]
+        heapq.heapify(book.below)
+        heapq.heapify(book.above)
+        for trail_book in (book.long_trail, book.short_trail):
+            trail_book.compact(lambda trade_id, seq: current(trade_id, seq, TRAILING))
+        if not len(book):
+            del self._symbols[symbol]
+
+
+# Create singleton instance
+trigger_index = TriggerIndex()
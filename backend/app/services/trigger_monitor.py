@@ -0,0 +1,205 @@
+"""
+Stop-loss / take-profit / trailing-stop monitor
+
+Closes open trades when one of their exit legs is crossed. The trigger index is
+loaded from open trades at startup and kept current by TradingEngine, which
+arms trades as they open and disarms them as they close. Prices reach it in
+two ways:
+
+- every accepted quote fetched by MarketDataService, on any request path;
+- the shared QuotePoller, which refreshes armed symbols with no accepted quote
+  in the last TRIGGER_POLL_SECONDS. It fetches a capped number of symbols per
+  cycle at low priority, so it never spends the per-minute budget reserved
+  for executions.
+
+Crossed trades go onto a queue drained by TRIGGER_CLOSE_WORKERS tasks. Each
+task holds the portfolio lock and calls TradingEngine.close_trade at the
+crossing price, on its own session in the threadpool. The close reason is
+"stop_loss", "take_profit" or "trailing_stop".
+
+The index cancels a trade's sibling legs at the moment one fires. The close
+records that cancellation in the same commit as the fill. If the close
+fails while the trade is still open, the trade is re-armed, so its legs are
+either all cancelled with the fill or all live again. Trailing-stop
+watermarks are written back to the trades table on shutdown, so a restart
+resumes trailing from the best price seen.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.trade import Trade
+from app.services.portfolio_locks import portfolio_locks
+from app.services.quote_poller import quote_poller
+from app.services.trading_engine import TradingEngine
+from app.services.trigger_index import TRAILING_STOP, Trigger, TriggerIndex, trigger_index
+
+logger = logging.getLogger(__name__)
+
+CLOSE_RETRIES = 3
+
+
+class TriggerMonitor:
+    """Feeds prices to the trigger index and closes the trades it returns"""
+
+    def __init__(
+        self,
+        index: TriggerIndex,
+        session_factory: Callable = SessionLocal,
+        poll_seconds: float = 15.0,
+        close_workers: int = 4
+    ):
+        self.index = index
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.close_workers = close_workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self.closed = 0
+        self.failed = 0
+
+    def rebuild(self):
+        """Load every open trade's exit legs (called at startup)"""
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                Trade.id, Trade.portfolio_id, Trade.symbol, Trade.direction, Trade.stop_loss, Trade.take_profit,
+                Trade.order_type, Trade.trail_amount, Trade.trail_watermark, Trade.entry_price
+            ).filter(Trade.status == "OPEN").all()
+        finally:
+            db.close()
+        self.index.load(
+            (trade_id, portfolio_id, symbol, direction, stop_loss, take_profit,
+             trail if order_type == TRAILING_STOP else None, watermark or entry_price)
+            for trade_id, portfolio_id, symbol, direction, stop_loss, take_profit,
+            order_type, trail, watermark, entry_price in rows
+        )
+
+    def persist_watermarks(self) -> int:
+        """Write every armed trailing stop's watermark back to its trade"""
+        marks = self.index.watermarks()
+        if not marks:
+            return 0
+        db = self.session_factory()
+        try:
+            db.bulk_update_mappings(Trade, [{"id": trade_id, "trail_watermark": mark} for trade_id, mark in marks.items()])
+            db.commit()
+        finally:
+            db.close()
+        return len(marks)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.index.sink = self._enqueue
+        self._tasks = [asyncio.create_task(self._close_loop()) for _ in range(self.close_workers)]
+        if self.poll_seconds > 0:
+            quote_poller.watch("triggers", self.index.symbols, self.poll_seconds)
+        logger.info(f"Trigger monitor started ({len(self.index)} armed trades)")
+
+    async def stop(self):
+        self.index.sink = None
+        await quote_poller.unwatch("triggers")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await run_in_threadpool(self.persist_watermarks)
+        except Exception as e:
+            logger.error(f"Failed to save trailing-stop watermarks: {str(e)}")
+
+    async def drain(self):
+        """Wait until every queued trigger has been closed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def _enqueue(self, hits: List[Trigger]):
+        # Prices can arrive from threadpool workers as well as the loop itself
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        for hit in hits:
+            if on_loop:
+                self._queue.put_nowait(hit)
+            else:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, hit)
+
+    async def _close_loop(self):
+        while True:
+            hit = await self._queue.get()
+            try:
+                await self.close(hit)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to close trade {hit.trade_id} on {hit.reason}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def close(self, hit: Trigger) -> Optional[Trade]:
+        """Close the trade behind a trigger at the crossing price"""
+        async with portfolio_locks.hold(hit.portfolio_id):
+            for attempt in range(1, CLOSE_RETRIES + 1):
+                try:
+                    trade = await run_in_threadpool(self._close_sync, hit)
+                    break
+                except StaleDataError:
+                    if attempt == CLOSE_RETRIES:
+                        await run_in_threadpool(self._rearm, hit)
+                        raise
+        if trade is None:
+            # Already closed by hand, or the close failed (logged by the engine) and the legs were re-armed
+            logger.warning(f"Trigger {hit} did not close a trade")
+        else:
+            self.closed += 1
+            logger.info(f"Trade {hit.trade_id} closed on {hit.reason} at {hit.price} (level {hit.level})")
+        return trade
+
+    def _close_sync(self, hit: Trigger) -> Optional[Trade]:
+        db = self.session_factory()
+        try:
+            closed = TradingEngine(db).close_trade(hit.trade_id, hit.price, hit.reason, trigger=hit)
+            if closed is None:
+                self._rearm(hit, db)
+            return closed
+        finally:
+            db.close()
+
+    def _rearm(self, hit: Trigger, db: Any = None):
+        """Restore every leg of a trade whose close did not commit"""
+        session = db or self.session_factory()
+        try:
+            trade = session.get(Trade, hit.trade_id)
+            if trade is not None and trade.status == "OPEN":
+                self.index.arm_trade(trade, watermark=hit.watermark)
+                logger.warning(f"Re-armed trade {hit.trade_id} after a failed {hit.reason} close")
+        finally:
+            if db is None:
+                session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.index.stats(),
+            "running": bool(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "closed": self.closed,
+            "failed": self.failed,
+        }
+
+
+# Create singleton instance
+trigger_monitor = TriggerMonitor(
+    trigger_index,
+    poll_seconds=settings.TRIGGER_POLL_SECONDS,
+    close_workers=settings.TRIGGER_CLOSE_WORKERS
+)
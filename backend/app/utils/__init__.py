@@ -1,6 +1,6 @@
 """
 Utils package
 """
-from .validators import ValidationGates
+from .validators import ValidationGates, BatchValidationGates
 
-__all__ = ["ValidationGates"]
+__all__ = ["ValidationGates", "BatchValidationGates"]
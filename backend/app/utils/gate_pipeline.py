@@ -0,0 +1,171 @@
+"""
+Cost-ordered gate pipeline with live per-gate statistics
+
+Fast mode stops at the first failing gate; diagnostic mode runs every gate.
+Gates are ordered by expected cost per rejection (average run time divided by
+observed rejection probability), so cheap gates that reject often run first.
+The order is recomputed from live statistics every few hundred runs.
+
+The GateRun returned to the caller carries every result that was computed,
+so nothing upstream ever has to evaluate the gates a second time.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.utils.gate_results import GATE_COUNT, GateResult
+from app.utils.validators import ValidationGates
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+DIAGNOSTIC = "diagnostic"
+
+
+class GateStats:
+    """Running counters for one gate"""
+
+    __slots__ = ("gate", "runs", "rejections", "total_ns")
+
+    def __init__(self, gate: int):
+        self.gate = gate
+        self.runs = 0
+        self.rejections = 0
+        self.total_ns = 0
+
+    @property
+    def avg_ns(self) -> float:
+        return self.total_ns / self.runs if self.runs else 0.0
+
+    @property
+    def rejection_rate(self) -> float:
+        # Laplace smoothing so unseen gates are neither ignored nor favoured
+        return (self.rejections + 1) / (self.runs + 2)
+
+    def priority(self, default_ns: float = 1.0) -> float:
+        """Expected cost per rejection; lower runs earlier (default_ns stands in for unseen gates)"""
+        return (self.avg_ns if self.runs else default_ns) / self.rejection_rate
+
+
+class GateRun:
+    """Outcome of one pipeline run"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.passed = True
+        self.results: Dict[str, GateResult] = {}
+        self.order: List[int] = []
+        self.elapsed_ns = 0
+
+    @property
+    def failed(self) -> List[GateResult]:
+        return [r for r in self.results.values() if not r.passed]
+
+    @property
+    def skipped(self) -> List[int]:
+        return [g for g in range(1, GATE_COUNT + 1) if f"gate_{g}" not in self.results]
+
+    def failure_message(self) -> str:
+        """Reasons are only rendered here, on the rejection path"""
+        return "; ".join(f"Gate {g.gate}: {g.reason}" for g in self.failed)
+
+    def sorted_results(self) -> Dict[str, GateResult]:
+        """Results keyed gate_1..gate_10 in gate order"""
+        return {k: self.results[k] for k in sorted(self.results, key=lambda k: int(k.split("_")[1]))}
+
+
+class GatePipeline:
+    """Runs ValidationGates in adaptive order and publishes per-gate stats"""
+
+    def __init__(self, validators: Optional[ValidationGates] = None, reorder_every: int = 256):
+        self.validators = validators or ValidationGates()
+        self.reorder_every = reorder_every
+        self.stats = {g: GateStats(g) for g in range(1, GATE_COUNT + 1)}
+        self.order = list(range(1, GATE_COUNT + 1))
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        data: Dict[str, Any],
+        mode: str = FAST,
+        now: Optional[datetime] = None,
+        validators: Optional[ValidationGates] = None
+    ) -> GateRun:
+        """
+        Evaluate gates; fast mode short-circuits on the first failure
+        
+        validators overrides the default thresholds with a compiled rule set
+        (see gate_rules); statistics are shared across rule sets.
+        """
+        validators = validators or self.validators
+        gate_run = GateRun(mode)
+        now = now or datetime.utcnow()
+        clock = time.perf_counter_ns
+        start = clock()
+
+        for gate in self.order:
+            t0 = clock()
+            result = validators.run_gate(gate, data, now)
+            elapsed = clock() - t0
+
+            stats = self.stats[gate]
+            stats.runs += 1
+            stats.total_ns += elapsed
+
+            gate_run.results[f"gate_{gate}"] = result
+            gate_run.order.append(gate)
+            if not result.passed:
+                stats.rejections += 1
+                gate_run.passed = False
+                if mode == FAST:
+                    break
+
+        gate_run.elapsed_ns = clock() - start
+        if mode == DIAGNOSTIC:
+            gate_run.results = gate_run.sorted_results()
+
+        self.runs += 1
+        if self.runs % self.reorder_every == 0:
+            self.reorder()
+        return gate_run
+
+    def reorder(self):
+        """Sort gates by expected cost per rejection from the live statistics"""
+        with self._lock:
+            seen = [s.avg_ns for s in self.stats.values() if s.runs]
+            default_ns = sum(seen) / len(seen) if seen else 1.0
+            new_order = sorted(self.stats, key=lambda g: self.stats[g].priority(default_ns))
+            if new_order != self.order:
+                logger.info(f"Gate order updated: {new_order}")
+                self.order = new_order
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-gate timing and rejection counts"""
+        return {
+            "runs": self.runs,
+            "order": list(self.order),
+            "gates": {
+                f"gate_{g}": {
+                    "runs": s.runs,
+                    "rejections": s.rejections,
+                    "rejection_rate": round(s.rejections / s.runs, 4) if s.runs else 0.0,
+                    "avg_us": round(s.avg_ns / 1000, 3),
+                    "total_ms": round(s.total_ns / 1e6, 3)
+                }
+                for g, s in sorted(self.stats.items())
+            }
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {g: GateStats(g) for g in range(1, GATE_COUNT + 1)}
+            self.order = list(range(1, GATE_COUNT + 1))
+            self.runs = 0
+
+
+# Create singleton instance (shared so statistics cover all requests)
+gate_pipeline = GatePipeline()
@@ -0,0 +1,207 @@
+"""
+Compact gate results - reason codes and numeric values instead of strings
+
+Gates return a GateResult holding the gate number, pass flag, a small reason
+code and the measured value/threshold. Human-readable text is rendered only
+when something asks for it (API responses, error messages). Results are
+stored on Trade/Position as a packed form: a pass bitmask, a bitmask of the
+gates that ran, and per-gate code/value/limit lists.
+
+GateResult still supports result["passed"], result["reason"] and
+result["gate"], so code written against the old dict results keeps working.
+"""
+
+from datetime import datetime
+from enum import IntEnum
+from typing import Any, Dict, List, Mapping, Optional
+
+GATE_COUNT = 10
+
+PACK_VERSION = 1
+
+
+class ReasonCode(IntEnum):
+    """Why a gate passed or failed; 0 is reserved for 'gate not run'"""
+
+    QUOTE_MISSING = 10
+    QUOTE_STALE = 11
+    QUOTE_FRESH = 12
+    QUOTE_SUSPECT = 20
+    PRICE_MISSING = 21
+    ENTRY_DEVIATION = 22
+    CLOSE_DEVIATION = 23
+    PRICE_OK = 24
+    LOW_VOLUME = 30
+    LIQUID = 31
+    VIX_HIGH = 40
+    VIX_OK = 41
+    MARKET_CLOSED_UNTIL = 50
+    MARKET_CLOSED = 51
+    MARKET_OPEN = 52
+    LEVELS_MISSING = 60
+    RISK_INVALID = 61
+    RR_LOW = 62
+    RR_OK = 63
+    EXPOSURE_HIGH = 70
+    EXPOSURE_OK = 71
+    FLOW_NONE = 80
+    SELL_PRESSURE = 81
+    BUY_PRESSURE = 82
+    FLOW_OK = 83
+    CONFIDENCE_LOW = 90
+    CONFIDENCE_OK = 91
+    CORRELATED_EXPOSURE_HIGH = 100
+    CORRELATED_EXPOSURE_OK = 101
+
+
+REASON_TEMPLATES = {
+    ReasonCode.QUOTE_MISSING: "No quote timestamp",
+    ReasonCode.QUOTE_STALE: "Quote too old: {value}s",
+    ReasonCode.QUOTE_FRESH: "Quote fresh: {value}s old",
+    ReasonCode.QUOTE_SUSPECT: "Suspect quote: {value}",
+    ReasonCode.PRICE_MISSING: "Missing price data",
+    ReasonCode.ENTRY_DEVIATION: "Entry deviation {value:.2%} too high",
+    ReasonCode.CLOSE_DEVIATION: "Close deviation {value:.2%} too high",
+    ReasonCode.PRICE_OK: "Price deviation within limits",
+    ReasonCode.LOW_VOLUME: "Low volume: {value}",
+    ReasonCode.LIQUID: "Sufficient liquidity: {value}",
+    ReasonCode.VIX_HIGH: "VIX too high: {value}",
+    ReasonCode.VIX_OK: "Volatility acceptable: VIX {value}",
+    ReasonCode.MARKET_CLOSED_UNTIL: "Market closed, next open {value:%Y-%m-%d %H:%M} UTC",
+    ReasonCode.MARKET_CLOSED: "Market closed",
+    ReasonCode.MARKET_OPEN: "Market open",
+    ReasonCode.LEVELS_MISSING: "Missing price levels",
+    ReasonCode.RISK_INVALID: "Invalid risk calculation",
+    ReasonCode.RR_LOW: "R:R {value:.2f} below minimum {limit}",
+    ReasonCode.RR_OK: "R:R ratio {value:.2f} acceptable",
+    ReasonCode.EXPOSURE_HIGH: "Total exposure {value:.1%} exceeds limit",
+    ReasonCode.EXPOSURE_OK: "Exposure within limits: {value:.1%}",
+    ReasonCode.FLOW_NONE: "No order flow data",
+    ReasonCode.SELL_PRESSURE: "Sell pressure dominant: {value:.1%}",
+    ReasonCode.BUY_PRESSURE: "Buy pressure dominant: {value:.1%}",
+    ReasonCode.FLOW_OK: "Order flow pressure acceptable",
+    ReasonCode.CONFIDENCE_LOW: "AI confidence {value:.1%} below threshold",
+    ReasonCode.CONFIDENCE_OK: "AI confidence: {value:.1%}",
+    ReasonCode.CORRELATED_EXPOSURE_HIGH: "Correlated exposure {value:.1%} exceeds limit {limit:.0%}",
+    ReasonCode.CORRELATED_EXPOSURE_OK: "Correlated exposure within limits: {value:.1%}",
+}
+
+# Codes whose value is a datetime (packed as epoch seconds)
+_DATETIME_CODES = {ReasonCode.MARKET_CLOSED_UNTIL}
+
+
+def render_reason(code: int, value: Any = None, limit: Any = None) -> str:
+    template = REASON_TEMPLATES.get(code)
+    if template is None:
+        return f"Reason code {code}"
+    return template.format(value=value, limit=limit)
+
+
+class GateResult:
+    """Outcome of one gate; the reason string is rendered lazily"""
+
+    __slots__ = ("gate", "passed", "code", "value", "limit")
+
+    def __init__(self, gate: int, passed: bool, code: int, value: Any = None, limit: Any = None):
+        self.gate = gate
+        self.passed = passed
+        self.code = code
+        self.value = value
+        self.limit = limit
+
+    @property
+    def reason(self) -> str:
+        return render_reason(self.code, self.value, self.limit)
+
+    # Mapping-style access for callers written against the old dict results
+    def __getitem__(self, key: str) -> Any:
+        if key not in ("gate", "passed", "reason", "code", "value", "limit"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, GateResult):
+            return NotImplemented
+        return (self.gate, self.passed, self.code, self.value, self.limit) == \
+            (other.gate, other.passed, other.code, other.value, other.limit)
+
+    def __repr__(self) -> str:
+        return f"GateResult(gate={self.gate}, passed={self.passed}, code={ReasonCode(self.code).name})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Human-readable form for API responses"""
+        return {"passed": self.passed, "reason": self.reason, "gate": self.gate}
+
+
+def _pack_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return int((value - datetime(1970, 1, 1)).total_seconds())
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def _unpack_value(code: int, value: Any) -> Any:
+    if code in _DATETIME_CODES and value is not None:
+        return datetime.utcfromtimestamp(value)
+    return value
+
+
+def pack_gate_results(results: Mapping[str, GateResult]) -> Dict[str, Any]:
+    """Compact, JSON-serializable form for storage on Trade/Position"""
+    mask = ran = 0
+    codes: List[int] = [0] * GATE_COUNT
+    values: List[Any] = [None] * GATE_COUNT
+    limits: List[Any] = [None] * GATE_COUNT
+    for result in results.values():
+        i = result.gate - 1
+        ran |= 1 << i
+        if result.passed:
+            mask |= 1 << i
+        codes[i] = int(result.code)
+        values[i] = _pack_value(result.value)
+        limits[i] = result.limit
+    return {"v": PACK_VERSION, "mask": mask, "ran": ran, "codes": codes, "values": values, "limits": limits}
+
+
+def is_packed(stored: Any) -> bool:
+    return isinstance(stored, dict) and "mask" in stored and "codes" in stored
+
+
+def unpack_gate_results(packed: Mapping[str, Any]) -> Dict[str, GateResult]:
+    results = {}
+    for i in range(len(packed["codes"])):  # rows packed before gate 10 have nine entries
+        if not packed["ran"] >> i & 1:
+            continue
+        code = packed["codes"][i]
+        results[f"gate_{i + 1}"] = GateResult(
+            i + 1,
+            bool(packed["mask"] >> i & 1),
+            code,
+            _unpack_value(code, packed["values"][i]),
+            packed["limits"][i]
+        )
+    return results
+
+
+def render_gate_results(stored: Optional[Mapping[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Human-readable gate results for API responses
+
+    Accepts GateResult dicts, packed results, or the verbose dicts stored by
+    older rows (returned unchanged).
+    """
+    if not stored:
+        return {}
+    if is_packed(stored):
+        stored = unpack_gate_results(stored)
+    return {
+        key: result.to_dict() if isinstance(result, GateResult) else result
+        for key, result in stored.items()
+    }
@@ -0,0 +1,130 @@
+"""
+Configurable gate rule sets
+
+A rule set is a small JSON object of threshold overrides, stored per
+portfolio in Portfolio.gate_rules, e.g. {"min_volume": 500000, "max_vix": 30}.
+It is validated and compiled once into a ValidationGates instance whose
+thresholds are plain attributes, so the per-signal and batch gates read them
+exactly as they read the built-in defaults. Compiled rule sets are cached per
+portfolio; changing a portfolio's rules just swaps the cached object.
+
+A stored rule set that no longer compiles fails closed: the cache raises
+InvalidGateRules and the portfolio's orders are rejected until its rules are
+fixed, rather than quietly trading on the (possibly looser) defaults.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from app.utils.validators import ValidationGates
+
+logger = logging.getLogger(__name__)
+
+# Rule name -> (ValidationGates attribute, minimum, maximum)
+RULES: Dict[str, Tuple[str, float, float]] = {
+    "max_quote_age_seconds": ("MAX_QUOTE_AGE_SECONDS", 1, 3600),
+    "max_entry_deviation": ("MAX_PRICE_DEVIATION_FROM_ENTRY", 0, 1),
+    "max_close_deviation": ("MAX_PRICE_DEVIATION_FROM_CLOSE", 0, 10),
+    "min_volume": ("MIN_VOLUME", 0, 1e12),
+    "max_vix": ("MAX_VIX", 0, 200),
+    "min_rr_day": ("MIN_RR_DAY", 0, 100),
+    "min_rr_swing": ("MIN_RR_SWING", 0, 100),
+    "max_exposure": ("MAX_EXPOSURE", 0, 1),
+    "min_buy_ratio": ("MIN_BUY_RATIO", 0, 1),
+    "max_buy_ratio": ("MAX_BUY_RATIO", 0, 1),
+    "min_confidence": ("MIN_CONFIDENCE", 0, 1),
+    "max_correlated_exposure": ("MAX_CORRELATED_EXPOSURE", 0, 10),
+}
+
+
+class InvalidGateRules(ValueError):
+    """A portfolio's stored rule set does not compile"""
+
+    def __init__(self, portfolio_id: int, reason: str):
+        super().__init__(f"Gate rules for portfolio {portfolio_id} are invalid: {reason}")
+        self.portfolio_id = portfolio_id
+        self.reason = reason
+
+
+def default_rules() -> Dict[str, float]:
+    """The built-in thresholds in rule-set form"""
+    return {name: getattr(ValidationGates, attr) for name, (attr, _, _) in RULES.items()}
+
+
+def compile_rule_set(rules: Optional[Mapping[str, Any]]) -> ValidationGates:
+    """
+    Validate a rule set and bind it to a ValidationGates instance
+
+    Raises ValueError for unknown rules or out-of-range values. Rules that
+    are not given keep the built-in defaults.
+    """
+    validators = ValidationGates()
+    for name, value in (rules or {}).items():
+        if name not in RULES:
+            raise ValueError(f"Unknown gate rule: {name}")
+        attr, low, high = RULES[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Gate rule {name} must be a number")
+        if not low <= value <= high:
+            raise ValueError(f"Gate rule {name} must be between {low} and {high}")
+        setattr(validators, attr, value)
+
+    if validators.MIN_BUY_RATIO > validators.MAX_BUY_RATIO:
+        raise ValueError("min_buy_ratio cannot exceed max_buy_ratio")
+
+    validators.rules = dict(rules or {})
+    return validators
+
+
+class GateRuleCache:
+    """LRU of compiled rule sets keyed by portfolio id"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.default = compile_rule_set(None)
+        self._compiled: "OrderedDict[int, ValidationGates]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.compiles = 0
+
+    def get(self, portfolio_id: Optional[int], rules: Optional[Mapping[str, Any]]) -> ValidationGates:
+        """
+        Compiled validators for a portfolio; recompiles only when its rules changed
+
+        Raises InvalidGateRules when the stored rules do not compile.
+        """
+        if not rules or portfolio_id is None:
+            return self.default
+
+        with self._lock:
+            compiled = self._compiled.get(portfolio_id)
+            if compiled is not None and compiled.rules == rules:
+                self._compiled.move_to_end(portfolio_id)
+                return compiled
+
+        try:
+            compiled = compile_rule_set(rules)
+        except ValueError as e:
+            # Stored rules are validated on write, so this is a corrupted override: fail closed
+            logger.warning(f"Invalid gate rules for portfolio {portfolio_id}, rejecting its orders: {str(e)}")
+            raise InvalidGateRules(portfolio_id, str(e))
+
+        with self._lock:
+            self.compiles += 1
+            self._compiled[portfolio_id] = compiled
+            self._compiled.move_to_end(portfolio_id)
+            while len(self._compiled) > self.max_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def invalidate(self, portfolio_id: Optional[int] = None):
+        with self._lock:
+            if portfolio_id is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(portfolio_id, None)
+
+
+# Create singleton instance
+gate_rule_cache = GateRuleCache()
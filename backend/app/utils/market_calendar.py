@@ -0,0 +1,253 @@
+"""
+Precomputed exchange session calendar (NYSE/NASDAQ regular hours)
+
+Sessions for a range of years are generated once at import time and stored as
+two sorted epoch-second arrays (opens, closes). "Is the market open at t?",
+"next open" and "sessions between a and b" are then bisect lookups instead of
+date arithmetic on every request.
+
+Covers regular hours (9:30-16:00 ET), early closes (13:00 ET) and exchange
+holidays including observed-date rules.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple, Union
+import calendar
+import logging
+
+import numpy as np
+import pytz
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_TZ = pytz.timezone("America/New_York")
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+CALENDAR_START_YEAR = 2020
+CALENDAR_END_YEAR = 2035
+
+# One-off closures not covered by the recurring rules
+SPECIAL_CLOSURES = {
+    date(2025, 1, 9),  # National Day of Mourning (President Carter)
+}
+
+Timestamp = Union[datetime, float, int]
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th occurrence (1-based) of weekday in month"""
+    first = date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    wd = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * wd) // 451
+    month, day = divmod(h + wd - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day: date) -> date:
+    """Saturday holidays move to Friday, Sunday holidays to Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def exchange_holidays(year: int) -> set:
+    """Full-day exchange holidays for a year"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),                  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),                  # Washington's Birthday
+        _easter(year) - timedelta(days=2),            # Good Friday
+        _last_weekday(year, 5, 0),                    # Memorial Day
+        _observed(date(year, 7, 4)),                  # Independence Day
+        _nth_weekday(year, 9, 0, 1),                  # Labor Day
+        _nth_weekday(year, 11, 3, 4),                 # Thanksgiving
+        _observed(date(year, 12, 25)),                # Christmas
+    }
+    # New Year's Day: a Saturday holiday is not moved back into the prior year
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))    # Juneteenth
+    holidays.update(d for d in SPECIAL_CLOSURES if d.year == year)
+    return holidays
+
+
+def early_closes(year: int, holidays: set) -> set:
+    """13:00 ET early-close days for a year"""
+    candidates = {
+        date(year, 7, 3),                                        # Day before Independence Day
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),        # Day after Thanksgiving
+        date(year, 12, 24),                                      # Christmas Eve
+    }
+    return {d for d in candidates if d.weekday() < 5 and d not in holidays}
+
+
+class ExchangeCalendar:
+    """Regular-hours session calendar backed by sorted open/close epoch arrays"""
+
+    always_open = False
+
+    def __init__(self, start_year: int = CALENDAR_START_YEAR, end_year: int = CALENDAR_END_YEAR):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.opens = array("q")
+        self.closes = array("q")
+        self.early_close_days = set()
+
+        for year in range(start_year, end_year + 1):
+            holidays = exchange_holidays(year)
+            early = early_closes(year, holidays)
+            self.early_close_days.update(early)
+            day = date(year, 1, 1)
+            while day.year == year:
+                if day.weekday() < 5 and day not in holidays:
+                    close_time = EARLY_CLOSE if day in early else REGULAR_CLOSE
+                    self.opens.append(self._epoch(day, REGULAR_OPEN))
+                    self.closes.append(self._epoch(day, close_time))
+                day += timedelta(days=1)
+
+        # Zero-copy NumPy views for vectorized lookups
+        self.opens_np = np.frombuffer(self.opens, dtype=np.int64)
+        self.closes_np = np.frombuffer(self.closes, dtype=np.int64)
+        logger.info(f"Exchange calendar built: {len(self.opens)} sessions {start_year}-{end_year}")
+
+    @staticmethod
+    def _epoch(day: date, at: time) -> int:
+        return int(EXCHANGE_TZ.localize(datetime.combine(day, at)).timestamp())
+
+    @staticmethod
+    def to_epoch(ts: Optional[Timestamp] = None) -> float:
+        """Convert a naive-UTC/aware datetime or epoch number to epoch seconds"""
+        if ts is None:
+            ts = datetime.utcnow()
+        if isinstance(ts, datetime):
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=pytz.utc)
+            return ts.timestamp()
+        return float(ts)
+
+    @staticmethod
+    def to_datetime(epoch: float) -> datetime:
+        """Epoch seconds to naive UTC datetime (the convention used across the app)"""
+        return datetime.utcfromtimestamp(epoch)
+
+    def _check_range(self, t: float):
+        if not self.opens or t < self.opens[0] - 7 * 86400 or t > self.closes[-1]:
+            logger.warning(f"Timestamp {t} outside precomputed calendar {self.start_year}-{self.end_year}")
+
+    def is_open(self, ts: Optional[Timestamp] = None) -> bool:
+        """Whether the exchange is in a regular session at ts (defaults to now)"""
+        t = self.to_epoch(ts)
+        i = bisect_right(self.opens, t) - 1
+        return i >= 0 and t < self.closes[i]
+
+    def is_open_many(self, epochs: np.ndarray) -> np.ndarray:
+        """Vectorized is_open over an array of epoch seconds"""
+        epochs = np.asarray(epochs, dtype=np.float64)
+        idx = np.searchsorted(self.opens_np, epochs, side="right") - 1
+        valid = idx >= 0
+        result = np.zeros(epochs.shape, dtype=bool)
+        result[valid] = epochs[valid] < self.closes_np[idx[valid]]
+        return result
+
+    def session_at(self, ts: Optional[Timestamp] = None) -> Optional[Tuple[datetime, datetime]]:
+        """(open, close) of the session containing ts, or None when closed"""
+        t = self.to_epoch(ts)
+        i = bisect_right(self.opens, t) - 1
+        if i >= 0 and t < self.closes[i]:
+            return self.to_datetime(self.opens[i]), self.to_datetime(self.closes[i])
+        return None
+
+    def next_open(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        """First session open strictly after ts"""
+        t = self.to_epoch(ts)
+        self._check_range(t)
+        i = bisect_right(self.opens, t)
+        return self.to_datetime(self.opens[i]) if i < len(self.opens) else None
+
+    def next_close(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        """First session close strictly after ts"""
+        t = self.to_epoch(ts)
+        i = bisect_right(self.closes, t)
+        return self.to_datetime(self.closes[i]) if i < len(self.closes) else None
+
+    def previous_close(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        """Last session close at or before ts"""
+        t = self.to_epoch(ts)
+        i = bisect_right(self.closes, t) - 1
+        return self.to_datetime(self.closes[i]) if i >= 0 else None
+
+    def sessions_between(self, start: Timestamp, end: Timestamp) -> List[Tuple[datetime, datetime]]:
+        """Sessions overlapping [start, end), e.g. for filling candle gaps"""
+        lo = bisect_right(self.closes, self.to_epoch(start))
+        hi = bisect_left(self.opens, self.to_epoch(end))
+        return [
+            (self.to_datetime(self.opens[i]), self.to_datetime(self.closes[i]))
+            for i in range(lo, hi)
+        ]
+
+    def is_early_close(self, day: date) -> bool:
+        return day in self.early_close_days
+
+
+# Create singleton instance
+market_calendar = ExchangeCalendar()
+
+
+class ContinuousCalendar:
+    """24/7 session model (crypto) with the same interface as ExchangeCalendar"""
+
+    always_open = True
+
+    to_epoch = staticmethod(ExchangeCalendar.to_epoch)
+    to_datetime = staticmethod(ExchangeCalendar.to_datetime)
+
+    def is_open(self, ts: Optional[Timestamp] = None) -> bool:
+        return True
+
+    def is_open_many(self, epochs: np.ndarray) -> np.ndarray:
+        return np.ones(np.shape(epochs), dtype=bool)
+
+    def session_at(self, ts: Optional[Timestamp] = None) -> Optional[Tuple[datetime, datetime]]:
+        """The UTC day containing ts (there is no real session boundary)"""
+        day_start = self.to_datetime(self.to_epoch(ts)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return day_start, day_start + timedelta(days=1)
+
+    def next_open(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        return self.to_datetime(self.to_epoch(ts))
+
+    def next_close(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        return None
+
+    def previous_close(self, ts: Optional[Timestamp] = None) -> Optional[datetime]:
+        return None
+
+    def sessions_between(self, start: Timestamp, end: Timestamp) -> List[Tuple[datetime, datetime]]:
+        return [(self.to_datetime(self.to_epoch(start)), self.to_datetime(self.to_epoch(end)))]
+
+
+crypto_calendar = ContinuousCalendar()
@@ -0,0 +1,103 @@
+"""
+Signed quote snapshots
+
+/api/market/quote returns a quote_token: the quote's symbol, prices, volume,
+timestamp and source, signed with HMAC-SHA256 under a key derived from
+SECRET_KEY. The execute endpoints accept the token back and use the signed
+quote instead of fetching the same quote upstream again. This only applies
+while the quote is within gate 1's freshness window.
+
+Format: base64url(compact JSON payload) "." base64url(signature)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+TOKEN_VERSION = 1
+
+# Quote field -> payload key
+_FIELDS = {
+    "symbol": "s",
+    "current_price": "p",
+    "high": "h",
+    "low": "l",
+    "prev_close": "c",
+    "volume": "v",
+    "source": "src",
+    "suspect": "x",
+    "suspect_reason": "xr",
+}
+
+
+class InvalidQuoteToken(ValueError):
+    """Token is malformed, tampered with, or for a different symbol"""
+
+
+def _derive_key(secret: str) -> bytes:
+    # Separate key so a quote token can never double as any other signed value
+    return hashlib.sha256(b"tectonic-quote-token:" + secret.encode()).digest()
+
+
+_KEY = _derive_key(settings.SECRET_KEY)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _epoch(timestamp: Any) -> float:
+    if isinstance(timestamp, datetime):
+        return (timestamp - datetime(1970, 1, 1)).total_seconds()
+    return float(timestamp) if timestamp else time.time()
+
+
+def sign_quote(quote: Dict[str, Any], key: Optional[bytes] = None) -> str:
+    """Snapshot token for a standardized quote"""
+    payload = {short: quote.get(name) for name, short in _FIELDS.items() if quote.get(name) is not None}
+    payload["t"] = round(_epoch(quote.get("timestamp")), 3)
+    payload["ver"] = TOKEN_VERSION
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signature = hmac.new(key or _KEY, body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64encode(signature)}"
+
+
+def verify_quote_token(token: str, symbol: Optional[str] = None, key: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Check the signature and return the quote it carries
+
+    The returned quote has the same keys as market_data_service quotes, plus
+    age_seconds. Freshness is left to the caller (gate 1 decides).
+    """
+    try:
+        body, signature = token.split(".")
+        expected = hmac.new(key or _KEY, body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise InvalidQuoteToken("Quote token signature mismatch")
+        payload = json.loads(_b64decode(body))
+    except InvalidQuoteToken:
+        raise
+    except Exception:
+        raise InvalidQuoteToken("Malformed quote token")
+
+    if payload.get("ver") != TOKEN_VERSION:
+        raise InvalidQuoteToken("Unsupported quote token version")
+
+    quote = {name: payload.get(short) for name, short in _FIELDS.items()}
+    quote["suspect"] = bool(quote["suspect"])
+    if symbol and quote["symbol"] != symbol.upper():
+        raise InvalidQuoteToken(f"Quote token is for {quote['symbol']}, not {symbol.upper()}")
+
+    quote["timestamp"] = datetime.utcfromtimestamp(payload["t"])
+    quote["age_seconds"] = time.time() - payload["t"]
+    return quote
@@ -0,0 +1,183 @@
+"""
+Content negotiation for bulk endpoints (JSON, MessagePack, Arrow IPC)
+
+Bulk endpoints build their rows as plain columns and let the client pick the
+wire format through the ``Accept`` header or a ``?format=`` query parameter:
+
+- ``application/json`` (default): list of records, unchanged for the frontend
+- ``application/msgpack``: columnar map ``{column: [values, ...]}``
+- ``application/vnd.apache.arrow.stream``: Arrow IPC stream (one record batch)
+
+MessagePack and Arrow are optional at import time so the API still starts
+when they are not installed; requesting them then yields 406.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import logging
+
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+MSGPACK = "msgpack"
+ARROW = "arrow"
+
+MEDIA_TYPES = {
+    JSON: "application/json",
+    MSGPACK: "application/msgpack",
+    ARROW: "application/vnd.apache.arrow.stream",
+}
+
+# Accept header values (and ?format= aliases) mapped to a format name
+_FORMAT_ALIASES = {
+    "application/json": JSON,
+    "json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "msgpack": MSGPACK,
+    "application/vnd.apache.arrow.stream": ARROW,
+    "application/vnd.apache.arrow.file": ARROW,
+    "arrow": ARROW,
+}
+
+
+def negotiate_format(request: Request) -> str:
+    """
+    Pick the response format from ?format= or the Accept header (JSON by default)
+
+    Formats listed with q=0 are never chosen; 406 when that leaves nothing,
+    JSON included.
+    """
+    requested = request.query_params.get("format")
+    if requested:
+        fmt = _FORMAT_ALIASES.get(requested.strip().lower())
+        if not fmt:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail=f"Unsupported format '{requested}'. Use one of: json, msgpack, arrow"
+            )
+        return fmt
+
+    accept = request.headers.get("accept", "")
+    # q=0 means "not acceptable" (RFC 9110 12.4.2)
+    best_fmt, best_q, refused = JSON, 0.0, set()
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        fmt = _FORMAT_ALIASES.get(media.strip().lower())
+        if not fmt:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            refused.add(fmt)
+        elif q > best_q:
+            best_fmt, best_q = fmt, q
+    if not best_q and JSON in refused:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="No acceptable format. Accept one of: application/json, application/msgpack, "
+                   "application/vnd.apache.arrow.stream"
+        )
+    return best_fmt
+
+
+def rows_to_columns(rows: Iterable[Any], columns: Sequence[str]) -> Dict[str, List[Any]]:
+    """Transpose objects (ORM rows or dicts) into a column map"""
+    rows = list(rows)
+    if rows and isinstance(rows[0], dict):
+        return {name: [row.get(name) for row in rows] for name in columns}
+    return {name: [getattr(row, name) for row in rows] for name in columns}
+
+
+def encode_msgpack(columns: Dict[str, List[Any]]) -> bytes:
+    """Encode a column map as MessagePack (datetimes become msgpack Timestamps)"""
+    if msgpack is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="MessagePack responses are not available (msgpack is not installed)"
+        )
+    return msgpack.packb(columns, default=_msgpack_default, use_bin_type=True)
+
+
+def encode_arrow(columns: Dict[str, List[Any]]) -> bytes:
+    """Encode a column map as an Arrow IPC stream"""
+    if pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow responses are not available (pyarrow is not installed)"
+        )
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def tabular_response(
+    request: Request,
+    rows: Iterable[Any],
+    columns: Sequence[str],
+    json_rows: Optional[Callable[[List[Any]], Any]] = None
+) -> Response:
+    """
+    Serialize rows in the negotiated format
+
+    ``json_rows`` builds the JSON body from the raw rows, so endpoints can keep
+    their existing Pydantic response shape; binary formats skip Pydantic and
+    go straight from columns to bytes.
+    """
+    fmt = negotiate_format(request)
+    rows = list(rows)
+
+    if fmt == JSON:
+        body = json_rows(rows) if json_rows else rows_to_columns_records(rows, columns)
+        return JSONResponse(content=jsonable_encoder(body))
+
+    column_map = rows_to_columns(rows, columns)
+    if fmt == MSGPACK:
+        payload = encode_msgpack(column_map)
+    else:
+        payload = encode_arrow(column_map)
+
+    return Response(
+        content=payload,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"X-Row-Count": str(len(rows))}
+    )
+
+
+def rows_to_columns_records(rows: List[Any], columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """Build plain JSON records when an endpoint has no Pydantic model"""
+    if rows and isinstance(rows[0], dict):
+        return [{name: row.get(name) for name in columns} for row in rows]
+    return [{name: getattr(row, name) for name in columns} for row in rows]
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        # Naive datetimes in this codebase are UTC
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to MessagePack")
@@ -1,172 +1,379 @@
 """
-9-Gate validation system for trades
+10-Gate validation system for trades
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import logging
+import numpy as np
+from app.utils.market_calendar import market_calendar
+from app.utils.gate_results import GATE_COUNT, GateResult, ReasonCode as R
 
 logger = logging.getLogger(__name__)
 
+GATE_METHODS = {
+    1: "gate_1_quote_freshness",
+    2: "gate_2_price_deviation",
+    3: "gate_3_liquidity_check",
+    4: "gate_4_volatility_regime",
+    5: "gate_5_market_hours",
+    6: "gate_6_risk_reward_ratio",
+    7: "gate_7_portfolio_exposure",
+    8: "gate_8_order_flow_pressure",
+    9: "gate_9_ai_confidence",
+    10: "gate_10_correlated_exposure",
+}
+
+def _get(data: Dict[str, Any], key: str, default: Any) -> Any:
+    """dict.get that also treats an explicit None as missing"""
+    value = data.get(key)
+    return default if value is None else value
+
 class ValidationGates:
-    """Nine-gate validation system for trading signals"""
+    """Ten-gate validation system for trading signals"""
     
     # Configuration
     MAX_QUOTE_AGE_SECONDS = 60  # Allow up to 1 minute old quotes
     MAX_PRICE_DEVIATION_FROM_ENTRY = 0.03  # 3%
     MAX_PRICE_DEVIATION_FROM_CLOSE = 0.30  # 30%
+    MIN_VOLUME = 100000  # Minimum daily volume
+    MAX_VIX = 40
+    MIN_RR_DAY = 1.5
+    MIN_RR_SWING = 2.0
+    MAX_EXPOSURE = 0.5  # 50% max in single position
+    MIN_BUY_RATIO = 0.45  # BUY needs at least this share of flow
+    MAX_BUY_RATIO = 0.55  # SELL needs at most this share of flow
     MIN_CONFIDENCE = 0.3
+    MAX_CORRELATED_EXPOSURE = 0.6  # Position plus correlated holdings
     
     def __init__(self):
         self.gates_status = {}
+        self.rules: Dict[str, Any] = {}  # rule-set overrides (see gate_rules)
     
-    def validate_all_gates(self, data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
-        """Run all 9 validation gates"""
+    def validate_all_gates(self, data: Dict[str, Any], now: Optional[datetime] = None) -> Tuple[bool, Dict[str, GateResult]]:
+        """Run all 10 validation gates"""
         
         gates_results = {
-            "gate_1": self.gate_1_quote_freshness(data),
+            "gate_1": self.gate_1_quote_freshness(data, now),
             "gate_2": self.gate_2_price_deviation(data),
             "gate_3": self.gate_3_liquidity_check(data),
             "gate_4": self.gate_4_volatility_regime(data),
-            "gate_5": self.gate_5_market_hours(data),
+            "gate_5": self.gate_5_market_hours(data, now),
             "gate_6": self.gate_6_risk_reward_ratio(data),
             "gate_7": self.gate_7_portfolio_exposure(data),
             "gate_8": self.gate_8_order_flow_pressure(data),
             "gate_9": self.gate_9_ai_confidence(data),
+            "gate_10": self.gate_10_correlated_exposure(data),
         }
         
         # Check if all gates passed
-        all_passed = all(gate["passed"] for gate in gates_results.values())
+        all_passed = all(gate.passed for gate in gates_results.values())
         
         return all_passed, gates_results
     
-    def gate_1_quote_freshness(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Gate 1: Check if quote is fresh (not older than 30 seconds)"""
+    def run_gate(self, gate: int, data: Dict[str, Any], now: Optional[datetime] = None) -> GateResult:
+        """Run a single gate by number"""
+        method = getattr(self, GATE_METHODS[gate])
+        return method(data, now) if gate in (1, 5) else method(data)
+    
+    def gate_1_quote_freshness(self, data: Dict[str, Any], now: Optional[datetime] = None) -> GateResult:
+        """Gate 1: Check if quote is fresh (not older than MAX_QUOTE_AGE_SECONDS)"""
         quote_timestamp = data.get("quote_timestamp")
-        now = datetime.utcnow()
+        now = now or datetime.utcnow()
         
         if not quote_timestamp:
-            return {"passed": False, "reason": "No quote timestamp", "gate": 1}
+            return GateResult(1, False, R.QUOTE_MISSING)
         
         age = (now - quote_timestamp).total_seconds()
         
         if age > self.MAX_QUOTE_AGE_SECONDS:
-            return {"passed": False, "reason": f"Quote too old: {age}s", "gate": 1}
+            return GateResult(1, False, R.QUOTE_STALE, age, self.MAX_QUOTE_AGE_SECONDS)
         
-        return {"passed": True, "reason": f"Quote fresh: {age}s old", "gate": 1}
+        return GateResult(1, True, R.QUOTE_FRESH, age, self.MAX_QUOTE_AGE_SECONDS)
     
-    def gate_2_price_deviation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_2_price_deviation(self, data: Dict[str, Any]) -> GateResult:
         """Gate 2: Check price deviation from proposed entry and previous close"""
-        current_price = data.get("current_price", 0)
-        entry_price = data.get("entry_price", 0)
-        prev_close = data.get("prev_close", 0)
+        current_price = _get(data, "current_price", 0)
+        entry_price = _get(data, "entry_price", 0)
+        prev_close = _get(data, "prev_close", 0)
+        
+        # Never approve a trade on a tick the quote sanity filter flagged
+        if data.get("quote_suspect"):
+            return GateResult(2, False, R.QUOTE_SUSPECT, data.get("quote_suspect_reason") or "failed sanity check")
         
         if not all([current_price, entry_price, prev_close]):
-            return {"passed": False, "reason": "Missing price data", "gate": 2}
+            return GateResult(2, False, R.PRICE_MISSING)
         
         # Check deviation from entry price
         entry_deviation = abs(current_price - entry_price) / entry_price
         if entry_deviation > self.MAX_PRICE_DEVIATION_FROM_ENTRY:
-            return {"passed": False, "reason": f"Entry deviation {entry_deviation:.2%} too high", "gate": 2}
+            return GateResult(2, False, R.ENTRY_DEVIATION, entry_deviation, self.MAX_PRICE_DEVIATION_FROM_ENTRY)
         
         # Check deviation from previous close
         close_deviation = abs(current_price - prev_close) / prev_close
         if close_deviation > self.MAX_PRICE_DEVIATION_FROM_CLOSE:
-            return {"passed": False, "reason": f"Close deviation {close_deviation:.2%} too high", "gate": 2}
+            return GateResult(2, False, R.CLOSE_DEVIATION, close_deviation, self.MAX_PRICE_DEVIATION_FROM_CLOSE)
         
-        return {"passed": True, "reason": "Price deviation within limits", "gate": 2}
+        return GateResult(2, True, R.PRICE_OK, entry_deviation, self.MAX_PRICE_DEVIATION_FROM_ENTRY)
     
-    def gate_3_liquidity_check(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_3_liquidity_check(self, data: Dict[str, Any]) -> GateResult:
         """Gate 3: Check if symbol has sufficient liquidity"""
-        volume = data.get("volume", 0)
-        min_volume = 100000  # Minimum daily volume
+        volume = _get(data, "volume", 0)
         
-        if volume < min_volume:
-            return {"passed": False, "reason": f"Low volume: {volume}", "gate": 3}
+        if volume < self.MIN_VOLUME:
+            return GateResult(3, False, R.LOW_VOLUME, volume, self.MIN_VOLUME)
         
-        return {"passed": True, "reason": f"Sufficient liquidity: {volume}", "gate": 3}
+        return GateResult(3, True, R.LIQUID, volume, self.MIN_VOLUME)
     
-    def gate_4_volatility_regime(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_4_volatility_regime(self, data: Dict[str, Any]) -> GateResult:
         """Gate 4: Check volatility regime"""
-        volatility = data.get("volatility", 0)
-        vix = data.get("vix", 20)
+        vix = _get(data, "vix", 20)
         
         # Very high volatility/VIX signals uncertain regime
-        if vix > 40:
-            return {"passed": False, "reason": f"VIX too high: {vix}", "gate": 4}
+        if vix > self.MAX_VIX:
+            return GateResult(4, False, R.VIX_HIGH, vix, self.MAX_VIX)
         
-        return {"passed": True, "reason": f"Volatility acceptable: VIX {vix}", "gate": 4}
+        return GateResult(4, True, R.VIX_OK, vix, self.MAX_VIX)
     
-    def gate_5_market_hours(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Gate 5: Check if market is open"""
-        market_open = data.get("market_open", True)
+    def gate_5_market_hours(self, data: Dict[str, Any], now: Optional[datetime] = None) -> GateResult:
+        """Gate 5: Check if market is open (exchange calendar unless market_open is given)"""
+        market_open = data.get("market_open")
+        
+        if market_open is None:
+            market_open = market_calendar.is_open(now)
         
         if not market_open:
-            return {"passed": False, "reason": "Market closed", "gate": 5}
+            next_open = market_calendar.next_open(now)
+            if next_open:
+                return GateResult(5, False, R.MARKET_CLOSED_UNTIL, next_open)
+            return GateResult(5, False, R.MARKET_CLOSED)
         
-        return {"passed": True, "reason": "Market open", "gate": 5}
+        return GateResult(5, True, R.MARKET_OPEN)
     
-    def gate_6_risk_reward_ratio(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_6_risk_reward_ratio(self, data: Dict[str, Any]) -> GateResult:
         """Gate 6: Check risk-reward ratio"""
-        entry = data.get("entry_price", 0)
-        stop = data.get("stop_loss", 0)
-        target = data.get("take_profit", 0)
+        entry = _get(data, "entry_price", 0)
+        stop = _get(data, "stop_loss", 0)
+        target = _get(data, "take_profit", 0)
         
         if not all([entry, stop, target]):
-            return {"passed": False, "reason": "Missing price levels", "gate": 6}
+            return GateResult(6, False, R.LEVELS_MISSING)
         
         risk = abs(entry - stop)
         reward = abs(target - entry)
         
         if risk == 0:
-            return {"passed": False, "reason": "Invalid risk calculation", "gate": 6}
+            return GateResult(6, False, R.RISK_INVALID)
         
         ratio = reward / risk
-        min_ratio = 1.5 if data.get("timeframe") == "day" else 2.0
+        min_ratio = self.MIN_RR_DAY if data.get("timeframe") == "day" else self.MIN_RR_SWING
         
         if ratio < min_ratio:
-            return {"passed": False, "reason": f"R:R {ratio:.2f} below minimum {min_ratio}", "gate": 6}
+            return GateResult(6, False, R.RR_LOW, ratio, min_ratio)
         
-        return {"passed": True, "reason": f"R:R ratio {ratio:.2f} acceptable", "gate": 6}
+        return GateResult(6, True, R.RR_OK, ratio, min_ratio)
     
-    def gate_7_portfolio_exposure(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_7_portfolio_exposure(self, data: Dict[str, Any]) -> GateResult:
         """Gate 7: Check portfolio exposure/diversification"""
-        current_exposure = data.get("current_exposure", 0.0)  # % of portfolio
-        trade_size = data.get("trade_size", 0.0)  # % of portfolio
-        max_exposure = 0.5  # 50% max in single position
+        current_exposure = _get(data, "current_exposure", 0.0)  # % of portfolio
+        trade_size = _get(data, "trade_size", 0.0)  # % of portfolio
         
         total_exposure = current_exposure + trade_size
         
-        if total_exposure > max_exposure:
-            return {"passed": False, "reason": f"Total exposure {total_exposure:.1%} exceeds limit", "gate": 7}
+        if total_exposure > self.MAX_EXPOSURE:
+            return GateResult(7, False, R.EXPOSURE_HIGH, total_exposure, self.MAX_EXPOSURE)
         
-        return {"passed": True, "reason": f"Exposure within limits: {total_exposure:.1%}", "gate": 7}
+        return GateResult(7, True, R.EXPOSURE_OK, total_exposure, self.MAX_EXPOSURE)
     
-    def gate_8_order_flow_pressure(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_8_order_flow_pressure(self, data: Dict[str, Any]) -> GateResult:
         """Gate 8: Check order flow pressure (simplified)"""
-        buy_pressure = data.get("buy_volume", 0)
-        sell_pressure = data.get("sell_volume", 0)
+        buy_pressure = _get(data, "buy_volume", 0)
+        sell_pressure = _get(data, "sell_volume", 0)
         
         if buy_pressure + sell_pressure == 0:
-            return {"passed": True, "reason": "No order flow data", "gate": 8}
+            return GateResult(8, True, R.FLOW_NONE)
         
         buy_ratio = buy_pressure / (buy_pressure + sell_pressure)
         
         # Check if direction aligns with order flow
         direction = data.get("direction", "")
-        if direction == "BUY" and buy_ratio < 0.45:
-            return {"passed": False, "reason": f"Sell pressure dominant: {1-buy_ratio:.1%}", "gate": 8}
+        if direction == "BUY" and buy_ratio < self.MIN_BUY_RATIO:
+            return GateResult(8, False, R.SELL_PRESSURE, 1 - buy_ratio, self.MIN_BUY_RATIO)
         
-        if direction == "SELL" and buy_ratio > 0.55:
-            return {"passed": False, "reason": f"Buy pressure dominant: {buy_ratio:.1%}", "gate": 8}
+        if direction == "SELL" and buy_ratio > self.MAX_BUY_RATIO:
+            return GateResult(8, False, R.BUY_PRESSURE, buy_ratio, self.MAX_BUY_RATIO)
         
-        return {"passed": True, "reason": "Order flow pressure acceptable", "gate": 8}
+        return GateResult(8, True, R.FLOW_OK, buy_ratio)
     
-    def gate_9_ai_confidence(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def gate_9_ai_confidence(self, data: Dict[str, Any]) -> GateResult:
         """Gate 9: Check AI confidence score"""
-        confidence = data.get("ai_confidence", 0.0)
+        confidence = _get(data, "ai_confidence", 0.0)
         
         if confidence < self.MIN_CONFIDENCE:
-            return {"passed": False, "reason": f"AI confidence {confidence:.1%} below threshold", "gate": 9}
+            return GateResult(9, False, R.CONFIDENCE_LOW, confidence, self.MIN_CONFIDENCE)
+        
+        return GateResult(9, True, R.CONFIDENCE_OK, confidence, self.MIN_CONFIDENCE)
+    
+    def gate_10_correlated_exposure(self, data: Dict[str, Any]) -> GateResult:
+        """Gate 10: Check exposure to the symbol plus holdings correlated with it"""
+        correlated_exposure = _get(data, "correlated_exposure", 0.0)  # % of portfolio
         
-        return {"passed": True, "reason": f"AI confidence: {confidence:.1%}", "gate": 9}
+        if correlated_exposure > self.MAX_CORRELATED_EXPOSURE:
+            return GateResult(10, False, R.CORRELATED_EXPOSURE_HIGH, correlated_exposure, self.MAX_CORRELATED_EXPOSURE)
+        
+        return GateResult(10, True, R.CORRELATED_EXPOSURE_OK, correlated_exposure, self.MAX_CORRELATED_EXPOSURE)
+
+
+class BatchGateResult:
+    """Pass/fail masks for a batch of candidate signals; reasons are rendered on demand"""
+    
+    def __init__(self, masks: np.ndarray, columns: Dict[str, Any], now: datetime, validators: ValidationGates):
+        self.masks = masks  # shape (GATE_COUNT, n): masks[g - 1][i] is gate g for row i
+        self.columns = columns
+        self.now = now
+        self.validators = validators
+    
+    def __len__(self) -> int:
+        return self.masks.shape[1]
+    
+    @property
+    def passed(self) -> np.ndarray:
+        """Rows that passed every gate"""
+        return self.masks.all(axis=0)
+    
+    def gate_passed(self, gate: int) -> np.ndarray:
+        return self.masks[gate - 1]
+    
+    def failed_indices(self) -> np.ndarray:
+        return np.flatnonzero(~self.passed)
+    
+    def row(self, index: int) -> Dict[str, Any]:
+        """Rebuild the per-signal dict for one row"""
+        data = {}
+        for key, column in self.columns.items():
+            value = column[index]
+            if isinstance(value, np.generic):
+                value = value.item()
+            if isinstance(value, float) and value != value:  # NaN -> missing
+                value = None
+            data[key] = value
+        return data
+    
+    def reasons(self, index: int) -> Dict[str, GateResult]:
+        """Gate results with reason strings for one row (same output as validate_all_gates)"""
+        return self.validators.validate_all_gates(self.row(index), self.now)[1]
+    
+    def failed_reasons(self, indices: Optional[Iterable[int]] = None) -> Dict[int, List[GateResult]]:
+        """Failed-gate results for the requested rows (all failed rows by default)"""
+        if indices is None:
+            indices = self.failed_indices()
+        result = {}
+        for index in indices:
+            index = int(index)
+            failed = np.flatnonzero(~self.masks[:, index]) + 1
+            if not len(failed):
+                continue
+            data = self.row(index)
+            result[index] = [self.validators.run_gate(int(gate), data, self.now) for gate in failed]
+        return result
+
+
+
+class BatchValidationGates:
+    """
+    Vectorized evaluation of all gates over columnar candidate signals
+    
+    Columns use the same keys as the per-signal dict (current_price,
+    entry_price, quote_timestamp, direction, ...). Missing columns and
+    None/NaN entries take the same defaults as ValidationGates, so the masks
+    match validate_all_gates row for row.
+    """
+    
+    def __init__(self, validators: Optional[ValidationGates] = None):
+        self.validators = validators or ValidationGates()
+    
+    @staticmethod
+    def _numeric(columns: Dict[str, Any], key: str, default: float, n: int) -> np.ndarray:
+        if key not in columns:
+            return np.full(n, default, dtype=np.float64)
+        values = np.asarray(columns[key], dtype=np.float64)
+        return np.where(np.isnan(values), default, values)
+    
+    @staticmethod
+    def _objects(columns: Dict[str, Any], key: str, n: int) -> np.ndarray:
+        if key not in columns:
+            return np.full(n, None, dtype=object)
+        return np.asarray(columns[key], dtype=object)
+    
+    @staticmethod
+    def _timestamps_us(columns: Dict[str, Any], n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """quote_timestamp as int64 microseconds since epoch plus a missing mask"""
+        if "quote_timestamp" not in columns:
+            return np.zeros(n, dtype=np.int64), np.ones(n, dtype=bool)
+        stamps = np.asarray(columns["quote_timestamp"], dtype="datetime64[us]")
+        missing = np.isnat(stamps)
+        return np.where(missing, 0, stamps.astype(np.int64)), missing
+    
+    def evaluate(self, columns: Dict[str, Any], now: Optional[datetime] = None) -> BatchGateResult:
+        """Compute all pass/fail masks in one vectorized pass"""
+        v = self.validators
+        now = now or datetime.utcnow()
+        n = len(next(iter(columns.values()))) if columns else 0
+        masks = np.ones((GATE_COUNT, n), dtype=bool)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Gate 1: quote freshness
+            stamps, missing = self._timestamps_us(columns, n)
+            age = (np.datetime64(now, "us").astype(np.int64) - stamps) / 1e6
+            masks[0] = ~missing & ~(age > v.MAX_QUOTE_AGE_SECONDS)
+            
+            # Gate 2: price deviation (and sanity-filter flag)
+            current = self._numeric(columns, "current_price", 0, n)
+            entry = self._numeric(columns, "entry_price", 0, n)
+            prev_close = self._numeric(columns, "prev_close", 0, n)
+            suspect = self._objects(columns, "quote_suspect", n).astype(bool)
+            missing = (current == 0) | (entry == 0) | (prev_close == 0)
+            entry_dev = np.abs(current - entry) / entry
+            close_dev = np.abs(current - prev_close) / prev_close
+            masks[1] = ~suspect & ~missing & ~(entry_dev > v.MAX_PRICE_DEVIATION_FROM_ENTRY) & ~(close_dev > v.MAX_PRICE_DEVIATION_FROM_CLOSE)
+            
+            # Gate 3: liquidity
+            masks[2] = ~(self._numeric(columns, "volume", 0, n) < v.MIN_VOLUME)
+            
+            # Gate 4: volatility regime
+            masks[3] = ~(self._numeric(columns, "vix", 20, n) > v.MAX_VIX)
+            
+            # Gate 5: market hours (calendar when market_open is missing)
+            market_open = self._objects(columns, "market_open", n)
+            unknown = np.equal(market_open, None)
+            masks[4] = np.where(unknown, market_calendar.is_open(now), market_open.astype(bool))
+            
+            # Gate 6: risk/reward
+            stop = self._numeric(columns, "stop_loss", 0, n)
+            target = self._numeric(columns, "take_profit", 0, n)
+            risk = np.abs(entry - stop)
+            ratio = np.abs(target - entry) / risk
+            timeframe = self._objects(columns, "timeframe", n)
+            min_ratio = np.where(timeframe == "day", v.MIN_RR_DAY, v.MIN_RR_SWING)
+            masks[5] = (entry != 0) & (stop != 0) & (target != 0) & (risk != 0) & ~(ratio < min_ratio)
+            
+            # Gate 7: portfolio exposure
+            exposure = self._numeric(columns, "current_exposure", 0.0, n) + self._numeric(columns, "trade_size", 0.0, n)
+            masks[6] = ~(exposure > v.MAX_EXPOSURE)
+            
+            # Gate 8: order flow pressure
+            buy = self._numeric(columns, "buy_volume", 0, n)
+            sell = self._numeric(columns, "sell_volume", 0, n)
+            total = buy + sell
+            buy_ratio = buy / total
+            direction = self._objects(columns, "direction", n)
+            against = ((direction == "BUY") & (buy_ratio < v.MIN_BUY_RATIO)) | ((direction == "SELL") & (buy_ratio > v.MAX_BUY_RATIO))
+            masks[7] = (total == 0) | ~against
+            
+            # Gate 9: AI confidence
+            masks[8] = ~(self._numeric(columns, "ai_confidence", 0.0, n) < v.MIN_CONFIDENCE)
+            
+            # Gate 10: correlated exposure
+            masks[9] = ~(self._numeric(columns, "correlated_exposure", 0.0, n) > v.MAX_CORRELATED_EXPOSURE)
+        
+        return BatchGateResult(masks, columns, now, v)
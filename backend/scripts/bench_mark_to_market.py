@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark mark-to-market revaluation
+
+Loads a book of portfolios holding positions across many symbols, then
+replays single-symbol price ticks. Every tick revalues every portfolio.
+
+Usage: python scripts/bench_mark_to_market.py [portfolios] [positions_per_portfolio] [symbols] [ticks]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mark_to_market import MarkToMarket
+
+
+def main():
+    portfolios = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    per_portfolio = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    symbols = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    ticks = int(sys.argv[4]) if len(sys.argv) > 4 else 2_000
+    rng = random.Random(7)
+
+    prices = [rng.uniform(20, 500) for _ in range(symbols)]
+    marks = MarkToMarket()
+    start = time.perf_counter()
+    marks.load(
+        [(portfolio_id, 100_000.0, None) for portfolio_id in range(portfolios)],
+        [(portfolio_id, f"S{s}", rng.randint(-200, 200), prices[s])
+         for portfolio_id in range(portfolios) for s in rng.sample(range(symbols), per_portfolio)]
+    )
+    load_ms = (time.perf_counter() - start) * 1000
+    stats = marks.stats()
+    print(f"Loaded {stats['portfolios']:,} portfolios, {stats['open_positions']:,} positions in {load_ms:.0f}ms")
+
+    samples = []
+    for tick in range(ticks):
+        s = tick % symbols
+        prices[s] *= 1 + rng.gauss(0, 0.001)
+        t0 = time.perf_counter()
+        marks.on_price(f"S{s}", prices[s])
+        samples.append(time.perf_counter() - t0)
+
+    samples.sort()
+    print(f"\nReplayed {ticks:,} ticks")
+    print(f"{'mean ms/tick':<24}{sum(samples) * 1000 / ticks:>10.3f}")
+    print(f"{'p50 ms/tick':<24}{samples[ticks // 2] * 1000:>10.3f}")
+    print(f"{'p99 ms/tick':<24}{samples[int(ticks * 0.99)] * 1000:>10.3f}")
+    print(f"{'portfolios/s':<24}{portfolios * ticks / sum(samples):>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
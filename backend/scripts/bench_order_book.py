@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the resting paper order book
+
+Loads resting limit and stop orders across many symbols, then replays price
+ticks. Every matched order is replaced by a new uncrossed one around the
+current price, so the book stays the same size. Compared with a scan of every
+resting order on the ticked symbol.
+
+Usage: python scripts/bench_order_book.py [orders] [symbols] [ticks]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.paper_order_book import LIMIT, STOP, OrderBook, RestingOrder
+
+
+def new_order(rng, order_id, symbol, price):
+    return RestingOrder(
+        order_id, order_id % 1000, symbol, rng.choice(["BUY", "SELL"]), rng.choice([LIMIT, STOP]),
+        price * (1 + rng.uniform(-0.05, 0.05)), rng.randint(1, 500)
+    )
+
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else 20_000
+    rng = random.Random(7)
+
+    prices = [rng.uniform(20, 500) for _ in range(symbols)]
+    resting = [new_order(rng, order_id, f"S{order_id % symbols}", prices[order_id % symbols]) for order_id in range(orders)]
+    book = OrderBook()
+    start = time.perf_counter()
+    book.load(resting)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"Loaded {len(book):,} resting orders across {symbols:,} symbols in {load_ms:.0f}ms")
+
+    by_symbol = {}
+    for order in resting:
+        by_symbol.setdefault(order.symbol, []).append(order)
+
+    next_id, matched, samples, scan = orders, 0, [], 0.0
+    for tick in range(ticks):
+        s = rng.randrange(symbols)
+        symbol = f"S{s}"
+        prices[s] *= 1 + rng.gauss(0, 0.01)
+        t0 = time.perf_counter()
+        matches = book.on_price(symbol, prices[s])
+        samples.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        [order for order in by_symbol[symbol] if order.crossed(prices[s])]
+        scan += time.perf_counter() - t0
+
+        matched += len(matches)
+        gone = {match.order.id for match in matches}
+        if gone:
+            by_symbol[symbol] = [order for order in by_symbol[symbol] if order.id not in gone]
+        for _ in matches:
+            order = new_order(rng, next_id, symbol, prices[s])
+            while order.crossed(prices[s]):
+                order = new_order(rng, next_id, symbol, prices[s])
+            book.add(order, prices[s])
+            by_symbol[symbol].append(order)
+            next_id += 1
+
+    samples.sort()
+    total = sum(samples)
+    print(f"\nReplayed {ticks:,} ticks, {matched:,} matches, {len(book):,} orders resting")
+    print(f"{'mean us/tick':<24}{total * 1e6 / ticks:>10.1f}")
+    print(f"{'p50 us/tick':<24}{samples[ticks // 2] * 1e6:>10.1f}")
+    print(f"{'p99 us/tick':<24}{samples[int(ticks * 0.99)] * 1e6:>10.1f}")
+    print(f"{'matches/s':<24}{matched / total:>10,.0f}")
+    print(f"{'scan us/tick':<24}{scan * 1e6 / ticks:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
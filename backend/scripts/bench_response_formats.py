@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk response formats (JSON vs MessagePack vs Arrow IPC)
+
+Builds realistic trade rows, then measures encode time, decode time and
+payload size for each format the bulk endpoints can negotiate.
+
+Usage: python scripts/bench_response_formats.py [rows]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from app.schemas import TradeResponse
+from app.utils.response_formats import encode_arrow, encode_msgpack, rows_to_columns
+import msgpack
+import pyarrow as pa
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "TSLA", "META", "JPM", "XOM", "V"]
+COLUMNS = list(TradeResponse.model_fields)
+
+
+def make_trades(count: int):
+    """Generate trade rows shaped like Trade ORM objects"""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 2, 14, 30)
+    trades = []
+    for i in range(count):
+        entry = round(rng.uniform(20, 900), 2)
+        closed = rng.random() < 0.7
+        exit_price = round(entry * rng.uniform(0.9, 1.12), 2) if closed else None
+        quantity = rng.randint(1, 500)
+        pnl = round((exit_price - entry) * quantity, 2) if closed else None
+        opened_at = start + timedelta(minutes=i)
+        trades.append(SimpleNamespace(
+            id=i + 1,
+            symbol=rng.choice(SYMBOLS),
+            direction=rng.choice(["BUY", "SELL"]),
+            entry_price=entry,
+            exit_price=exit_price,
+            stop_loss=round(entry * 0.97, 2),
+            take_profit=round(entry * 1.05, 2),
+            quantity=quantity,
+            pnl=pnl,
+            pnl_percent=round(pnl / (entry * quantity) * 100, 4) if closed else None,
+            status="CLOSED" if closed else "OPEN",
+            opened_at=opened_at,
+            closed_at=opened_at + timedelta(hours=rng.randint(1, 72)) if closed else None,
+        ))
+    return trades
+
+
+def timed(fn, repeat: int = 3):
+    """Best-of-N wall time in milliseconds"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trades = make_trades(count)
+    print(f"Benchmarking {count:,} trade rows\n")
+
+    def encode_json():
+        models = [TradeResponse.model_validate(t, from_attributes=True) for t in trades]
+        return json.dumps(jsonable_encoder(models)).encode()
+
+    def encode_mp():
+        return encode_msgpack(rows_to_columns(trades, COLUMNS))
+
+    def encode_arr():
+        return encode_arrow(rows_to_columns(trades, COLUMNS))
+
+    results = []
+    for name, encode, decode in [
+        ("json (pydantic)", encode_json, lambda b: json.loads(b)),
+        ("msgpack", encode_mp, lambda b: msgpack.unpackb(b, timestamp=3)),
+        ("arrow ipc", encode_arr, lambda b: pa.ipc.open_stream(b).read_all()),
+    ]:
+        encode_ms, payload = timed(encode)
+        decode_ms, _ = timed(lambda: decode(payload))
+        results.append((name, encode_ms, decode_ms, len(payload)))
+
+    baseline = results[0]
+    print(f"{'format':<18}{'encode ms':>12}{'decode ms':>12}{'size KiB':>12}{'vs json':>10}")
+    for name, encode_ms, decode_ms, size in results:
+        ratio = (baseline[1] + baseline[2]) / (encode_ms + decode_ms)
+        print(f"{name:<18}{encode_ms:>12.1f}{decode_ms:>12.1f}{size / 1024:>12.1f}{ratio:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
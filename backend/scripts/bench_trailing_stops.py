@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the trigger index over a replayed trading day
+
+Arms a book of live orders (brackets and trailing stops, long and short)
+across many symbols, then replays one 6.5-hour session of one-second
+ticks per symbol, interleaved in time order. Every order that fires is
+replaced by a fresh one at the current price, so the live book stays the
+same size all day.
+
+Usage: python scripts/bench_trailing_stops.py [orders] [symbols] [ticks_per_symbol]
+"""
+
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.trigger_index import TriggerIndex
+
+SESSION_SECONDS = int(6.5 * 3600)
+
+
+def make_order(rng: random.Random, price: float):
+    direction = rng.choice(["BUY", "SELL"])
+    sign = 1 if direction == "BUY" else -1
+    risk = price * rng.uniform(0.005, 0.03)
+    stop, target = price - sign * risk, price + sign * risk * rng.uniform(1.5, 3.0)
+    trail = risk if rng.random() < 0.5 else None
+    return direction, stop, target, trail
+
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else SESSION_SECONDS
+    rng = random.Random(7)
+
+    prices = {f"S{i}": rng.uniform(20, 500) for i in range(symbols)}
+    names = list(prices)
+    index = TriggerIndex()
+    start = time.perf_counter()
+    for trade_id in range(orders):
+        symbol = names[trade_id % symbols]
+        direction, stop, target, trail = make_order(rng, prices[symbol])
+        index.arm(trade_id, trade_id % 1000, symbol, direction, stop, target, trail=trail, watermark=prices[symbol])
+    armed_ms = (time.perf_counter() - start) * 1000
+    print(f"Armed {orders:,} orders on {symbols} symbols in {armed_ms:.0f}ms ({index.stats()['trailing_stops']:,} trailing)")
+
+    # Per-symbol random walks, volatility ~1.5% per session
+    step = {symbol: 0.015 / (ticks ** 0.5) for symbol in names}
+    fired = Counter()
+    next_id = orders
+    elapsed = 0.0
+    for _ in range(ticks):
+        for symbol in names:
+            prices[symbol] *= 1 + rng.gauss(0, step[symbol])
+            price = prices[symbol]
+            t0 = time.perf_counter()
+            hits = index.on_price(symbol, price)
+            elapsed += time.perf_counter() - t0
+            for hit in hits:
+                fired[hit.reason] += 1
+                direction, stop, target, trail = make_order(rng, price)
+                index.arm(next_id, hit.portfolio_id, symbol, direction, stop, target, trail=trail, watermark=price)
+                next_id += 1
+
+    total = ticks * symbols
+    stats = index.stats()
+    print(f"\nReplayed {total:,} ticks ({ticks:,} per symbol)")
+    print(f"{'tick time (s)':<24}{elapsed:>12.2f}")
+    print(f"{'ticks/s':<24}{total / elapsed:>12,.0f}")
+    print(f"{'us/tick':<24}{elapsed * 1e6 / total:>12.2f}")
+    for reason, count in sorted(fired.items()):
+        print(f"{'fired ' + reason:<24}{count:>12,}")
+    print(f"{'live orders at close':<24}{stats['armed_trades']:>12,}")
+    print(f"{'heap entries at close':<24}{stats['heap_entries']:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,12 @@ Test configuration and fixtures
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.database import Base
+from sqlalchemy.pool import StaticPool
+from app.database import Base, get_db
 from app.main import app
+from app.models import Portfolio, User
+from app.services.activity_log_writer import TRANSACTIONAL, activity_log_writer
+from app.services.exposure_service import exposure_service
 from fastapi.testclient import TestClient
 
 # Use in-memory SQLite for tests
@@ -43,3 +47,66 @@ def db_session(setup_test_db):
 def client():
     """Provide a test client"""
     return TestClient(app)
+
+# Owner of the portfolios seeded by trading_db
+TRADER_EMAIL = "trader@example.com"
+
+@pytest.fixture
+def trading_db(tmp_path, monkeypatch):
+    """
+    Factory for a seeded trading database
+
+    make(capital=10000, cash=None, threaded=False, portfolios=None) returns a
+    sessionmaker (autoflush off, like SessionLocal) over a fresh database with
+    user 1 (TRADER_EMAIL) and portfolio 1 holding `capital` as equity and
+    `cash` (default: capital) as cash, or the given portfolios instead.
+    threaded=True puts the database in a file under tmp_path, for sessions
+    used from several threads; otherwise it is one in-memory connection.
+
+    Also resets the in-memory exposure state and keeps the activity log
+    transactional.
+    """
+    engines = []
+
+    def make(capital=10000, cash=None, threaded=False, portfolios=None):
+        if threaded:
+            engine = create_engine(
+                f"sqlite:///{tmp_path / f'trading{len(engines)}.db'}",
+                connect_args={"check_same_thread": False, "timeout": 30},
+            )
+        else:
+            engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        engines.append(engine)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine, autoflush=False)
+        db = factory()
+        db.add(User(id=1, email=TRADER_EMAIL, password_hash="x"))
+        db.add_all(portfolios or [Portfolio(
+            id=1, user_id=1, name="main", starting_capital=capital, current_equity=capital,
+            cash_balance=capital if cash is None else cash,
+        )])
+        db.commit()
+        db.close()
+        return factory
+
+    monkeypatch.setattr(exposure_service, "_portfolios", {})
+    monkeypatch.setattr(activity_log_writer, "mode", TRANSACTIONAL)
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+@pytest.fixture
+def serve_db():
+    """serve(factory) points the app's get_db at sessions from factory for the test"""
+    def serve(factory):
+        def override_get_db():
+            session = factory()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+
+    yield serve
+    app.dependency_overrides.pop(get_db, None)
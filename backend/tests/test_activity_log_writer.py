@@ -0,0 +1,105 @@
+"""Tests for the write-behind activity log pipeline."""
+
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.models import ActivityLog
+from app.services.activity_log_writer import TRANSACTIONAL, WRITE_BEHIND, ActivityLogWriter
+from app.services.trading_engine import TradingEngine
+
+
+@pytest.fixture
+def bind(trading_db):
+    return trading_db(capital=100000, threaded=True).kw["bind"]
+
+
+def logs(bind):
+    db = sessionmaker(bind=bind)()
+    try:
+        return db.query(ActivityLog).order_by(ActivityLog.id).all()
+    finally:
+        db.close()
+
+
+def test_trade_commits_once_and_log_follows(bind):
+    writer = ActivityLogWriter(mode=WRITE_BEHIND, flush_interval_ms=5)
+    db = sessionmaker(bind=bind)()
+    commits = []
+    event.listen(db, "after_commit", commits.append)
+    engine = TradingEngine(db)
+    engine.audit = writer
+
+    signal = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0, "take_profit": 104.0,
+              "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime(2025, 1, 2, 15, 0), "validation_gates": {}}
+    trade = engine.execute_trade(1, signal, 10)
+    engine.close_trade(trade.id, 105.0, "target")
+    assert len(commits) == 2
+
+    assert writer.flush()
+    rows = logs(bind)
+    assert [(row.trade_id, row.event_type) for row in rows] == [(trade.id, "EXECUTED"), (trade.id, "CLOSED")]
+    assert rows[0].details["timestamp"] == "2025-01-02T15:00:00"
+    writer.shutdown()
+    db.close()
+
+
+def test_rows_are_batched(bind):
+    writer = ActivityLogWriter(batch_size=100, flush_interval_ms=50)
+    for i in range(500):
+        writer.submit(bind, i, "EXECUTED", "bulk", {"i": i})
+    writer.shutdown()
+    assert len(logs(bind)) == 500
+    assert writer.written == 500 and writer.batches < 50
+
+
+def test_full_queue_writes_inline(bind, monkeypatch):
+    writer = ActivityLogWriter(max_queue=1, enqueue_timeout=0.001)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    writer.submit(bind, 1, "EXECUTED", "queued", {})
+    writer.submit(bind, 2, "EXECUTED", "inline", {})
+    assert writer.inline_writes == 1
+    assert [row.reason for row in logs(bind)] == ["inline"]
+
+
+def test_full_queue_never_writes_on_the_event_loop(bind, monkeypatch):
+    writer = ActivityLogWriter(max_queue=1, enqueue_timeout=5.0)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    threads = []
+    write = writer._write
+
+    def recording_write(items):
+        threads.append(threading.current_thread())
+        write(items)
+
+    monkeypatch.setattr(writer, "_write", recording_write)
+
+    async def run():
+        writer.submit(bind, 1, "EXECUTED", "queued", {})
+        writer.submit(bind, 2, "EXECUTED", "overflow", {})
+        loop_thread = threading.current_thread()
+        await asyncio.sleep(0.05)
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert writer.inline_writes == 1
+    assert threads and loop_thread not in threads
+    assert [row.reason for row in logs(bind)] == ["overflow"]
+
+
+def test_transactional_is_the_default():
+    assert ActivityLogWriter().mode == TRANSACTIONAL
+
+
+def test_bad_row_does_not_sink_the_batch(bind):
+    writer = ActivityLogWriter(flush_interval_ms=20)
+    writer.submit(bind, 1, "EXECUTED", "ok", {})
+    writer.submit(bind, 2, "EXECUTED", "bad", {"value": object()})
+    writer.submit(bind, 3, "EXECUTED", "ok", {})
+    writer.shutdown()
+    assert [row.trade_id for row in logs(bind)] == [1, 3]
+    assert writer.failed == 1
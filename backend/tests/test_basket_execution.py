@@ -0,0 +1,121 @@
+"""Tests for basket order execution."""
+
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.models import ActivityLog, Trade
+from app.routes.auth import create_access_token
+from app.services.exposure_service import exposure_service
+from app.services.market_data_service import market_data_service
+from app.utils.market_calendar import market_calendar
+
+
+@pytest.fixture
+def basket(trading_db, serve_db, monkeypatch):
+    factory = trading_db(capital=100000, cash=2500)
+    serve_db(factory)
+    commits = []
+    event.listen(factory, "after_commit", lambda session: commits.append(session))
+
+    quotes = []
+
+    async def fake_quote(symbol, priority=None):
+        quotes.append(symbol)
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    monkeypatch.setattr(market_data_service, "get_quote", fake_quote)
+    monkeypatch.setattr(market_calendar, "is_open", lambda *args: True)
+    return TestClient(app), factory, quotes, commits
+
+
+def leg(symbol, **overrides):
+    body = {"symbol": symbol, "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0,
+            "take_profit": 104.0, "quantity": 5, "ai_confidence": 0.8}
+    body.update(overrides)
+    return body
+
+
+def auth():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+
+
+def counts(factory):
+    db = factory()
+    try:
+        return db.query(Trade).count(), db.query(ActivityLog).count()
+    finally:
+        db.close()
+
+
+def test_one_quote_per_symbol_and_one_commit(basket):
+    client, factory, quotes, commits = basket
+    legs = [leg("AAPL"), leg("MSFT"), leg("aapl", quantity=2)]
+    response = client.post("/api/trading/paper/basket/execute", json={"portfolio_id": 1, "legs": legs}, headers=auth())
+    assert response.status_code == 200, response.text
+
+    body = response.json()
+    assert body["executed"] == 3 and body["rejected"] == 0
+    assert [result["status"] for result in body["legs"]] == ["EXECUTED"] * 3
+    assert body["legs"][2]["trade"]["symbol"] == "AAPL"
+    assert sorted(quotes) == ["AAPL", "MSFT"]
+    assert len(commits) == 1
+    assert counts(factory) == (3, 3)
+    assert exposure_service._portfolios[1].by_symbol["AAPL"] == 700.0
+
+
+def test_atomic_basket_writes_nothing_on_rejection(basket):
+    client, factory, _, commits = basket
+    legs = [leg("AAPL"), leg("MSFT", ai_confidence=0.1)]
+    response = client.post("/api/trading/paper/basket/execute", json={"portfolio_id": 1, "legs": legs}, headers=auth())
+    assert response.status_code == 400
+
+    detail = response.json()["detail"]
+    assert [result["status"] for result in detail["legs"]] == ["SKIPPED", "REJECTED"]
+    assert detail["legs"][1]["reason"].startswith("Gate 9")
+    assert commits == []
+    assert counts(factory) == (0, 0)
+
+
+def test_best_effort_executes_passing_legs(basket):
+    client, factory, _, _ = basket
+    legs = [leg("AAPL"), leg("MSFT", ai_confidence=0.1), leg("NVDA")]
+    response = client.post("/api/trading/paper/basket/execute",
+                           json={"portfolio_id": 1, "legs": legs, "atomic": False}, headers=auth())
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [result["status"] for result in body["legs"]] == ["EXECUTED", "REJECTED", "EXECUTED"]
+    assert counts(factory) == (2, 2)
+
+
+def test_cash_is_checked_across_legs(basket):
+    client, factory, _, _ = basket
+    # 2500 cash: the first two legs fit (500 + 1500), the third does not
+    legs = [leg("AAPL"), leg("MSFT", quantity=15), leg("NVDA", quantity=10)]
+    response = client.post("/api/trading/basket/execute",
+                           json={"portfolio_id": 1, "legs": legs, "atomic": False}, headers=auth())
+    assert response.status_code == 200, response.text
+    third = response.json()["legs"][2]
+    assert third["status"] == "REJECTED" and "Insufficient funds" in third["reason"]
+    assert counts(factory) == (2, 2)
+
+
+def test_leg_limit(basket):
+    client, _, _, _ = basket
+    response = client.post("/api/trading/basket/execute", json={"portfolio_id": 1, "legs": []}, headers=auth())
+    assert response.status_code == 400
+
+
+def test_legs_get_the_entry_type_checks_of_single_orders(basket):
+    client, factory, _, _ = basket
+    unknown = client.post("/api/trading/paper/basket/execute",
+                          json={"portfolio_id": 1, "legs": [leg("AAPL"), leg("MSFT", entry_type="ICEBERG")]}, headers=auth())
+    live_limit = client.post("/api/trading/basket/execute",
+                             json={"portfolio_id": 1, "legs": [leg("AAPL", entry_type="limit")]}, headers=auth())
+    assert unknown.status_code == 400 and unknown.json()["detail"].startswith("Leg 1: Unknown entry_type ICEBERG")
+    assert live_limit.status_code == 400 and "only available for paper trading" in live_limit.json()["detail"]
+    assert counts(factory) == (0, 0)
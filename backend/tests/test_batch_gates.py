@@ -0,0 +1,89 @@
+"""Tests that the vectorized batch gates match the per-signal gates exactly."""
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.utils.validators import GATE_COUNT, BatchValidationGates, ValidationGates
+
+NOW = datetime(2024, 3, 28, 15, 0, 0, 123456)  # regular session
+
+
+def random_signals(count: int, seed: int = 11):
+    rng = random.Random(seed)
+
+    def maybe(value, p_none=0.05):
+        return None if rng.random() < p_none else value
+
+    rows = []
+    for _ in range(count):
+        price = round(rng.uniform(5, 500), 2)
+        direction = rng.choice(["BUY", "SELL", ""])
+        risk = price * rng.choice([0, 0.01, 0.02, 0.05])
+        rows.append({
+            "quote_timestamp": maybe(NOW - timedelta(seconds=rng.choice([0, 30, 59.999999, 60, 60.000001, 61, 600, -5]))),
+            "current_price": maybe(price),
+            "entry_price": maybe(rng.choice([price, price * 1.02, price * 1.03, price * 1.05, 0])),
+            "prev_close": maybe(price * rng.uniform(0.6, 1.4)),
+            "volume": maybe(rng.choice([0, 99999, 100000, 5_000_000])),
+            "vix": maybe(rng.choice([12, 40, 40.01, 55])),
+            "market_open": rng.choice([True, False, None]),
+            "stop_loss": maybe(price - risk),
+            "take_profit": maybe(price + risk * rng.choice([1.0, 1.5, 2.0, 3.0])),
+            "timeframe": rng.choice(["day", "swing", None]),
+            "current_exposure": maybe(rng.uniform(0, 0.5)),
+            "trade_size": maybe(rng.uniform(0, 0.2)),
+            "buy_volume": maybe(rng.choice([0, 100, 450, 550, 1000])),
+            "sell_volume": maybe(rng.choice([0, 100, 450, 550, 1000])),
+            "direction": direction,
+            "ai_confidence": maybe(rng.choice([0.1, 0.3, 0.29999, 0.9])),
+            "quote_suspect": rng.random() < 0.02,
+            "correlated_exposure": maybe(rng.choice([0.0, 0.3, 0.6, 0.61, 1.2])),
+        })
+    return rows
+
+
+def to_columns(rows):
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def test_masks_match_per_signal_gates():
+    rows = random_signals(5000)
+    result = BatchValidationGates().evaluate(to_columns(rows), now=NOW)
+    gates = ValidationGates()
+
+    for i, row in enumerate(rows):
+        passed, per_signal = gates.validate_all_gates(row, NOW)
+        expected = [per_signal[f"gate_{g}"]["passed"] for g in range(1, GATE_COUNT + 1)]
+        assert result.masks[:, i].tolist() == expected, (i, row)
+        assert bool(result.passed[i]) == passed
+
+
+def test_numpy_columns_and_missing_columns():
+    rows = random_signals(500, seed=5)
+    columns = {
+        "current_price": np.array([r["current_price"] for r in rows], dtype=float),
+        "entry_price": np.array([r["entry_price"] for r in rows], dtype=float),
+        "prev_close": np.array([r["prev_close"] for r in rows], dtype=float),
+        "quote_timestamp": np.array([r["quote_timestamp"] for r in rows], dtype="datetime64[us]"),
+    }
+    result = BatchValidationGates().evaluate(columns, now=NOW)
+    gates = ValidationGates()
+    for i in range(len(rows)):
+        _, per_signal = gates.validate_all_gates(result.row(i), NOW)
+        assert result.masks[:, i].tolist() == [per_signal[f"gate_{g}"]["passed"] for g in range(1, GATE_COUNT + 1)]
+
+
+def test_reasons_render_only_for_requested_rows():
+    rows = random_signals(200, seed=2)
+    result = BatchValidationGates().evaluate(to_columns(rows), now=NOW)
+    gates = ValidationGates()
+
+    index = int(result.failed_indices()[0])
+    assert result.reasons(index) == gates.validate_all_gates(rows[index], NOW)[1]
+
+    failed = result.failed_reasons([index, index + 1])
+    _, per_signal = gates.validate_all_gates(rows[index], NOW)
+    assert failed[index] == [r for r in per_signal.values() if not r["passed"]]
+    assert set(failed) <= {index, index + 1}
@@ -0,0 +1,91 @@
+"""Tests for the append-only cash journal and balance snapshots."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import CashEntry, CashSnapshot, Portfolio, Trade
+from app.services.cash_journal import CashJournal
+from app.services.trading_engine import TradingEngine
+
+
+@pytest.fixture
+def session(trading_db):
+    db = trading_db()()
+    yield db
+    db.close()
+
+
+def test_opening_entry_and_snapshots(session):
+    journal = CashJournal(snapshot_every=10)
+    portfolio = session.get(Portfolio, 1)
+    for i in range(24):
+        journal.record(session, portfolio, -100.0 if i % 2 else 50.0)
+    session.commit()
+
+    entries = journal.entries(session, 1)
+    assert entries[0].kind == "OPENING" and entries[0].amount == 10000
+    assert [e.seq for e in entries] == list(range(1, 26))
+    snapshots = session.query(CashSnapshot).order_by(CashSnapshot.seq).all()
+    assert [(s.seq, s.balance) for s in snapshots] == [(10, 9850.0), (20, 9600.0)]
+
+    assert portfolio.cash_balance == pytest.approx(10000 - 12 * 50)
+    assert journal.balance(session, 1) == portfolio.cash_balance
+    assert journal.reconcile(session, portfolio)["in_balance"]
+
+
+def test_current_balance_reads_only_the_tail(session):
+    journal = CashJournal(snapshot_every=10)
+    portfolio = session.get(Portfolio, 1)
+    for _ in range(25):
+        journal.record(session, portfolio, -1.0)
+    session.commit()
+
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    assert journal.balance(session, 1) == 9975.0
+    assert len(statements) == 2
+    assert "cash_snapshots" in statements[0] and "seq >" in statements[1]
+
+
+def test_point_in_time_balance(session):
+    journal = CashJournal(snapshot_every=3)
+    portfolio = session.get(Portfolio, 1)
+    start = datetime(2025, 1, 1)
+    for day in range(6):
+        entry = journal.record(session, portfolio, -1000.0)
+        entry.created_at = start + timedelta(days=day)
+    session.flush()
+    for snapshot in session.query(CashSnapshot):
+        snapshot.created_at = start + timedelta(days=snapshot.seq - 2)
+    session.query(CashEntry).filter_by(kind="OPENING").one().created_at = start - timedelta(days=1)
+    session.commit()
+
+    assert journal.balance(session, 1, start - timedelta(hours=1)) == 10000.0
+    assert journal.balance(session, 1, start + timedelta(days=2, hours=1)) == 7000.0
+    assert journal.balance(session, 1, start + timedelta(days=10)) == 4000.0
+    assert len(journal.entries(session, 1, start + timedelta(days=1), start + timedelta(days=3))) == 3
+
+
+def test_reconcile_flags_drift(session):
+    journal = CashJournal()
+    portfolio = session.get(Portfolio, 1)
+    journal.record(session, portfolio, -500.0)
+    session.commit()
+    portfolio.cash_balance += 1.0
+    assert journal.reconcile(session, portfolio)["difference"] == pytest.approx(1.0)
+
+
+def test_fills_are_journaled_against_their_trades(session):
+    engine = TradingEngine(session)
+    signal = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0, "take_profit": 104.0,
+              "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+    trade = engine.execute_trade(1, signal, 20)
+    closed = engine.close_trade(trade.id, 110.0, "target")
+
+    rows = [(e.kind, e.amount, e.trade_id) for e in session.query(CashEntry).order_by(CashEntry.seq)]
+    assert rows == [("OPENING", 10000.0, None), ("FILL", -2000.0, trade.id), ("FILL", 2200.0, closed.id)]
+    assert session.get(Portfolio, 1).cash_balance == 10200.0
+    assert session.query(Trade).count() == 1
@@ -0,0 +1,105 @@
+"""Tests for the correlation service and gate 10."""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.services.correlation_service import EMPTY_MATRIX, CorrelationService
+from app.utils.validators import ValidationGates
+
+TECH = ["AAPL", "MSFT", "NVDA", "GOOGL", "META"]
+START = datetime(2025, 1, 1)
+
+
+def feed(service, days=45, seed=1):
+    """Tech names share a common factor; XOM moves independently"""
+    rng = random.Random(seed)
+    prices = {s: 100.0 for s in TECH + ["XOM"]}
+    for d in range(days):
+        ts = (START + timedelta(days=d) - datetime(1970, 1, 1)).total_seconds()
+        factor = rng.gauss(0, 0.02)
+        for symbol in prices:
+            move = rng.gauss(0, 0.005) + (factor if symbol in TECH else rng.gauss(0, 0.02))
+            prices[symbol] *= 1 + move
+            service.record(symbol, prices[symbol], ts)
+
+
+def make_service(**kwargs):
+    return CorrelationService(window_days=60, min_observations=20, threshold=0.5, session_factory=None, **kwargs)
+
+
+def test_matrix_matches_numpy_and_thresholds():
+    service = make_service()
+    feed(service)
+    matrix = service.refresh()
+
+    assert matrix.symbols == sorted(TECH + ["XOM"])
+    closes = np.array([[service._closes[s][d] for s in matrix.symbols] for d in sorted(service._closes["AAPL"])])
+    expected = np.cov(np.diff(np.log(closes), axis=0), rowvar=False)
+    assert np.allclose(matrix.covariance, expected)
+
+    xom = matrix.index["XOM"]
+    assert (matrix.correlation[xom] == np.eye(len(matrix))[xom]).all()
+    assert set(service.correlated_with("AAPL")) == set(TECH) - {"AAPL"}
+
+
+def test_correlated_names_count_as_one_bet():
+    service = make_service()
+    feed(service)
+    service.refresh()
+    weights = {"AAPL": 0.2, "MSFT": 0.2, "NVDA": 0.2, "XOM": 0.3}
+    gates = ValidationGates()
+
+    tech = service.gate_inputs(weights, "META", 0.15)
+    assert tech["correlated_exposure"] > 0.6
+    assert not gates.gate_10_correlated_exposure(tech).passed
+
+    energy = service.gate_inputs({"AAPL": 0.15, "XOM": 0.1}, "XOM", 0.15)
+    assert energy["correlated_exposure"] == pytest.approx(0.25)
+    assert gates.gate_10_correlated_exposure(energy).passed
+
+    # No history yet: only the symbol's own exposure counts
+    assert service.correlated_exposure({"TSLA": 0.2}, "TSLA", 0.1) == pytest.approx(0.3)
+
+
+def test_check_is_sub_millisecond():
+    service = make_service()
+    feed(service)
+    service.refresh()
+    weights = {s: 0.05 for s in TECH}
+    start = time.perf_counter()
+    for _ in range(1000):
+        service.correlated_exposure(weights, "AAPL", 0.05)
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_refresh_interval_and_persistence():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    clock = [1_700_000_000.0]
+    service = CorrelationService(min_observations=20, refresh_seconds=60, session_factory=factory, clock=lambda: clock[0])
+    feed(service)
+    # The rebuild runs in the background; callers get the previous matrix meanwhile
+    assert service.current() is EMPTY_MATRIX
+    service.wait_for_refresh()
+    assert len(service.current()) == 6
+    built = service.matrix
+    assert service.current() is built
+    clock[0] += 61
+    assert service.current() is built
+    service.wait_for_refresh()
+    assert service.current() is not built
+
+    restored = CorrelationService(min_observations=20, session_factory=factory)
+    restored.load()
+    assert restored.matrix.symbols == built.symbols
+    assert np.allclose(restored.matrix.covariance, built.covariance)
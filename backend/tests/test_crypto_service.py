@@ -0,0 +1,98 @@
+"""Tests for the crypto quote service."""
+
+import asyncio
+
+from app.services.crypto_service import CryptoQuoteService, FakeExchangeAdapter, normalize_pair
+from app.utils.market_calendar import crypto_calendar
+
+
+def test_normalize_pair():
+    assert normalize_pair("btc") == "BTC-USD"
+    assert normalize_pair("ETHUSDT") == "ETH-USDT"
+    assert normalize_pair("sol/usd") == "SOL-USD"
+    assert normalize_pair("BTC-EUR") == "BTC-EUR"
+
+
+def test_session_is_always_open():
+    assert crypto_calendar.is_open()
+    assert crypto_calendar.next_close() is None
+
+
+def test_concurrent_requests_are_coalesced():
+    adapter = FakeExchangeAdapter(latency=0.01)
+    service = CryptoQuoteService(adapter, cache_ttl=60)
+
+    async def run():
+        quotes = await asyncio.gather(*[service.get_quote("BTC") for _ in range(20)])
+        await service.aclose()
+        return quotes
+
+    quotes = asyncio.run(run())
+    assert adapter.calls == 1
+    assert all(q is quotes[0] for q in quotes)
+    assert quotes[0]["market_open"] is True
+    assert service.stats["coalesced"] == 19
+
+
+def test_cancelled_leader_does_not_strand_followers():
+    adapter = FakeExchangeAdapter(latency=0.05)
+    service = CryptoQuoteService(adapter, cache_ttl=60)
+
+    async def run():
+        leader = asyncio.create_task(service.get_quote("BTC"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(service.get_quote("BTC"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        quote = await asyncio.wait_for(follower, timeout=1)
+        await service.aclose()
+        return leader, quote
+
+    leader, quote = asyncio.run(run())
+    assert leader.cancelled()
+    # The follower took over the fetch instead of waiting on the abandoned one
+    assert quote["symbol"] == "BTC-USD" and adapter.calls == 2
+    assert service.stats["coalesced"] == 1
+
+
+def test_cache_ttl():
+    adapter = FakeExchangeAdapter()
+    service = CryptoQuoteService(adapter, cache_ttl=60)
+
+    async def run():
+        await service.get_quote("ETH-USD")
+        await service.get_quote("ethusd")
+        service.clear_cache("ETH")
+        await service.get_quote("ETH")
+        await service.aclose()
+
+    asyncio.run(run())
+    assert adapter.calls == 2
+    assert service.stats["cache_hits"] == 1
+
+
+def test_unknown_pair_returns_none():
+    service = CryptoQuoteService(FakeExchangeAdapter(), cache_ttl=0)
+    assert asyncio.run(service.get_quote("NOPE")) is None
+
+
+def test_stream_fans_out_with_one_poller():
+    adapter = FakeExchangeAdapter()
+    service = CryptoQuoteService(adapter, cache_ttl=0, stream_interval=0.001)
+
+    async def consume(count):
+        ticks = []
+        async for tick in service.stream("BTC"):
+            ticks.append(tick)
+            if len(ticks) == count:
+                break
+        return ticks
+
+    async def run():
+        results = await asyncio.gather(consume(3), consume(3))
+        await asyncio.sleep(0.01)
+        return results
+
+    first, second = asyncio.run(run())
+    assert len(first) == 3 and len(second) == 3
+    assert service._pollers == {}
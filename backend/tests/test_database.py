@@ -0,0 +1,36 @@
+"""Tests for the in-place schema upgrade."""
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, upgrade_schema
+from app.models import Portfolio
+
+
+def test_upgrade_adds_missing_columns_with_defaults(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # portfolios and trades as they were before gate rules, versioning and order types
+        conn.execute(text(
+            "CREATE TABLE portfolios (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name VARCHAR NOT NULL, "
+            "description VARCHAR, starting_capital FLOAT NOT NULL, current_equity FLOAT, cash_balance FLOAT, "
+            "is_active BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO portfolios (id, user_id, name, starting_capital, current_equity, cash_balance) "
+            "VALUES (1, 1, 'main', 10000, 10000, 10000)"
+        ))
+    Base.metadata.create_all(bind=engine)
+
+    added = upgrade_schema(engine)
+    assert {"portfolios.gate_rules", "portfolios.version_id"} <= set(added)
+    assert upgrade_schema(engine) == []
+
+    db = sessionmaker(bind=engine)()
+    portfolio = db.get(Portfolio, 1)
+    assert (portfolio.version_id, portfolio.gate_rules) == (1, None)
+    portfolio.cash_balance = 9000
+    db.commit()
+    assert portfolio.version_id == 2
+    db.close()
+    engine.dispose()
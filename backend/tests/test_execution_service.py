@@ -0,0 +1,140 @@
+"""Tests for the staged execute-trade pipeline."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.main import app
+from app.models import Portfolio
+from app.routes.auth import create_access_token
+from app.services import execution_service
+from app.services.market_data_service import market_data_service
+from app.utils.market_calendar import market_calendar
+from app.utils.quote_tokens import sign_quote
+
+DELAY = 0.2
+
+
+@pytest.fixture
+def client(trading_db, serve_db, monkeypatch):
+    serve_db(trading_db(capital=100000))
+
+    async def slow_quote(symbol, priority=None):
+        await asyncio.sleep(DELAY)
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    load = execution_service.load_execution_context
+
+    def slow_load(*args):
+        time.sleep(DELAY)
+        return load(*args)
+
+    monkeypatch.setattr(market_data_service, "get_quote", slow_quote)
+    monkeypatch.setattr(execution_service, "load_execution_context", slow_load)
+    monkeypatch.setattr(market_calendar, "is_open", lambda *args: True)
+    return TestClient(app)
+
+
+def order(**overrides):
+    body = {"portfolio_id": 1, "symbol": "AAPL", "direction": "BUY", "entry_price": 100.0,
+            "stop_loss": 98.0, "take_profit": 104.0, "quantity": 10, "ai_confidence": 0.8}
+    body.update(overrides)
+    return body
+
+
+def auth():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+
+
+def test_quote_overlaps_load(client):
+    response = client.post("/api/trading/paper/execute", json=order(), headers=auth())
+    assert response.status_code == 200, response.text
+
+    latency = response.json()["latency_ms"]
+    assert set(latency) == {"auth", "lock", "load", "quote", "gates", "persist", "log", "total"}
+    assert latency["load"] >= DELAY * 1000 and latency["quote"] >= DELAY * 1000
+    assert latency["total"] < DELAY * 1000 * 1.75
+    assert "quote;dur=" in response.headers["Server-Timing"]
+
+
+def test_failed_checks_cancel_quote(client):
+    response = client.post("/api/trading/execute", json=order(quantity=10_000), headers=auth())
+    assert response.status_code == 400
+    assert "Insufficient funds" in response.json()["detail"]
+
+    response = client.post("/api/trading/execute", json=order(portfolio_id=99), headers=auth())
+    assert response.status_code == 404
+
+
+def test_bad_token_is_rejected_before_quote(client, monkeypatch):
+    calls = []
+
+    async def counting_quote(symbol, priority=None):
+        calls.append(symbol)
+
+    monkeypatch.setattr(market_data_service, "get_quote", counting_quote)
+    response = client.post("/api/trading/execute", json=order(), headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 401
+    assert calls == []
+
+
+def test_quote_token_skips_refetch(client, monkeypatch):
+    calls = []
+
+    async def counting_quote(symbol, priority=None):
+        calls.append(symbol)
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    monkeypatch.setattr(market_data_service, "get_quote", counting_quote)
+    quote = client.get("/api/market/quote/AAPL").json()
+    assert calls == ["AAPL"]
+
+    response = client.post("/api/trading/paper/execute", json=order(quote_token=quote["quote_token"]), headers=auth())
+    assert response.status_code == 200, response.text
+    assert response.json()["quote_snapshot"] is True
+    assert "quote" not in response.json()["latency_ms"]
+    assert calls == ["AAPL"]
+
+    tampered = quote["quote_token"][:-2] + ("AA" if not quote["quote_token"].endswith("AA") else "BB")
+    response = client.post("/api/trading/paper/execute", json=order(quote_token=tampered), headers=auth())
+    assert response.status_code == 400
+
+    response = client.post("/api/trading/paper/execute", json=order(symbol="MSFT", quote_token=quote["quote_token"]), headers=auth())
+    assert response.status_code == 400
+    assert "not MSFT" in response.json()["detail"]
+
+
+def test_stale_quote_token_refetches(client):
+    token = sign_quote({"symbol": "AAPL", "current_price": 100.0, "volume": 2_000_000,
+                        "timestamp": datetime.utcnow() - timedelta(minutes=5), "source": "test"})
+    response = client.post("/api/trading/paper/execute", json=order(quote_token=token), headers=auth())
+    assert response.status_code == 200, response.text
+    assert response.json()["quote_snapshot"] is False
+    assert "quote" in response.json()["latency_ms"]
+
+
+def test_quote_token_checked_against_portfolio_quote_age(client):
+    sessions = app.dependency_overrides[get_db]()
+    db = next(sessions)
+    db.get(Portfolio, 1).gate_rules = {"max_quote_age_seconds": 10}
+    db.commit()
+    sessions.close()
+    # Fresh for the default 60s rule, stale for this portfolio: refetched instead of failing gate 1
+    token = sign_quote({"symbol": "AAPL", "current_price": 100.0, "volume": 2_000_000,
+                        "timestamp": datetime.utcnow() - timedelta(seconds=30), "source": "test"})
+    response = client.post("/api/trading/paper/execute", json=order(quote_token=token), headers=auth())
+    assert response.status_code == 200, response.text
+    assert response.json()["quote_snapshot"] is False
+    assert "refetch" in response.json()["latency_ms"]
+
+
+def test_gate_rejection_is_400(client):
+    response = client.post("/api/trading/execute", json=order(ai_confidence=0.1), headers=auth())
+    assert response.status_code == 400
+    assert "Gate 9" in response.json()["detail"]
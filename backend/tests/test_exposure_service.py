@@ -0,0 +1,83 @@
+"""Tests for the in-memory portfolio exposure service."""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Portfolio, Trade, User
+from app.services.exposure_service import ExposureService
+from app.services.trading_engine import TradingEngine
+from app.utils.validators import ValidationGates
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(id=1, email="a@example.com", password_hash="x"))
+    db.add(Portfolio(id=1, user_id=1, name="main", starting_capital=10000, current_equity=10000, cash_balance=10000))
+    db.commit()
+    db.close()
+    return factory
+
+
+def add_trade(db, symbol, price, quantity, status="OPEN"):
+    db.add(Trade(portfolio_id=1, symbol=symbol, direction="BUY", entry_price=price,
+                 stop_loss=price * 0.98, take_profit=price * 1.04, quantity=quantity, status=status))
+
+
+def test_rebuild_from_open_trades(session_factory):
+    db = session_factory()
+    add_trade(db, "AAPL", 100, 20)
+    add_trade(db, "AAPL", 110, 10)
+    add_trade(db, "MSFT", 400, 5)
+    add_trade(db, "TSLA", 200, 50, status="CLOSED")
+    db.commit()
+    db.close()
+
+    service = ExposureService(session_factory)
+    service.rebuild()
+    snapshot = service.snapshot(1)
+    assert snapshot["equity"] == 10000
+    assert snapshot["gross_notional"] == 5100
+    assert snapshot["symbols"]["AAPL"] == {"notional": 3100, "pct": 0.31}
+    assert "TSLA" not in snapshot["symbols"]
+
+
+def test_gate_inputs_drive_gate_7():
+    service = ExposureService()
+    service.on_open(1, "AAPL", 4000)
+    gates = ValidationGates()
+
+    inputs = service.gate_inputs(1, "AAPL", 1500, equity=10000)
+    assert inputs == {"current_exposure": 0.4, "trade_size": 0.15}
+    assert not gates.gate_7_portfolio_exposure(inputs).passed
+    assert gates.gate_7_portfolio_exposure(service.gate_inputs(1, "MSFT", 1500, equity=10000)).passed
+
+    service.on_close(1, "AAPL", 4000)
+    assert service.gate_inputs(1, "AAPL", 1500, equity=10000)["current_exposure"] == 0
+    assert service.snapshot(1)["symbols"] == {}
+
+
+def test_engine_updates_exposure_on_execute_and_close(session_factory):
+    service = ExposureService(session_factory)
+    db = session_factory()
+    engine = TradingEngine(db)
+    engine.exposure = service
+
+    signal = {"symbol": "NVDA", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0,
+              "take_profit": 104.0, "ai_confidence": 0.8, "reasoning": "", "validation_gates": {}}
+    trade = engine.execute_trade(1, signal, 30)
+    assert service.snapshot(1, 10000)["symbols"]["NVDA"]["notional"] == 3000
+
+    engine.close_trade(trade.id, 105.0, "target")
+    assert service.snapshot(1, 10000)["symbols"] == {}
+    db.close()
@@ -0,0 +1,86 @@
+"""Tests for the cost-ordered gate pipeline."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from app.services.trading_engine import TradingEngine
+from app.utils.gate_pipeline import DIAGNOSTIC, FAST, GatePipeline
+from app.utils.validators import ValidationGates
+
+NOW = datetime(2024, 3, 28, 15, 0, 0)
+
+
+def good_signal(**overrides):
+    data = {
+        "quote_timestamp": NOW - timedelta(seconds=5),
+        "current_price": 100.0,
+        "entry_price": 100.0,
+        "prev_close": 99.0,
+        "high": 101.0,
+        "low": 99.0,
+        "volume": 1_000_000,
+        "vix": 15,
+        "market_open": True,
+        "stop_loss": 98.0,
+        "take_profit": 104.0,
+        "timeframe": "day",
+        "current_exposure": 0.1,
+        "trade_size": 0.05,
+        "buy_volume": 600,
+        "sell_volume": 400,
+        "direction": "BUY",
+        "ai_confidence": 0.8,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_fast_mode_stops_at_first_failure():
+    pipeline = GatePipeline()
+    run = pipeline.run(good_signal(volume=10), FAST, now=NOW)
+    assert not run.passed
+    assert run.order[-1] == 3
+    assert run.skipped == list(range(4, 11))
+    assert run.failure_message().startswith("Gate 3:")
+
+
+def test_diagnostic_mode_matches_validate_all_gates():
+    data = good_signal(volume=10, vix=60, ai_confidence=0.1)
+    run = GatePipeline().run(data, DIAGNOSTIC, now=NOW)
+    passed, results = ValidationGates().validate_all_gates(data, NOW)
+    assert run.passed == passed
+    assert run.results == results
+    assert list(run.results) == [f"gate_{g}" for g in range(1, 11)]
+
+
+def test_reorder_moves_frequent_rejector_first():
+    pipeline = GatePipeline(reorder_every=50)
+    for _ in range(50):
+        pipeline.run(good_signal(ai_confidence=0.1), FAST, now=NOW)
+    assert pipeline.order[0] == 9
+
+    stats = pipeline.get_stats()
+    assert stats["runs"] == 50
+    assert stats["gates"]["gate_9"]["rejection_rate"] == 1.0
+
+    pipeline.reset_stats()
+    assert pipeline.order == list(range(1, 11))
+
+
+def test_engine_evaluates_gates_once_per_signal():
+    engine = TradingEngine(MagicMock())
+    engine.pipeline = GatePipeline()
+    calls = []
+    run_gate = engine.pipeline.validators.run_gate
+
+    def counting_run_gate(gate, data, now=None):
+        calls.append(gate)
+        return run_gate(gate, data, now)
+
+    engine.pipeline.validators.run_gate = counting_run_gate
+    signal, gate_run, rejection = engine.evaluate_trade_signal(
+        "AAPL", "BUY", good_signal(quote_timestamp=datetime.utcnow(), vix=80), mode=DIAGNOSTIC
+    )
+    assert signal is None
+    assert "Gate 4" in rejection
+    assert sorted(calls) == list(range(1, 11))
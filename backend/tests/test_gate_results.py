@@ -0,0 +1,79 @@
+"""Tests for compact gate results and lazy reason rendering."""
+
+import json
+from datetime import datetime, timedelta
+
+from app.utils.gate_results import (
+    GateResult, ReasonCode, pack_gate_results, render_gate_results, unpack_gate_results
+)
+from app.utils.validators import ValidationGates
+
+NOW = datetime(2024, 3, 30, 15, 0, 0)  # Saturday
+
+
+def signal(**overrides):
+    data = {
+        "quote_timestamp": NOW - timedelta(seconds=5),
+        "current_price": 100.0,
+        "entry_price": 104.0,
+        "prev_close": 99.0,
+        "volume": 50_000,
+        "vix": 45,
+        "stop_loss": 98.0,
+        "take_profit": 104.0,
+        "timeframe": "day",
+        "current_exposure": 0.45,
+        "trade_size": 0.1,
+        "buy_volume": 300,
+        "sell_volume": 700,
+        "direction": "BUY",
+        "ai_confidence": 0.1,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_reasons_render_as_before():
+    _, results = ValidationGates().validate_all_gates(signal(), NOW)
+    reasons = {key: result.reason for key, result in results.items()}
+    assert reasons == {
+        "gate_1": "Quote fresh: 5.0s old",
+        "gate_2": "Entry deviation 3.85% too high",
+        "gate_3": "Low volume: 50000",
+        "gate_4": "VIX too high: 45",
+        "gate_5": "Market closed, next open 2024-04-01 13:30 UTC",
+        "gate_6": "R:R 0.00 below minimum 1.5",
+        "gate_7": "Total exposure 55.0% exceeds limit",
+        "gate_8": "Sell pressure dominant: 70.0%",
+        "gate_9": "AI confidence 10.0% below threshold",
+        "gate_10": "Correlated exposure within limits: 0.0%",
+    }
+    assert results["gate_3"]["reason"] == "Low volume: 50000"
+    assert results["gate_3"]["passed"] is False
+
+
+def test_pack_round_trip():
+    _, results = ValidationGates().validate_all_gates(signal(volume=2_000_000), NOW)
+    packed = pack_gate_results(results)
+    assert packed["mask"] == 0b1000000101  # gates 1, 3 and 10 passed
+    assert packed["ran"] == 0b1111111111
+
+    restored = unpack_gate_results(json.loads(json.dumps(packed)))
+    assert render_gate_results(restored) == render_gate_results(results)
+    assert restored["gate_5"].code == ReasonCode.MARKET_CLOSED_UNTIL
+
+
+def test_packed_form_is_smaller_than_verbose():
+    _, results = ValidationGates().validate_all_gates(signal(), NOW)
+    verbose = json.dumps(render_gate_results(results))
+    packed = json.dumps(pack_gate_results(results))
+    assert len(packed) < len(verbose) / 2
+
+
+def test_partial_runs_and_legacy_rows():
+    packed = pack_gate_results({"gate_3": GateResult(3, False, ReasonCode.LOW_VOLUME, 10, 100000)})
+    assert list(unpack_gate_results(packed)) == ["gate_3"]
+
+    legacy = {"gate_1": {"passed": True, "reason": "Quote fresh: 1s old", "gate": 1}}
+    assert render_gate_results(legacy) == legacy
+    assert render_gate_results(None) == {}
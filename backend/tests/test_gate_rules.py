@@ -0,0 +1,85 @@
+"""Tests for configurable gate rule sets."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import Portfolio
+from app.services.execution_service import portfolio_validators
+from app.utils.gate_rules import GateRuleCache, InvalidGateRules, compile_rule_set, default_rules
+from app.utils.validators import BatchValidationGates, ValidationGates
+
+NOW = datetime(2024, 3, 28, 15, 0, 0)
+
+
+def signal(**overrides):
+    data = {
+        "quote_timestamp": NOW - timedelta(seconds=5),
+        "current_price": 100.0,
+        "entry_price": 100.0,
+        "prev_close": 99.0,
+        "volume": 200_000,
+        "vix": 35,
+        "market_open": True,
+        "stop_loss": 98.0,
+        "take_profit": 104.0,
+        "timeframe": "day",
+        "current_exposure": 0.2,
+        "trade_size": 0.1,
+        "direction": "BUY",
+        "ai_confidence": 0.4,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_defaults_match_built_in_thresholds():
+    assert compile_rule_set(None).validate_all_gates(signal(), NOW)[0]
+    assert default_rules()["min_volume"] == ValidationGates.MIN_VOLUME
+
+
+def test_rule_set_overrides_thresholds():
+    strict = compile_rule_set({"min_volume": 500000, "max_vix": 30, "max_exposure": 0.25})
+    passed, results = strict.validate_all_gates(signal(), NOW)
+    assert not passed
+    assert [g for g, r in results.items() if not r.passed] == ["gate_3", "gate_4", "gate_7"]
+    assert results["gate_3"].limit == 500000
+
+    batch = BatchValidationGates(strict).evaluate({k: [v] for k, v in signal().items()}, NOW)
+    assert batch.masks[:, 0].tolist() == [r.passed for r in results.values()]
+
+
+@pytest.mark.parametrize("rules", [
+    {"min_volumes": 1},
+    {"max_vix": "high"},
+    {"max_exposure": 2},
+    {"min_buy_ratio": 0.6, "max_buy_ratio": 0.5},
+])
+def test_invalid_rules_rejected(rules):
+    with pytest.raises(ValueError):
+        compile_rule_set(rules)
+
+
+def test_cache_compiles_once_per_change():
+    cache = GateRuleCache(max_size=2)
+    rules = {"max_vix": 30}
+    first = cache.get(1, rules)
+    assert cache.get(1, dict(rules)) is first
+    assert cache.get(2, None) is cache.default
+    assert cache.compiles == 1
+
+    changed = cache.get(1, {"max_vix": 25})
+    assert changed is not first and changed.MAX_VIX == 25
+    assert cache.compiles == 2
+
+
+def test_corrupted_rules_fail_closed():
+    cache = GateRuleCache()
+    with pytest.raises(InvalidGateRules, match="portfolio 3"):
+        cache.get(3, {"foo": 1})
+
+    # The order is rejected rather than gated on the defaults
+    with pytest.raises(HTTPException) as rejected:
+        portfolio_validators(Portfolio(id=3, gate_rules={"max_vix": 500}))
+    assert rejected.value.status_code == 409 and "max_vix" in rejected.value.detail
@@ -0,0 +1,187 @@
+"""Tests for Idempotency-Key handling on order execution."""
+
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.main import app
+from app.models import Trade
+from app.routes.auth import create_access_token
+from app.services.idempotency_store import IdempotencyStore, idempotency_store
+from app.services.market_data_service import market_data_service
+from app.utils.market_calendar import market_calendar
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_completed_result_is_replayed():
+    store = IdempotencyStore()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        return {"trade_id": len(calls)}
+
+    async def run():
+        first = await store.run("k", "fp", execute)
+        second = await store.run("k", "fp", execute)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ({"trade_id": 1}, False)
+    assert second == ({"trade_id": 1}, True)
+    assert len(calls) == 1
+
+
+def test_retry_waits_for_in_flight_original():
+    store = IdempotencyStore()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "filled"
+
+    async def run():
+        return await asyncio.gather(*(store.run("k", "fp", execute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    assert all(result == "filled" for result, _ in results)
+
+
+def test_deterministic_rejections_replay_and_transient_ones_do_not():
+    store = IdempotencyStore()
+    calls = []
+
+    def failing(code):
+        async def execute():
+            calls.append(code)
+            raise HTTPException(status_code=code, detail=f"failed {len(calls)}")
+        return execute
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(HTTPException) as rejected:
+                await store.run("not-found", "fp", failing(404))
+            assert rejected.value.detail == "failed 1"
+        # Gate / quote rejections (market closed, stale quote) may clear on a retry
+        for code in (400, 400, 409, 503, 503):
+            with pytest.raises(HTTPException):
+                await store.run(f"transient-{code}", "fp", failing(code))
+
+    asyncio.run(run())
+    assert calls == [404, 400, 400, 409, 503, 503]
+    assert list(store._entries) == ["not-found"]
+
+
+def test_key_reused_with_different_body_is_rejected():
+    store = IdempotencyStore()
+
+    async def execute():
+        return "ok"
+
+    async def run():
+        await store.run("k", "fp-1", execute)
+        await store.run("k", "fp-2", execute)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(run())
+    assert exc.value.status_code == 422
+
+
+def test_store_is_bounded_and_expires():
+    clock = Clock()
+    store = IdempotencyStore(max_keys=3, ttl_seconds=60, clock=clock)
+
+    async def execute():
+        return clock.now
+
+    async def run():
+        for key in "abcd":
+            await store.run(key, "fp", execute)
+        assert list(store._entries) == ["b", "c", "d"]
+
+        clock.now = 61
+        result, replayed = await store.run("b", "fp", execute)
+        assert (result, replayed) == (61, False)
+        assert list(store._entries) == ["b"]
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def client_db(trading_db, serve_db, monkeypatch):
+    factory = trading_db(capital=100000, threaded=True)
+    serve_db(factory)
+
+    quotes = []
+
+    async def fake_quote(symbol, priority=None):
+        quotes.append(symbol)
+        await asyncio.sleep(0.01)
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    monkeypatch.setattr(market_data_service, "get_quote", fake_quote)
+    monkeypatch.setattr(market_calendar, "is_open", lambda *args: True)
+    monkeypatch.setattr(idempotency_store, "_entries", OrderedDict())
+    return factory, quotes
+
+
+ORDER = {"portfolio_id": 1, "symbol": "AAPL", "direction": "BUY", "entry_price": 100.0,
+         "stop_loss": 98.0, "take_profit": 104.0, "quantity": 10, "ai_confidence": 0.8}
+
+
+async def post(requests):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post(path, json=body, headers={**headers, **extra}) for path, body, extra in requests
+        ))
+
+
+def test_retried_order_executes_once(client_db):
+    factory, quotes = client_db
+    key = {"Idempotency-Key": "order-1"}
+    responses = asyncio.run(post([("/api/trading/execute", ORDER, key)] * 5))
+    (retry,) = asyncio.run(post([("/api/trading/execute", ORDER, key)]))
+
+    assert all(r.status_code == 200 for r in responses + [retry])
+    assert len({r.json()["id"] for r in responses + [retry]}) == 1
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 4
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert quotes == ["AAPL"]
+
+    db = factory()
+    try:
+        assert db.query(Trade).count() == 1
+    finally:
+        db.close()
+
+
+def test_keys_are_scoped_per_endpoint(client_db):
+    factory, _ = client_db
+    key = {"Idempotency-Key": "order-1"}
+    responses = asyncio.run(post([
+        ("/api/trading/execute", ORDER, key),
+        ("/api/trading/paper/execute", ORDER, key),
+        ("/api/trading/execute", ORDER, {}),
+    ]))
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.json()["id"] for r in responses}) == 3
+
+    (reused,) = asyncio.run(post([("/api/trading/execute", {**ORDER, "quantity": 20}, key)]))
+    assert reused.status_code == 422
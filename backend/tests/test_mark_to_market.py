@@ -0,0 +1,150 @@
+"""Tests for the mark-to-market equity engine."""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models import Portfolio
+from app.services.mark_to_market import MarkToMarket
+from app.services.trading_engine import TradingEngine
+
+
+def test_equity_is_cash_plus_marked_positions():
+    marks = MarkToMarket()
+    # Long 10 @ 100 and short 5 @ 50 out of 10,000
+    marks.apply(1, "AAPL", 10, 100.0, 9000.0)
+    marks.apply(1, "MSFT", -5, 50.0, 9250.0)
+    marks.apply(2, "AAPL", 4, 90.0, 640.0)
+    # Unpriced symbols are marked at entry
+    assert marks.equity_for(1) == pytest.approx(10000.0)
+    assert marks.equity_for(2) == pytest.approx(1000.0)
+
+    assert marks.update_prices({"AAPL": 110.0, "MSFT": 40.0})
+    assert marks.equity_for(1) == pytest.approx(9250.0 + 10 * 110.0 - 5 * 40.0)
+    assert marks.equity_for(2) == pytest.approx(640.0 + 4 * 110.0)
+    assert marks.equity_for(3, default=123.0) == 123.0
+
+    # Unchanged and unheld prices do not revalue
+    revaluations = marks.revaluations
+    assert not marks.update_prices({"AAPL": 110.0, "TSLA": 200.0})
+    assert marks.revaluations == revaluations and marks.price("TSLA") is None
+
+
+def test_fills_replace_the_position_row():
+    marks = MarkToMarket()
+    marks.apply(1, "AAPL", 10, 100.0, 9000.0)
+    marks.on_price("AAPL", 120.0)
+    # Closed at 120: flat, and the gain is now in cash
+    marks.apply(1, "AAPL", 0, 100.0, 10200.0)
+    assert marks.equity_for(1) == pytest.approx(10200.0)
+    marks.on_price("AAPL", 80.0)
+    assert marks.equity_for(1) == pytest.approx(10200.0)
+    assert marks.stats()["open_positions"] == 0
+
+
+def test_matches_per_portfolio_loop():
+    rng = random.Random(3)
+    marks = MarkToMarket()
+    symbols = [f"S{i}" for i in range(40)]
+    cash, positions = {}, {}
+    for portfolio_id in range(300):
+        cash[portfolio_id] = rng.uniform(1000, 50000)
+        positions[portfolio_id] = {symbol: (rng.randint(-50, 50), rng.uniform(10, 500))
+                                   for symbol in rng.sample(symbols, 5)}
+        for symbol, (quantity, entry) in positions[portfolio_id].items():
+            marks.apply(portfolio_id, symbol, quantity, entry, cash[portfolio_id])
+    prices = {symbol: rng.uniform(10, 500) for symbol in symbols[:30]}
+    marks.update_prices(prices)
+
+    for portfolio_id in range(300):
+        expected = cash[portfolio_id] + sum(quantity * prices.get(symbol, entry)
+                                            for symbol, (quantity, entry) in positions[portfolio_id].items())
+        assert marks.equity_for(portfolio_id) == pytest.approx(expected)
+
+
+def test_revalues_thousands_of_portfolios_in_milliseconds():
+    rng = random.Random(5)
+    marks = MarkToMarket()
+    marks.load(
+        [(portfolio_id, 10000.0, None) for portfolio_id in range(5000)],
+        [(portfolio_id, f"S{rng.randrange(500)}", rng.randint(-100, 100), 100.0)
+         for portfolio_id in range(5000) for _ in range(10)]
+    )
+    started = time.perf_counter()
+    for tick in range(100):
+        marks.on_price(f"S{tick % 500}", 100.0 + tick)
+    per_tick = (time.perf_counter() - started) / 100
+    assert per_tick < 0.02, f"{per_tick * 1000:.2f}ms per tick"
+
+
+@pytest.fixture
+def factory(trading_db):
+    return trading_db(portfolios=[
+        Portfolio(id=1, user_id=1, name="main", starting_capital=10000, current_equity=10000, cash_balance=10000),
+        Portfolio(id=2, user_id=1, name="idle", starting_capital=5000, current_equity=5000, cash_balance=5000),
+    ])
+
+
+def signal(direction, entry_price):
+    sign = 1 if direction == "BUY" else -1
+    return {"symbol": "AAPL", "direction": direction, "entry_price": entry_price,
+            "stop_loss": entry_price - sign * 5, "take_profit": entry_price + sign * 10,
+            "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+
+
+def test_trading_engine_feeds_fills_and_persist_writes_equity(factory):
+    marks = MarkToMarket(session_factory=factory, persist_seconds=0)
+    marks.rebuild()
+    db = factory()
+    engine = TradingEngine(db)
+    engine.marks = marks
+    trade = engine.execute_trade(1, signal("BUY", 100.0), 10)
+    assert marks.equity_for(1) == pytest.approx(10000.0)
+
+    marks.on_price("AAPL", 104.0)
+    assert marks.equity_for(1) == pytest.approx(10040.0)
+    version = db.get(Portfolio, 1).version_id
+    # Only the portfolio whose equity moved is written, without a version bump
+    assert marks.persist() == 1 and marks.persist() == 0
+    db.expire_all()
+    portfolio = db.get(Portfolio, 1)
+    assert (portfolio.current_equity, portfolio.version_id) == (pytest.approx(10040.0), version)
+
+    engine.close_trade(trade.id, 106.0, "manual")
+    marks.on_price("AAPL", 90.0)
+    assert marks.equity_for(1) == pytest.approx(10060.0)
+    db.close()
+
+    reloaded = MarkToMarket(session_factory=factory, persist_seconds=0)
+    reloaded.rebuild()
+    assert reloaded.equity_for(1) == pytest.approx(10060.0)
+    assert reloaded.equity_for(2) == pytest.approx(5000.0)
+
+
+def test_open_position_survives_restart_marked_at_entry(factory):
+    marks = MarkToMarket(session_factory=factory, persist_seconds=0)
+    db = factory()
+    engine = TradingEngine(db)
+    engine.marks = marks
+    engine.execute_trade(1, signal("SELL", 50.0), 20)
+    db.close()
+
+    reloaded = MarkToMarket(session_factory=factory, persist_seconds=0)
+    reloaded.rebuild()
+    assert reloaded.equity_for(1) == pytest.approx(10000.0)
+    reloaded.on_price("AAPL", 45.0)
+    assert reloaded.equity_for(1) == pytest.approx(10100.0)
+
+    async def run():
+        await reloaded.start()
+        await reloaded.stop()
+
+    asyncio.run(run())
+    db = factory()
+    try:
+        assert db.get(Portfolio, 1).current_equity == pytest.approx(10100.0)
+    finally:
+        db.close()
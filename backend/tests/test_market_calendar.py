@@ -0,0 +1,78 @@
+"""Tests for the precomputed exchange calendar and gate 5."""
+
+from datetime import date, datetime
+
+import numpy as np
+
+from app.utils import market_calendar as calendar_module
+from app.utils.market_calendar import ExchangeCalendar, exchange_holidays, market_calendar
+from app.utils.validators import ValidationGates
+
+
+class TestExchangeCalendar:
+    """Test session lookups (all datetimes are naive UTC)."""
+
+    def test_regular_session(self):
+        # 2024-03-28 10:00 EDT
+        assert market_calendar.is_open(datetime(2024, 3, 28, 14, 0))
+        # Before the open and after the close
+        assert not market_calendar.is_open(datetime(2024, 3, 28, 13, 29))
+        assert not market_calendar.is_open(datetime(2024, 3, 28, 20, 0))
+
+    def test_holidays(self):
+        holidays = exchange_holidays(2024)
+        assert date(2024, 3, 29) in holidays      # Good Friday
+        assert date(2024, 6, 19) in holidays      # Juneteenth
+        assert date(2024, 11, 28) in holidays     # Thanksgiving
+        assert not market_calendar.is_open(datetime(2024, 12, 25, 15, 0))
+        assert not market_calendar.is_open(datetime(2025, 1, 9, 15, 0))
+
+    def test_observed_holidays(self):
+        # Independence Day 2026 is a Saturday -> observed Friday July 3
+        assert date(2026, 7, 3) in exchange_holidays(2026)
+        # New Year's Day 2022 was a Saturday -> no observed holiday on Dec 31, 2021
+        assert market_calendar.is_open(datetime(2021, 12, 31, 15, 0))
+
+    def test_early_close(self):
+        # 2024-07-03 closes at 13:00 EDT (17:00 UTC)
+        assert market_calendar.is_open(datetime(2024, 7, 3, 16, 59))
+        assert not market_calendar.is_open(datetime(2024, 7, 3, 17, 1))
+        assert market_calendar.is_early_close(date(2024, 11, 29))
+        assert market_calendar.session_at(datetime(2024, 12, 24, 15, 0))[1] == datetime(2024, 12, 24, 18, 0)
+
+    def test_next_open_over_weekend_and_holiday(self):
+        # Thursday before Good Friday 2024, after the close -> Monday 13:30 UTC
+        assert market_calendar.next_open(datetime(2024, 3, 28, 21, 0)) == datetime(2024, 4, 1, 13, 30)
+        # Winter (EST) open is 14:30 UTC
+        assert market_calendar.next_open(datetime(2024, 1, 5, 22, 0)) == datetime(2024, 1, 8, 14, 30)
+
+    def test_sessions_between(self):
+        sessions = market_calendar.sessions_between(datetime(2024, 3, 27), datetime(2024, 4, 2))
+        assert [s[0].date() for s in sessions] == [date(2024, 3, 27), date(2024, 3, 28), date(2024, 4, 1)]
+
+    def test_is_open_many_matches_scalar(self):
+        start = datetime(2024, 7, 1).timestamp()
+        epochs = start + np.arange(0, 7 * 86400, 900)
+        expected = [market_calendar.is_open(float(t)) for t in epochs]
+        assert market_calendar.is_open_many(epochs).tolist() == expected
+
+    def test_custom_year_range(self):
+        cal = ExchangeCalendar(2024, 2024)
+        assert len(cal.opens) == 252
+        assert list(cal.opens) == sorted(cal.opens)
+
+
+class TestGate5MarketHours:
+    """Test gate 5 uses the calendar when no flag is given."""
+
+    def test_explicit_flag_wins(self):
+        gates = ValidationGates()
+        assert gates.gate_5_market_hours({"market_open": True})["passed"]
+        assert not gates.gate_5_market_hours({"market_open": False})["passed"]
+
+    def test_falls_back_to_calendar(self, monkeypatch):
+        gates = ValidationGates()
+        monkeypatch.setattr(calendar_module.market_calendar, "is_open", lambda ts=None: False)
+        result = gates.gate_5_market_hours({})
+        assert not result["passed"]
+        assert result["reason"].startswith("Market closed")
@@ -0,0 +1,150 @@
+"""Tests for the paper-trading fill simulator."""
+
+import asyncio
+import random
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app.main import app
+from app.models import ActivityLog, Portfolio, Position, Trade
+from app.routes.auth import create_access_token
+from app.services import execution_service
+from app.services.market_data_service import market_data_service
+from app.services.paper_fill_simulator import FillModel, PaperFillSimulator
+from app.services.trading_engine import PENDING, TradingEngine
+from app.utils.market_calendar import market_calendar
+
+QUOTE = {"symbol": "AAPL", "current_price": 100.0, "high": 102.0, "low": 98.0, "prev_close": 99.5}
+
+
+def test_slippage_is_adverse_and_grows_with_size_and_volatility():
+    model = FillModel(latency_ms=0, spread_bps=10.0, impact_coefficient=0.1, depth_shares=1000, rng=random.Random(1))
+    (buy,) = model.simulate("BUY", 100, 100.0, QUOTE)
+    (sell,) = model.simulate("SELL", 100, 100.0, QUOTE)
+    # Half the 10bp spread plus 0.1 * 4% * sqrt(100 / 1000)
+    slippage = 0.0005 + 0.1 * 0.04 * (0.1 ** 0.5)
+    assert buy.price == pytest.approx(100.0 * (1 + slippage), abs=1e-4)
+    assert sell.price == pytest.approx(100.0 * (1 - slippage), abs=1e-4)
+
+    (larger,) = model.simulate("BUY", 400, 100.0, QUOTE)
+    (calmer,) = model.simulate("BUY", 100, 100.0, {**QUOTE, "high": 100.5, "low": 99.5})
+    assert larger.price > buy.price > calmer.price > 100.0
+
+
+def test_quoted_spread_overrides_default():
+    model = FillModel(latency_ms=0, impact_coefficient=0.0, rng=random.Random(1))
+    (fill,) = model.simulate("BUY", 10, 100.0, {"bid": 99.9, "ask": 100.1})
+    assert fill.price == pytest.approx(100.1)
+
+
+def test_large_orders_fill_partially_over_slices():
+    model = FillModel(latency_ms=50.0, depth_shares=100, max_slices=3, rng=random.Random(2))
+    slices = model.simulate("BUY", 1000, 100.0, QUOTE)
+    assert len(slices) == 3
+    assert all(50 <= piece.quantity <= 100 for piece in slices)
+    assert sum(piece.quantity for piece in slices) < 1000
+    delays = [piece.delay for piece in slices]
+    assert delays == sorted(delays) and delays[0] > 0
+
+    (small,) = model.simulate("SELL", 20, 100.0, QUOTE)
+    assert small.quantity == 20
+
+
+def test_fill_pending_opens_at_volume_weighted_price(trading_db):
+    db = trading_db(threaded=True)()
+    signal = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0, "take_profit": 104.0,
+              "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+    trade = TradingEngine(db).execute_trade(1, signal, 30, paper_trading=True, pending=True)
+    assert trade.status == PENDING
+    assert db.query(Position).count() == 0 and db.get(Portfolio, 1).cash_balance == 10000
+    # Not open yet, so it cannot be closed
+    assert TradingEngine(db).close_trade(trade.id, 101.0, "manual") is None
+
+    filled = TradingEngine(db).fill_pending(trade.id, [(10, 100.1), (10, 100.4)], {"requested_quantity": 30})
+    assert (filled.status, filled.quantity) == ("OPEN", 20)
+    assert filled.entry_price == pytest.approx(100.25)
+    # Paper fills never touch the live positions or cash
+    assert db.query(Position).count() == 0 and db.get(Portfolio, 1).cash_balance == 10000
+    assert TradingEngine(db).fill_pending(trade.id, [(10, 100.0)]) is None
+    db.close()
+
+
+@pytest.fixture
+def client_db(trading_db, serve_db, monkeypatch):
+    factory = trading_db(capital=100000, threaded=True)
+    serve_db(factory)
+
+    async def fake_quote(symbol, priority=None):
+        return {**QUOTE, "symbol": symbol, "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    simulator = PaperFillSimulator(
+        FillModel(latency_ms=5.0, depth_shares=4, max_slices=2, rng=random.Random(3)),
+        session_factory=factory,
+        workers=1
+    )
+    monkeypatch.setattr(execution_service, "paper_fill_simulator", simulator)
+    monkeypatch.setattr(market_data_service, "get_quote", fake_quote)
+    monkeypatch.setattr(market_calendar, "is_open", lambda *args: True)
+    return factory, simulator
+
+
+ORDER = {"portfolio_id": 1, "symbol": "AAPL", "direction": "BUY", "entry_price": 100.0,
+         "stop_loss": 98.0, "take_profit": 104.0, "quantity": 10, "ai_confidence": 0.8}
+
+
+def test_paper_order_returns_pending_and_fills_off_the_request_path(client_db):
+    factory, simulator = client_db
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+
+    async def run():
+        await simulator.start()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/api/trading/paper/execute", json=ORDER, headers=headers)
+            await simulator.drain()
+            return response
+        finally:
+            await simulator.stop()
+
+    response = asyncio.run(run())
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == PENDING
+
+    db = factory()
+    try:
+        trade = db.get(Trade, response.json()["id"])
+        # Depth 4 over 2 slices: between 4 and 8 of the 10 shares
+        assert trade.status == "OPEN" and 4 <= trade.quantity <= 8
+        assert trade.entry_price > 100.0
+        log = db.query(ActivityLog).filter_by(trade_id=trade.id, event_type="FILLED").one()
+        assert log.details["requested_quantity"] == 10
+        assert sum(piece["quantity"] for piece in log.details["slices"]) == trade.quantity
+        assert simulator.stats()["partial"] == 1
+    finally:
+        db.close()
+
+
+def test_pending_trades_resume_after_restart(client_db):
+    factory, simulator = client_db
+    db = factory()
+    db.add(Trade(id=5, portfolio_id=1, symbol="MSFT", direction="SELL", entry_price=50.0, stop_loss=52.0,
+                 take_profit=45.0, quantity=3, status=PENDING, paper_trading="paper"))
+    db.commit()
+    db.close()
+
+    async def run():
+        await simulator.start()
+        await simulator.drain()
+        await simulator.stop()
+
+    asyncio.run(run())
+    db = factory()
+    try:
+        trade = db.get(Trade, 5)
+        assert (trade.status, trade.quantity) == ("OPEN", 3)
+        assert trade.entry_price < 50.0
+    finally:
+        db.close()
@@ -0,0 +1,252 @@
+"""Tests for the resting paper order book."""
+
+import asyncio
+import random
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.main import app
+from app.models import Trade
+from app.routes.auth import create_access_token
+from app.services.market_data_service import market_data_service
+from app.services.paper_fill_simulator import FillModel, paper_fill_simulator
+from app.services.paper_order_book import LIMIT, STOP, OrderBook, RestingOrder
+from app.services.trading_engine import TradingEngine
+from app.utils.market_calendar import market_calendar
+
+
+def order(order_id, direction, entry_type, price, quantity=10, symbol="AAPL"):
+    return RestingOrder(order_id, 1, symbol, direction, entry_type, price, quantity)
+
+
+def ids(matches):
+    return [match.order.id for match in matches]
+
+
+def test_price_time_priority():
+    book = OrderBook()
+    for row in [(1, "BUY", LIMIT, 99.0), (2, "BUY", LIMIT, 100.0), (3, "BUY", LIMIT, 100.0), (4, "SELL", LIMIT, 101.0)]:
+        book.add(order(*row))
+    # Best price first, then arrival order; the 99 bid and the offer are not crossed
+    matches = book.on_price("AAPL", 99.5)
+    assert ids(matches) == [2, 3]
+    assert [match.price for match in matches] == [99.5, 99.5]
+    assert ids(book.on_price("AAPL", 98.0)) == [1]
+    # A SELL LIMIT fills at its limit or better
+    assert [(m.order.id, m.price) for m in book.on_price("AAPL", 102.5)] == [(4, 102.5)]
+    assert len(book) == 0
+
+
+def test_stops_trigger_through_their_level():
+    book = OrderBook()
+    book.add(order(1, "BUY", STOP, 105.0))
+    book.add(order(2, "SELL", STOP, 95.0))
+    book.add(order(3, "SELL", STOP, 97.0))
+    assert book.on_price("AAPL", 104.9) == []
+    assert [(m.order.id, m.price) for m in book.on_price("AAPL", 105.5)] == [(1, 105.5)]
+    assert ids(book.on_price("AAPL", 94.0)) == [3, 2]
+
+
+def test_depth_per_tick_keeps_strict_priority():
+    book = OrderBook(depth_per_tick=100)
+    book.add(order(1, "BUY", LIMIT, 100.0, quantity=60))
+    book.add(order(2, "BUY", LIMIT, 100.0, quantity=60))
+    book.add(order(3, "BUY", LIMIT, 100.0, quantity=10))
+    book.add(order(4, "SELL", LIMIT, 90.0, quantity=500))
+    # 2 does not fit behind 1, and 3 may not jump it; the other side has its own depth
+    assert ids(book.on_price("AAPL", 99.0)) == [1, 4]
+    assert ids(book.on_price("AAPL", 99.0)) == [2, 3]
+
+
+def test_cancel_and_marketable_orders():
+    book = OrderBook()
+    sink = []
+    book.sink = sink.extend
+    book.add(order(1, "BUY", LIMIT, 100.0))
+    book.add(order(2, "BUY", LIMIT, 100.0))
+    assert book.cancel(1) and not book.cancel(1)
+    assert ids(book.on_price("AAPL", 100.0)) == [2]
+    # Already crossed by the last price: matched without resting
+    match = book.add(order(3, "SELL", LIMIT, 99.0), last_price=99.5)
+    assert (match.order.id, match.price) == (3, 99.5) and 3 not in book
+    assert ids(sink) == [2, 3]
+
+
+def test_each_tick_only_touches_crossed_orders():
+    rng = random.Random(4)
+    book = OrderBook()
+    book.load([order(i, "BUY", LIMIT, rng.uniform(50, 99), quantity=1) for i in range(20000)])
+    entries = book.stats()["heap_entries"]
+    matches = book.on_price("AAPL", 98.9)
+    assert matches and all(match.order.price >= 98.9 for match in matches)
+    assert book.stats()["heap_entries"] == entries - len(matches)
+
+
+def test_matches_brute_force_replay():
+    rng = random.Random(9)
+    book = OrderBook()
+    resting = {}
+    for order_id in range(2000):
+        entry = order(order_id, rng.choice(["BUY", "SELL"]), rng.choice([LIMIT, STOP]), rng.uniform(90, 110),
+                      symbol=rng.choice(["AAPL", "MSFT"]))
+        book.add(entry)
+        resting[order_id] = entry
+    for order_id in rng.sample(sorted(resting), 300):
+        book.cancel(order_id)
+        del resting[order_id]
+
+    price = {"AAPL": 100.0, "MSFT": 100.0}
+    for _ in range(500):
+        symbol = rng.choice(["AAPL", "MSFT"])
+        price[symbol] += rng.gauss(0, 0.8)
+        expected = {order_id for order_id, entry in resting.items()
+                    if entry.symbol == symbol and entry.crossed(price[symbol])}
+        matched = ids(book.on_price(symbol, price[symbol]))
+        assert set(matched) == expected
+        for order_id in matched:
+            del resting[order_id]
+    assert len(book) == len(resting)
+
+
+@pytest.fixture
+def client_db(trading_db, serve_db, monkeypatch):
+    factory = trading_db(capital=100000, threaded=True)
+    serve_db(factory)
+
+    async def fake_quote(symbol, priority=None):
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "timestamp": datetime.utcnow(), "source": "test"}
+
+    monkeypatch.setattr(paper_fill_simulator, "session_factory", factory)
+    monkeypatch.setattr(paper_fill_simulator, "model", FillModel(latency_ms=1.0, rng=random.Random(5)))
+    monkeypatch.setattr(paper_fill_simulator, "book", OrderBook())
+    monkeypatch.setattr(paper_fill_simulator, "workers", 1)
+    monkeypatch.setattr(paper_fill_simulator, "poll_seconds", 0)
+    monkeypatch.setattr(market_data_service, "get_quote", fake_quote)
+    monkeypatch.setattr(market_calendar, "is_open", lambda *args: True)
+    return factory
+
+
+ORDER = {"portfolio_id": 1, "symbol": "AAPL", "direction": "BUY", "entry_price": 99.0,
+         "stop_loss": 97.0, "take_profit": 103.0, "quantity": 10, "ai_confidence": 0.8}
+
+
+def test_resting_orders_fill_cancel_and_survive_restart(client_db):
+    factory = client_db
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            refused = await client.post("/api/trading/paper/execute", json={**ORDER, "entry_type": "limit"}, headers=headers)
+            await paper_fill_simulator.start()
+            try:
+                live = await client.post("/api/trading/execute", json={**ORDER, "entry_type": "LIMIT"}, headers=headers)
+                limit = await client.post("/api/trading/paper/execute", json={**ORDER, "entry_type": "limit"}, headers=headers)
+                stop = await client.post("/api/trading/paper/execute",
+                                         json={**ORDER, "entry_type": "STOP", "entry_price": 101.0,
+                                               "stop_loss": 99.0, "take_profit": 106.0}, headers=headers)
+                cancel = await client.post("/api/trading/paper/execute",
+                                           json={**ORDER, "entry_price": 98.0, "entry_type": "LIMIT"}, headers=headers)
+                resting = await client.get("/api/trading/paper/orders", headers=headers)
+                cancelled = await client.post(f"/api/trading/paper/orders/{cancel.json()['id']}/cancel", headers=headers)
+                again = await client.post(f"/api/trading/paper/orders/{cancel.json()['id']}/cancel", headers=headers)
+
+                paper_fill_simulator.book.on_price("AAPL", 98.5)
+                await paper_fill_simulator.drain()
+            finally:
+                await paper_fill_simulator.stop()
+        return refused, live, limit, stop, resting, cancelled, again
+
+    refused, live, limit, stop, resting, cancelled, again = asyncio.run(run())
+    assert refused.status_code == 503 and live.status_code == 400
+    assert limit.json()["status"] == "RESTING" and limit.json()["limit_price"] == 99.0
+    assert [trade["id"] for trade in resting.json()] == [limit.json()["id"], stop.json()["id"], cancelled.json()["id"]]
+    assert cancelled.json()["status"] == "CANCELLED" and again.status_code == 409
+
+    db = factory()
+    try:
+        filled = db.get(Trade, limit.json()["id"])
+        assert (filled.status, filled.entry_price, filled.quantity) == ("OPEN", 98.5, 10)
+        # The bracket keeps its distance from the fill
+        assert filled.stop_loss < 98.5 < filled.take_profit
+        assert db.get(Trade, stop.json()["id"]).status == "RESTING"
+    finally:
+        db.close()
+
+    async def restart():
+        await paper_fill_simulator.start()
+        try:
+            assert stop.json()["id"] in paper_fill_simulator.book and len(paper_fill_simulator.book) == 1
+            paper_fill_simulator.book.on_price("AAPL", 101.2)
+            await paper_fill_simulator.drain()
+        finally:
+            await paper_fill_simulator.stop()
+
+    asyncio.run(restart())
+    db = factory()
+    try:
+        triggered = db.get(Trade, stop.json()["id"])
+        # A triggered stop fills as a market order, with slippage above the trigger price
+        assert triggered.status == "OPEN" and triggered.entry_price > 101.2
+    finally:
+        db.close()
+
+
+def test_cancel_that_does_not_commit_keeps_the_order_resting(client_db, monkeypatch):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+
+    def stale(self, trade_id):
+        self.db.rollback()
+        raise StaleDataError("trade changed")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await paper_fill_simulator.start()
+            try:
+                limit = await client.post("/api/trading/paper/execute", json={**ORDER, "entry_type": "LIMIT"}, headers=headers)
+                with monkeypatch.context() as patch:
+                    patch.setattr(TradingEngine, "cancel_resting", stale)
+                    conflict = await client.post(f"/api/trading/paper/orders/{limit.json()['id']}/cancel", headers=headers)
+                booked = limit.json()["id"] in paper_fill_simulator.book
+                paper_fill_simulator.book.on_price("AAPL", 98.5)
+                await paper_fill_simulator.drain()
+            finally:
+                await paper_fill_simulator.stop()
+        return limit, conflict, booked
+
+    limit, conflict, booked = asyncio.run(run())
+    assert conflict.status_code == 409 and booked
+    db = client_db()
+    try:
+        # Still in the book after the failed cancel, so the next crossing tick fills it
+        assert db.get(Trade, limit.json()["id"]).status == "OPEN"
+    finally:
+        db.close()
+
+
+def test_basket_limit_leg_rests_in_the_book(client_db):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'trader@example.com'})}"}
+    legs = [dict(ORDER), {**ORDER, "symbol": "MSFT", "entry_type": "LIMIT"}]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await paper_fill_simulator.start()
+            try:
+                response = await client.post("/api/trading/paper/basket/execute",
+                                             json={"portfolio_id": 1, "legs": legs}, headers=headers)
+                await paper_fill_simulator.drain()
+                return response, list(paper_fill_simulator.book.symbols())
+            finally:
+                await paper_fill_simulator.stop()
+
+    response, booked = asyncio.run(run())
+    assert response.status_code == 200, response.text
+    market, limit = [leg["trade"] for leg in response.json()["legs"]]
+    assert limit["status"] == "RESTING" and limit["limit_price"] == 99.0 and booked == ["MSFT"]
+    assert market["status"] == "PENDING"
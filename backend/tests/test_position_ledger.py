@@ -0,0 +1,122 @@
+"""Tests for the incremental position and cash ledger."""
+
+from datetime import datetime
+
+import pytest
+
+from app.models import Portfolio, Position, Trade
+from app.services.exposure_service import exposure_service
+from app.services.position_ledger import PositionLedger
+from app.services.trading_engine import TradingEngine
+
+
+@pytest.fixture
+def session(trading_db):
+    db = trading_db()()
+    yield db
+    db.close()
+
+
+def test_average_in_then_partial_close(session):
+    ledger = PositionLedger()
+    ledger.apply_fill(session, 1, "AAPL", "BUY", 10, 100.0, 95.0, 110.0)
+    fill = ledger.apply_fill(session, 1, "AAPL", "BUY", 30, 104.0, 99.0, 115.0)
+    assert fill.position.quantity == 40
+    assert fill.position.entry_price == pytest.approx(103.0)
+    assert fill.position.stop_loss == 99.0
+    assert fill.portfolio.cash_balance == pytest.approx(10000 - 1000 - 3120)
+
+    fill = ledger.apply_fill(session, 1, "AAPL", "SELL", 15, 105.0)
+    assert fill.realized_pnl == pytest.approx(30.0)
+    assert fill.position.quantity == 25 and fill.position.entry_price == pytest.approx(103.0)
+    assert fill.portfolio.current_equity == pytest.approx(10030.0)
+    session.commit()
+    assert session.query(Position).count() == 1
+
+
+def test_flip_and_flat(session):
+    ledger = PositionLedger()
+    ledger.apply_fill(session, 1, "TSLA", "BUY", 10, 200.0)
+    fill = ledger.apply_fill(session, 1, "TSLA", "SELL", 15, 190.0)
+    assert fill.realized_pnl == pytest.approx(-100.0)
+    assert (fill.position.direction, fill.position.quantity, fill.position.entry_price) == ("SELL", 5, 190.0)
+
+    fill = ledger.apply_fill(session, 1, "TSLA", "BUY", 5, 180.0)
+    assert fill.realized_pnl == pytest.approx(50.0)
+    assert fill.position.quantity == 0 and fill.position.realized_pnl == pytest.approx(-50.0)
+    # Cash is back to start plus realized P/L
+    assert fill.portfolio.cash_balance == pytest.approx(10000 - 50.0)
+    assert ledger.open_positions(session, 1) == []
+
+
+def test_short_sale_credits_cash(session):
+    fill = PositionLedger().apply_fill(session, 1, "XOM", "SELL", 10, 50.0)
+    assert fill.cash_delta == 500.0
+    assert fill.portfolio.current_equity == 10000
+
+
+def test_engine_keeps_ledger_in_step(session):
+    engine = TradingEngine(session)
+    signal = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0, "take_profit": 104.0,
+              "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+    trade = engine.execute_trade(1, signal, 20)
+    portfolio = session.get(Portfolio, 1)
+    assert portfolio.cash_balance == 8000.0
+
+    closed = engine.close_trade(trade.id, 110.0, "target", quantity=5)
+    assert closed.id != trade.id and closed.quantity == 5 and closed.pnl == pytest.approx(50.0)
+    assert session.get(Trade, trade.id).quantity == 15
+    position = session.query(Position).one()
+    assert position.quantity == 15
+    assert portfolio.cash_balance == 8550.0 and portfolio.current_equity == 10050.0
+    assert exposure_service._portfolios[1].by_symbol["AAPL"] == 1500.0
+
+    assert engine.close_trade(trade.id, 110.0, "target", quantity=50) is None
+
+
+def test_backfill_open_trades_from_before_the_ledger(session):
+    # As written before the ledger: no Position row, cash never debited
+    session.add(Trade(id=7, portfolio_id=1, symbol="AAPL", direction="BUY", entry_price=100.0, stop_loss=95.0,
+                      take_profit=110.0, quantity=10, status="OPEN", paper_trading="real"))
+    session.commit()
+
+    ledger = PositionLedger()
+    assert ledger.backfill(session) == 1
+    session.commit()
+    assert ledger.backfill(session) == 0
+    assert session.query(Position).one().quantity == 10
+
+    closed = TradingEngine(session).close_trade(7, 105.0, "target")
+    assert closed.pnl == pytest.approx(50.0)
+    portfolio = session.get(Portfolio, 1)
+    assert ledger.open_positions(session, 1) == []
+    assert portfolio.cash_balance == pytest.approx(10050.0) and portfolio.current_equity == pytest.approx(10050.0)
+
+
+def test_paper_fills_stay_out_of_the_live_book(session):
+    engine = TradingEngine(session)
+    signal = lambda direction: {"symbol": "AAPL", "direction": direction, "entry_price": 100.0, "stop_loss": 98.0,
+                                "take_profit": 104.0, "ai_confidence": 0.8, "reasoning": "",
+                                "timestamp": datetime.utcnow(), "validation_gates": {}}
+    live = engine.execute_trade(1, signal("BUY"), 20)
+    paper_short = engine.execute_trade(1, signal("SELL"), 20, paper_trading=True)
+    paper_long = engine.execute_trade(1, signal("BUY"), 50, paper_trading=True)
+
+    # The paper short does not net the live long away, and paper buys spend no live cash
+    position = session.query(Position).one()
+    assert (position.direction, position.quantity) == ("BUY", 20)
+    assert session.get(Portfolio, 1).cash_balance == 8000.0
+
+    engine.close_trade(paper_long.id, 110.0, "target")
+    engine.close_trade(paper_short.id, 110.0, "stop")
+    assert session.get(Portfolio, 1).cash_balance == 8000.0
+    assert session.get(Portfolio, 1).current_equity == 10000
+
+    # Startup backfill skips open paper trades too
+    session.add(Trade(portfolio_id=1, symbol="MSFT", direction="BUY", entry_price=50.0, stop_loss=45.0,
+                      take_profit=60.0, quantity=10, status="OPEN", paper_trading="paper"))
+    session.commit()
+    assert PositionLedger().backfill(session) == 0
+
+    engine.close_trade(live.id, 105.0, "target")
+    assert session.get(Portfolio, 1).cash_balance == 10100.0
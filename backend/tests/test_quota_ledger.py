@@ -0,0 +1,145 @@
+"""Tests for the provider quota ledger."""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models.provider_usage import ProviderUsage
+from app.services.quota_ledger import PRIORITY_HIGH, PRIORITY_LOW, ProviderBudget, QuotaLedger
+
+
+class FakeClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def make_ledger(session_factory, clock):
+    return QuotaLedger(
+        {"alpha_vantage": ProviderBudget("alpha_vantage", daily_limit=5, per_minute_limit=3, high_priority_reserve=2)},
+        session_factory=session_factory,
+        clock=clock,
+    )
+
+
+def test_normal_priority_stops_at_reserve(session_factory):
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    ledger = make_ledger(session_factory, clock)
+
+    spent = 0
+    for _ in range(5):
+        clock.now += 61  # stay clear of the per-minute window
+        spent += ledger.try_spend("alpha_vantage")
+    assert spent == 3  # 5 daily - 2 reserved
+
+    clock.now += 61
+    assert ledger.try_spend("alpha_vantage", PRIORITY_HIGH)
+    assert ledger.try_spend("alpha_vantage", PRIORITY_HIGH)
+    assert not ledger.try_spend("alpha_vantage", PRIORITY_HIGH)
+    assert ledger.remaining("alpha_vantage")["daily_remaining"] == 0
+
+
+def test_per_minute_window(session_factory):
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    ledger = make_ledger(session_factory, clock)
+
+    assert all(ledger.try_spend("alpha_vantage", PRIORITY_HIGH) for _ in range(3))
+    assert not ledger.try_spend("alpha_vantage", PRIORITY_HIGH)
+    clock.now += 60
+    assert ledger.try_spend("alpha_vantage", PRIORITY_HIGH)
+
+
+def test_per_minute_reserve_is_kept_for_high_priority(session_factory):
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    ledger = QuotaLedger(
+        {"finnhub": ProviderBudget("finnhub", per_minute_limit=5, per_minute_reserve=2)},
+        session_factory=session_factory,
+        clock=clock,
+    )
+
+    assert ledger.try_spend("finnhub", PRIORITY_LOW)
+    assert ledger.try_spend("finnhub")
+    assert ledger.try_spend("finnhub", PRIORITY_LOW)
+    assert not ledger.try_spend("finnhub", PRIORITY_LOW)
+    assert not ledger.try_spend("finnhub")
+    assert ledger.try_spend("finnhub", PRIORITY_HIGH)
+    assert ledger.try_spend("finnhub", PRIORITY_HIGH)
+    assert not ledger.try_spend("finnhub", PRIORITY_HIGH)
+    assert ledger.remaining("finnhub")["per_minute_reserve"] == 2
+
+
+def test_low_priority_never_spends_a_daily_budget(session_factory):
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    ledger = make_ledger(session_factory, clock)
+    assert not ledger.try_spend("alpha_vantage", PRIORITY_LOW)
+    assert ledger.remaining("alpha_vantage")["used_today"] == 0
+
+
+def test_usage_survives_restart_and_resets_daily(session_factory):
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    ledger = make_ledger(session_factory, clock)
+    ledger.try_spend("alpha_vantage")
+    ledger.try_spend("alpha_vantage")
+    assert ledger.flush()
+
+    restarted = make_ledger(session_factory, clock)
+    restarted.remaining("alpha_vantage")
+    assert restarted.flush()
+    assert restarted.remaining("alpha_vantage")["used_today"] == 2
+
+    restarted.mark_exhausted("alpha_vantage")
+    assert restarted.flush()
+    exhausted = make_ledger(session_factory, clock)
+    exhausted.remaining("alpha_vantage")
+    assert exhausted.flush()
+    assert not exhausted.try_spend("alpha_vantage", PRIORITY_HIGH)
+
+    clock.now = datetime(2025, 3, 4, 0, 1).timestamp()
+    assert restarted.remaining("alpha_vantage")["used_today"] == 0
+
+
+def test_workers_sharing_the_table_add_up(tmp_path):
+    # One connection per writer thread, as separate worker processes would have
+    engine = create_engine(f"sqlite:///{tmp_path / 'quota.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    clock = FakeClock(datetime(2025, 3, 3, 15, 0).timestamp())
+    budgets = lambda: {"alpha_vantage": ProviderBudget("alpha_vantage", daily_limit=100, high_priority_reserve=0)}
+    workers = [QuotaLedger(budgets(), session_factory=session_factory, clock=clock) for _ in range(3)]
+
+    for _ in range(4):
+        for worker in workers:
+            assert worker.try_spend("alpha_vantage")
+    for worker in workers:
+        assert worker.flush()
+
+    db = session_factory()
+    try:
+        # Increments, not absolute counts: no worker's writes overwrite another's
+        assert db.query(ProviderUsage.calls).scalar() == 12
+    finally:
+        db.close()
+    # The last writer has read back everyone's spends
+    assert max(worker.remaining("alpha_vantage")["used_today"] for worker in workers) == 12
+
+
+def test_unknown_provider_is_unlimited(session_factory):
+    ledger = make_ledger(session_factory, FakeClock(0))
+    assert ledger.try_spend("polygon")
@@ -0,0 +1,96 @@
+"""Tests for the quote sanity filter."""
+
+import random
+
+import numpy as np
+
+from app.services.quote_filter import QuoteSanityFilter, RollingMedianMAD
+from app.utils.validators import ValidationGates
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rolling_median_and_mad_match_numpy():
+    rng = random.Random(3)
+    stats = RollingMedianMAD(size=25)
+    values = []
+    for _ in range(300):
+        value = round(rng.uniform(90, 110), 2)
+        stats.add(value)
+        values = (values + [value])[-25:]
+        window = np.array(values)
+        median = np.median(window)
+        assert stats.median() == median
+        assert abs(stats.mad() - np.median(np.abs(window - median))) < 1e-9
+
+
+def feed(qf, symbol, prices, source="finnhub"):
+    return [qf.check(symbol, p, source) for p in prices]
+
+
+def test_spike_rejected_and_not_learned():
+    qf = QuoteSanityFilter(clock=FakeClock())
+    feed(qf, "AAPL", [150 + 0.05 * (i % 5) for i in range(20)])
+
+    verdict = qf.check("AAPL", 1.50, "finnhub")  # decimal-shift glitch
+    assert not verdict["ok"]
+    assert "robust sigmas" in verdict["reason"]
+    assert qf.check("AAPL", 150.1, "finnhub")["ok"]
+
+
+def test_level_shift_confirmed_after_consistent_ticks():
+    qf = QuoteSanityFilter(confirm_ticks=3, clock=FakeClock())
+    feed(qf, "XYZ", [100 + 0.01 * (i % 3) for i in range(20)])
+
+    verdicts = feed(qf, "XYZ", [80.0, 80.1, 80.05])
+    assert [v["ok"] for v in verdicts] == [False, False, True]
+    assert verdicts[-1]["level_shift"]
+    assert qf.check("XYZ", 80.02, "finnhub")["ok"]
+
+
+def test_opening_gap_accepted_after_the_window_ages_out():
+    clock = FakeClock()
+    qf = QuoteSanityFilter(clock=clock)
+    for i in range(40):
+        qf.check("AAPL", 150 + 0.01 * (i % 3), "finnhub")
+        clock.now += 1
+    # A 3% move inside the session is within the scale floor
+    assert qf.check("AAPL", 154.5, "finnhub")["ok"]
+
+    clock.now += 17 * 3600  # overnight
+    verdict = qf.check("AAPL", 165.0, "finnhub")
+    assert verdict["ok"] and verdict["score"] is None
+
+
+def test_cross_provider_disagreement():
+    clock = FakeClock()
+    qf = QuoteSanityFilter(max_cross_deviation=0.02, cross_max_age=60, clock=clock)
+    assert qf.check("MSFT", 410.0, "finnhub")["ok"]
+
+    verdict = qf.check("MSFT", 441.0, "alpha_vantage")
+    assert not verdict["ok"]
+    assert "finnhub" in verdict["reason"]
+
+    clock.now += 120  # other provider's price is stale now
+    assert qf.check("MSFT", 441.0, "alpha_vantage")["ok"]
+
+
+def test_invalid_prices():
+    qf = QuoteSanityFilter()
+    assert not qf.check("AAPL", 0, "finnhub")["ok"]
+    assert not qf.check("AAPL", float("nan"), "finnhub")["ok"]
+
+
+def test_gate_2_rejects_suspect_quote():
+    gates = ValidationGates()
+    data = {"current_price": 100, "entry_price": 100, "prev_close": 99,
+            "quote_suspect": True, "quote_suspect_reason": "glitch"}
+    result = gates.gate_2_price_deviation(data)
+    assert not result["passed"]
+    assert "glitch" in result["reason"]
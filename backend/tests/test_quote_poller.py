@@ -0,0 +1,97 @@
+"""Tests for the shared background quote poller."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.correlation_service import correlation_service
+from app.services.market_data_service import market_data_service
+from app.services.quota_ledger import PRIORITY_LOW, quota_ledger
+from app.services.quote_poller import QuotePoller
+
+
+class FakeClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+
+    async def fake_quote(symbol, priority=None):
+        calls.append((symbol, priority))
+        market_data_service.last_tick[symbol] = clock.now
+        return {"symbol": symbol, "current_price": 100.0}
+
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(market_data_service, "last_tick", {})
+    monkeypatch.setattr(market_data_service, "get_quote", fake_quote)
+    return clock, calls
+
+
+def test_shared_symbols_are_fetched_once_at_low_priority(fetches):
+    clock, calls = fetches
+    poller = QuotePoller(max_symbols=10, clock=clock)
+    poller._watchers = {"triggers": (lambda: ["AAPL", "MSFT"], 15.0), "paper_book": (lambda: ["MSFT", "TSLA"], 30.0)}
+
+    assert asyncio.run(poller.poll_once()) == 3
+    assert sorted(calls) == [("AAPL", PRIORITY_LOW), ("MSFT", PRIORITY_LOW), ("TSLA", PRIORITY_LOW)]
+
+    # MSFT follows the shorter of its two intervals; TSLA is not due yet
+    clock.now += 20
+    calls.clear()
+    asyncio.run(poller.poll_once())
+    assert sorted(symbol for symbol, _ in calls) == ["AAPL", "MSFT"]
+
+
+def test_cycle_is_capped_and_skips_fresh_symbols(fetches):
+    clock, calls = fetches
+    poller = QuotePoller(max_symbols=2, clock=clock)
+    poller._watchers = {"triggers": (lambda: ["AAPL", "MSFT", "TSLA", "NVDA"], 15.0)}
+    market_data_service.last_tick.update({"AAPL": clock.now - 5, "MSFT": clock.now - 40, "TSLA": clock.now - 20})
+
+    # AAPL was priced by a request 5s ago; NVDA has never been priced, so it is stalest
+    assert poller.due() == ["NVDA", "MSFT"]
+    asyncio.run(poller.poll_once())
+    assert [symbol for symbol, _ in calls] == ["NVDA", "MSFT"]
+    assert poller.due() == ["TSLA"]
+
+
+def test_task_runs_only_while_something_is_watched(fetches):
+    async def run():
+        poller = QuotePoller()
+        poller.watch("triggers", lambda: [], 15.0)
+        poller.watch("paper_book", lambda: [], 15.0)
+        await poller.unwatch("triggers")
+        running = poller.stats()["running"]
+        await poller.unwatch("paper_book")
+        return running, poller.stats()["running"]
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_quote_served_by_a_route_marks_the_symbol_fresh(monkeypatch):
+    async def finnhub_quote(symbol):
+        return {"symbol": symbol, "current_price": 100.0, "high": 101.0, "low": 99.0, "prev_close": 99.5,
+                "volume": 2_000_000, "source": "finnhub"}
+
+    monkeypatch.setattr(market_data_service, "last_tick", {})
+    monkeypatch.setattr(market_data_service, "finnhub_key", "test-key")
+    monkeypatch.setattr(market_data_service, "_get_finnhub_quote", finnhub_quote)
+    monkeypatch.setattr(quota_ledger, "try_spend", lambda *args: True)
+    monkeypatch.setattr(correlation_service, "record", lambda *args: None)
+    poller = QuotePoller(max_symbols=10)
+    poller._watchers = {"triggers": (lambda: ["PLTR", "SNOW"], 15.0)}
+
+    async def get(path):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+
+    assert asyncio.run(get("/api/market/quote/PLTR?snapshot=false")).status_code == 200
+    assert poller.due() == ["SNOW"]
@@ -0,0 +1,46 @@
+"""Tests for signed quote snapshot tokens."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils.quote_tokens import InvalidQuoteToken, _b64decode, _b64encode, sign_quote, verify_quote_token
+
+QUOTE = {"symbol": "AAPL", "current_price": 187.25, "high": 188.0, "low": 185.5, "prev_close": 186.0,
+         "volume": 52_000_000, "timestamp": datetime.utcnow(), "source": "finnhub"}
+
+
+def test_round_trip():
+    quote = verify_quote_token(sign_quote(QUOTE), "aapl")
+    for field in ("symbol", "current_price", "high", "low", "prev_close", "volume", "source"):
+        assert quote[field] == QUOTE[field]
+    assert quote["suspect"] is False
+    assert abs(quote["timestamp"] - QUOTE["timestamp"]) < timedelta(milliseconds=1)
+    # QUOTE is stamped at import, so its age depends on when this test runs
+    expected_age = (datetime.utcnow() - QUOTE["timestamp"]).total_seconds()
+    assert quote["age_seconds"] == pytest.approx(expected_age, abs=1)
+
+
+def test_tampered_price_is_rejected():
+    body, signature = sign_quote(QUOTE).split(".")
+    cheaper = _b64decode(body).replace(b"187.25", b"100.25")
+    with pytest.raises(InvalidQuoteToken, match="signature"):
+        verify_quote_token(f"{_b64encode(cheaper)}.{signature}")
+
+    with pytest.raises(InvalidQuoteToken):
+        verify_quote_token(sign_quote(QUOTE, key=b"other-key"))
+    with pytest.raises(InvalidQuoteToken, match="Malformed"):
+        verify_quote_token("not-a-token")
+
+
+def test_symbol_must_match():
+    with pytest.raises(InvalidQuoteToken, match="MSFT"):
+        verify_quote_token(sign_quote(QUOTE), "MSFT")
+
+
+def test_age_and_suspect_flag_survive():
+    stale = {**QUOTE, "timestamp": datetime.utcnow() - timedelta(minutes=5), "suspect": True,
+             "suspect_reason": "jump"}
+    quote = verify_quote_token(sign_quote(stale))
+    assert quote["age_seconds"] == pytest.approx(300, abs=1)
+    assert quote["suspect"] and quote["suspect_reason"] == "jump"
@@ -0,0 +1,95 @@
+"""Tests for bulk response content negotiation."""
+
+from datetime import datetime
+
+import msgpack
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.response_formats import (
+    ARROW,
+    JSON,
+    MSGPACK,
+    encode_arrow,
+    encode_msgpack,
+    negotiate_format,
+    tabular_response,
+)
+
+
+def make_request(accept: str = "", query: str = "") -> Request:
+    headers = [(b"accept", accept.encode())] if accept else []
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/trading/trades",
+        "query_string": query.encode(),
+        "headers": headers,
+    })
+
+
+ROWS = [
+    {"id": 1, "symbol": "AAPL", "entry_price": 150.25, "opened_at": datetime(2025, 1, 2, 15, 0)},
+    {"id": 2, "symbol": "MSFT", "entry_price": 410.5, "opened_at": datetime(2025, 1, 3, 15, 0)},
+]
+COLUMNS = ["id", "symbol", "entry_price", "opened_at"]
+
+
+class TestNegotiation:
+    """Test format selection."""
+
+    def test_defaults_to_json(self):
+        assert negotiate_format(make_request()) == JSON
+        assert negotiate_format(make_request("*/*")) == JSON
+
+    def test_accept_header(self):
+        assert negotiate_format(make_request("application/msgpack")) == MSGPACK
+        assert negotiate_format(make_request("application/vnd.apache.arrow.stream")) == ARROW
+
+    def test_accept_quality_values(self):
+        accept = "application/json;q=0.5, application/x-msgpack;q=0.9"
+        assert negotiate_format(make_request(accept)) == MSGPACK
+
+    def test_zero_quality_is_not_acceptable(self):
+        assert negotiate_format(make_request("application/msgpack;q=0")) == JSON
+        assert negotiate_format(make_request("application/msgpack;q=0, application/json;q=0.1")) == JSON
+        with pytest.raises(HTTPException) as exc:
+            negotiate_format(make_request("application/json;q=0, application/msgpack;q=0"))
+        assert exc.value.status_code == 406
+
+    def test_query_param_overrides_header(self):
+        assert negotiate_format(make_request("application/msgpack", "format=arrow")) == ARROW
+
+    def test_unknown_query_format(self):
+        with pytest.raises(HTTPException) as exc:
+            negotiate_format(make_request(query="format=xml"))
+        assert exc.value.status_code == 406
+
+
+class TestEncoding:
+    """Test binary encoders round-trip the columns."""
+
+    def test_msgpack_round_trip(self):
+        columns = {name: [row[name] for row in ROWS] for name in COLUMNS}
+        decoded = msgpack.unpackb(encode_msgpack(columns), timestamp=3)
+        assert decoded["symbol"] == ["AAPL", "MSFT"]
+        assert decoded["entry_price"] == [150.25, 410.5]
+        assert decoded["opened_at"][0].replace(tzinfo=None) == datetime(2025, 1, 2, 15, 0)
+
+    def test_arrow_round_trip(self):
+        columns = {name: [row[name] for row in ROWS] for name in COLUMNS}
+        table = pa.ipc.open_stream(encode_arrow(columns)).read_all()
+        assert table.num_rows == 2
+        assert table.column("id").to_pylist() == [1, 2]
+        assert table.column("opened_at").to_pylist()[1] == datetime(2025, 1, 3, 15, 0)
+
+    def test_tabular_response_media_types(self):
+        response = tabular_response(make_request("application/msgpack"), ROWS, COLUMNS)
+        assert response.media_type == "application/msgpack"
+        assert response.headers["x-row-count"] == "2"
+
+        response = tabular_response(make_request(), ROWS, COLUMNS)
+        assert response.media_type == "application/json"
+        assert b'"symbol":"AAPL"' in response.body
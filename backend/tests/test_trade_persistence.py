@@ -0,0 +1,54 @@
+"""Tests for TradingEngine's unit of work: one commit per execute/close."""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.models import ActivityLog, Trade
+from app.services.exposure_service import exposure_service
+from app.services.trading_engine import TradingEngine
+
+
+@pytest.fixture
+def session(trading_db):
+    db = trading_db(capital=100000)()
+    yield db
+    db.close()
+
+
+def signal(**overrides):
+    data = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 98.0, "take_profit": 104.0,
+            "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+    data.update(overrides)
+    return data
+
+
+def count_commits(db):
+    commits = []
+    event.listen(db, "after_commit", commits.append)
+    return commits
+
+
+def test_execute_and_close_commit_once_with_their_logs(session):
+    engine = TradingEngine(session)
+    commits = count_commits(session)
+
+    trade = engine.execute_trade(1, signal(), 10)
+    assert len(commits) == 1
+    assert [log.event_type for log in session.query(ActivityLog).filter_by(trade_id=trade.id)] == ["EXECUTED"]
+    assert session.query(ActivityLog).one().details["timestamp"].startswith(str(datetime.utcnow().year))
+
+    closed = engine.close_trade(trade.id, 105.0, "target")
+    assert len(commits) == 2
+    assert closed.status == "CLOSED" and closed.pnl == pytest.approx(50.0)
+    assert sorted(log.event_type for log in session.query(ActivityLog).filter_by(trade_id=trade.id)) == ["CLOSED", "EXECUTED"]
+
+
+def test_failed_log_rolls_back_the_trade(session):
+    engine = TradingEngine(session)
+    # JSON column cannot store an arbitrary object: the insert fails after the trade row is queued
+    assert engine.execute_trade(1, signal(reasoning="x", unserializable=object()), 10) is None
+    assert session.query(Trade).count() == 0
+    assert session.query(ActivityLog).count() == 0
+    assert exposure_service._portfolios == {}
@@ -0,0 +1,207 @@
+"""Tests for trailing stops and OCO bracket legs in the trigger engine."""
+
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import ActivityLog, Trade
+from app.schemas import TradeExecutionRequest
+from app.services.execution_service import check_order_type
+from app.services.trading_engine import TradingEngine
+from app.services.trigger_index import (
+    STOP_LOSS, TAKE_PROFIT, TRAILING, TRAILING_STOP, TriggerIndex
+)
+from app.services.trigger_monitor import TriggerMonitor
+
+
+def tick(index, *prices, symbol="AAPL"):
+    hits = []
+    for price in prices:
+        hits += index.on_price(symbol, price)
+    return hits
+
+
+def test_long_trailing_stop_ratchets_and_fires():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", None, None, trail=5.0, watermark=100.0)
+    assert tick(index, 102.0, 110.0, 106.0) == []
+    assert index.levels(1) == {TRAILING: 105.0}
+
+    (hit,) = tick(index, 104.0)
+    assert (hit.reason, hit.level, hit.watermark, hit.price) == (TRAILING, 105.0, 110.0, 104.0)
+
+
+def test_short_trailing_stop_follows_the_low():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "SELL", None, None, trail=5.0, watermark=100.0)
+    assert tick(index, 95.0, 90.0, 94.0) == []
+    (hit,) = tick(index, 95.5)
+    assert (hit.level, hit.watermark) == (95.0, 90.0)
+
+
+def test_watermarks_are_per_trade():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", None, None, trail=15.0, watermark=100.0)
+    tick(index, 120.0, 110.0)
+    # Armed after the high: trails from its own entry, not the symbol's high
+    index.arm(2, 1, "AAPL", "BUY", None, None, trail=3.0, watermark=110.0)
+    tick(index, 113.0)
+    assert index.levels(1)[TRAILING] == 105.0 and index.levels(2)[TRAILING] == 110.0
+
+    tick(index, 121.0)
+    assert index.levels(1)[TRAILING] == 106.0 and index.levels(2)[TRAILING] == 118.0
+    assert [hit.trade_id for hit in tick(index, 118.0)] == [2]
+    assert [hit.trade_id for hit in tick(index, 106.0)] == [1]
+
+
+def test_bracket_legs_cancel_each_other():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", 95.0, 110.0, trail=4.0, watermark=100.0)
+    index.arm(2, 1, "AAPL", "BUY", 95.0, 110.0)
+    hits = {hit.trade_id: hit for hit in tick(index, 111.0)}
+
+    assert hits[1].reason == TAKE_PROFIT and hits[1].cancelled == (STOP_LOSS, TRAILING)
+    assert hits[2].cancelled == (STOP_LOSS,)
+    # Neither the stops nor the trailing leg fire afterwards
+    assert tick(index, 90.0) == [] and len(index) == 0
+
+
+def test_matches_brute_force_replay():
+    rng = random.Random(11)
+    index = TriggerIndex()
+    price, prices, armed = 100.0, [], {}
+    for t in range(3000):
+        price = max(1.0, price + rng.gauss(0, 0.5))
+        prices.append(price)
+        for hit in index.on_price("AAPL", price):
+            armed[hit.trade_id]["fired"] = (t, hit.level)
+        if t % 7 == 0:
+            trade_id = len(armed)
+            direction = rng.choice(["BUY", "SELL"])
+            trail = rng.uniform(0.5, 6.0)
+            armed[trade_id] = {"t": t, "direction": direction, "trail": trail, "fired": None}
+            index.arm(trade_id, 1, "AAPL", direction, None, None, trail=trail, watermark=price)
+        if t % 500 == 250:
+            # Disarmed trades must never fire
+            victim = rng.choice([tid for tid, spec in armed.items() if not spec["fired"]])
+            index.disarm(victim)
+            armed[victim]["fired"] = "disarmed"
+
+    for trade_id, spec in armed.items():
+        if spec["fired"] == "disarmed":
+            continue
+        sign = 1 if spec["direction"] == "BUY" else -1
+        best, expected = sign * prices[spec["t"]], None
+        for t in range(spec["t"] + 1, len(prices)):
+            best = max(best, sign * prices[t])
+            if sign * prices[t] <= best - spec["trail"]:
+                expected = (t, sign * (best - spec["trail"]))
+                break
+        if expected is None:
+            assert spec["fired"] is None, trade_id
+        else:
+            assert spec["fired"][0] == expected[0], trade_id
+            assert spec["fired"][1] == pytest.approx(expected[1])
+
+
+def test_load_resumes_from_saved_watermarks():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", 90.0, 130.0, trail=5.0, watermark=100.0)
+    index.arm(2, 1, "AAPL", "SELL", 110.0, 80.0, trail=5.0, watermark=100.0)
+    assert [hit.trade_id for hit in tick(index, 103.0, 97.0, 96.0, 99.0)] == [1]
+    index.arm(3, 1, "AAPL", "BUY", 90.0, 130.0, trail=5.0, watermark=104.0)
+    marks = index.watermarks()
+    assert marks == {2: 96.0, 3: 104.0}
+
+    reloaded = TriggerIndex()
+    reloaded.load([(2, 1, "AAPL", "SELL", 110.0, 80.0, 5.0, marks[2]),
+                   (3, 1, "AAPL", "BUY", 90.0, 130.0, 5.0, marks[3]),
+                   (4, 1, "AAPL", "BUY", 90.0, 130.0)])
+    assert reloaded.levels(2)[TRAILING] == 101.0 and reloaded.levels(3)[TRAILING] == 99.0
+    assert tick(reloaded, 100.0) == []
+    assert [hit.trade_id for hit in tick(reloaded, 99.0)] == [3]
+    assert [hit.trade_id for hit in tick(reloaded, 101.0)] == [2]
+    assert len(reloaded) == 1
+
+
+def test_order_type_validation():
+    order = TradeExecutionRequest(portfolio_id=1, symbol="AAPL", direction="BUY", entry_price=100.0, stop_loss=98.0,
+                                  take_profit=104.0, quantity=1, order_type="trailing_stop")
+    check_order_type(order)
+    assert order.order_type == TRAILING_STOP
+
+    order.order_type = "ICEBERG"
+    with pytest.raises(HTTPException):
+        check_order_type(order)
+    order.order_type, order.trail_amount = "BRACKET", 2.0
+    with pytest.raises(HTTPException):
+        check_order_type(order)
+
+
+@pytest.fixture
+def factory(trading_db):
+    return trading_db(threaded=True)
+
+
+def test_trailing_trade_closes_through_the_monitor(factory):
+    index = TriggerIndex()
+    monitor = TriggerMonitor(index, session_factory=factory, poll_seconds=0, close_workers=1)
+    signal = {"symbol": "AAPL", "direction": "BUY", "entry_price": 100.0, "stop_loss": 96.0, "take_profit": 120.0,
+              "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {},
+              "order_type": TRAILING_STOP}
+
+    async def run():
+        await monitor.start()
+        try:
+            db = factory()
+            engine = TradingEngine(db)
+            engine.triggers = index
+            trade = engine.execute_trade(1, signal, 10)
+            db.close()
+            assert (trade.order_type, trade.trail_amount) == (TRAILING_STOP, 4.0)
+
+            tick(index, 108.0, 112.0, 109.0, 107.5)
+            await monitor.drain()
+            return trade.id
+        finally:
+            await monitor.stop()
+
+    trade_id = asyncio.run(run())
+    db = factory()
+    try:
+        trade = db.get(Trade, trade_id)
+        assert (trade.status, trade.close_reason, trade.exit_price) == ("CLOSED", TRAILING, 107.5)
+        assert trade.trail_watermark == 112.0 and trade.pnl == pytest.approx(75.0)
+        log = db.query(ActivityLog).filter_by(trade_id=trade_id, event_type="CLOSED").one()
+        assert log.details["trigger_level"] == 108.0
+        assert log.details["cancelled_legs"] == [STOP_LOSS, TAKE_PROFIT]
+    finally:
+        db.close()
+
+
+def test_watermarks_persist_on_shutdown(factory):
+    index = TriggerIndex()
+    monitor = TriggerMonitor(index, session_factory=factory, poll_seconds=0, close_workers=1)
+    db = factory()
+    db.add(Trade(id=7, portfolio_id=1, symbol="AAPL", direction="SELL", entry_price=100.0, stop_loss=104.0,
+                 take_profit=80.0, quantity=1, order_type=TRAILING_STOP, trail_amount=3.0))
+    db.commit()
+    db.close()
+    monitor.rebuild()
+
+    async def run():
+        await monitor.start()
+        tick(index, 97.0, 95.5, 96.0)
+        await monitor.stop()
+
+    asyncio.run(run())
+    db = factory()
+    try:
+        assert db.get(Trade, 7).trail_watermark == 95.5
+    finally:
+        db.close()
+    monitor.rebuild()
+    assert index.levels(7)[TRAILING] == 98.5
@@ -0,0 +1,153 @@
+"""Tests for the stop-loss/take-profit trigger index and monitor."""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models import Trade
+from app.services.trading_engine import TradingEngine
+from app.services.trigger_index import COMPACT_MIN_ENTRIES, STOP_LOSS, TAKE_PROFIT, TriggerIndex
+from app.services.trigger_monitor import TriggerMonitor
+
+
+def fired(hits):
+    return sorted((hit.trade_id, hit.reason) for hit in hits)
+
+
+def test_levels_fire_in_the_right_direction():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", 95.0, 110.0)
+    index.arm(2, 1, "AAPL", "SELL", 105.0, 90.0)
+
+    assert index.on_price("AAPL", 100.0) == []
+    assert fired(index.on_price("AAPL", 95.0)) == [(1, STOP_LOSS)]
+    assert fired(index.on_price("AAPL", 80.0)) == [(2, TAKE_PROFIT)]
+    # Both trades are disarmed: their other levels never fire
+    assert index.on_price("AAPL", 200.0) == []
+    assert len(index) == 0
+
+
+def test_gap_through_both_levels_fires_once():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "SELL", 105.0, 90.0)
+    (hit,) = index.on_price("AAPL", 120.0)
+    assert (hit.reason, hit.level, hit.price) == (STOP_LOSS, 105.0, 120.0)
+    assert index.on_price("AAPL", 50.0) == []
+
+
+def test_disarmed_and_moved_levels_are_skipped():
+    index = TriggerIndex()
+    index.arm(1, 1, "AAPL", "BUY", 95.0, 110.0)
+    index.arm(2, 1, "AAPL", "BUY", 95.0, 110.0)
+    index.disarm(1)
+    assert index.move(2, STOP_LOSS, 90.0)
+
+    assert index.on_price("AAPL", 94.0) == []
+    assert fired(index.on_price("AAPL", 90.0)) == [(2, STOP_LOSS)]
+    assert index.on_price("MSFT", 1.0) == []
+
+
+def test_stale_entries_are_compacted():
+    index = TriggerIndex()
+    for trade_id in range(COMPACT_MIN_ENTRIES):
+        index.arm(trade_id, 1, "AAPL", "BUY", 95.0, 110.0)
+    for trade_id in range(COMPACT_MIN_ENTRIES - 10):
+        index.disarm(trade_id)
+
+    stats = index.stats()
+    assert stats["armed_trades"] == 10 and stats["live_levels"] == 20
+    assert stats["heap_entries"] < COMPACT_MIN_ENTRIES
+    assert len(index.on_price("AAPL", 120.0)) == 10
+    assert index.stats()["symbols"] == 0
+
+
+def test_ticks_only_touch_crossed_levels():
+    rng = random.Random(3)
+    index = TriggerIndex()
+    rows = []
+    for trade_id in range(200_000):
+        entry = rng.uniform(50, 150)
+        direction = rng.choice(["BUY", "SELL"])
+        sign = 1 if direction == "BUY" else -1
+        rows.append((trade_id, trade_id % 500, f"S{trade_id % 100}", direction,
+                     entry - sign * rng.uniform(1, 20), entry + sign * rng.uniform(1, 40)))
+    index.load(rows)
+    assert len(index) == 200_000
+
+    start = time.perf_counter()
+    total = 0
+    for _ in range(20):
+        for s in range(100):
+            total += len(index.on_price(f"S{s}", 100.0 + rng.uniform(-1, 1)))
+    elapsed = time.perf_counter() - start
+    assert total > 0 and len(index) == 200_000 - total
+    # 2000 ticks against 200k armed trades: no tick scans the book
+    assert elapsed < 2.0
+    print(f"\n2000 ticks over 200k trades in {elapsed * 1000:.0f}ms ({total} triggers)")
+
+
+@pytest.fixture
+def factory(trading_db):
+    return trading_db(threaded=True)
+
+
+def signal(symbol, direction, entry, stop, target):
+    return {"symbol": symbol, "direction": direction, "entry_price": entry, "stop_loss": stop, "take_profit": target,
+            "ai_confidence": 0.8, "reasoning": "", "timestamp": datetime.utcnow(), "validation_gates": {}}
+
+
+def test_monitor_closes_crossed_trades(factory, monkeypatch):
+    index = TriggerIndex()
+    monitor = TriggerMonitor(index, session_factory=factory, poll_seconds=0, close_workers=2)
+
+    db = factory()
+    engine = TradingEngine(db)
+    monkeypatch.setattr(engine, "triggers", index)
+    existing = engine.execute_trade(1, signal("AAPL", "BUY", 100.0, 95.0, 110.0), 10)
+    db.close()
+    monitor.rebuild()
+
+    async def run():
+        await monitor.start()
+        try:
+            db = factory()
+            engine = TradingEngine(db)
+            engine.triggers = index
+            opened = engine.execute_trade(1, signal("MSFT", "SELL", 200.0, 210.0, 180.0), 5)
+            db.close()
+
+            index.on_price("AAPL", 94.5)
+            index.on_price("MSFT", 179.0)
+            await monitor.drain()
+            return opened
+        finally:
+            await monitor.stop()
+
+    opened = asyncio.run(run())
+    db = factory()
+    try:
+        aapl, msft = db.get(Trade, existing.id), db.get(Trade, opened.id)
+        assert (aapl.status, aapl.close_reason, aapl.exit_price) == ("CLOSED", STOP_LOSS, 94.5)
+        assert (msft.status, msft.close_reason, msft.exit_price) == ("CLOSED", TAKE_PROFIT, 179.0)
+        assert msft.pnl == pytest.approx(105.0)
+    finally:
+        db.close()
+    assert monitor.closed == 2 and len(index) == 0
+
+
+def test_manual_close_disarms(factory, monkeypatch):
+    index = TriggerIndex()
+    db = factory()
+    engine = TradingEngine(db)
+    monkeypatch.setattr(engine, "triggers", index)
+    trade = engine.execute_trade(1, signal("AAPL", "BUY", 100.0, 95.0, 110.0), 10)
+    assert trade.id in index
+
+    engine.close_trade(trade.id, 101.0, "manual", quantity=4)
+    assert trade.id in index
+    engine.close_trade(trade.id, 101.0, "manual")
+    assert trade.id not in index
+    db.close()